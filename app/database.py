@@ -9,8 +9,15 @@ DATABASE_URL = (    #Construct the database URL using environment variables for
     f"@postgres:5432/{os.getenv('POSTGRES_DB')}"
 )
 
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))    #connections kept open per worker process
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))  #extra connections allowed under a burst, closed again when returned
+SQL_ECHO = os.getenv("SQL_ECHO", "0") == "1"    #log every SQL statement - for debugging only, it is a print per query on the hot path
+
 # The engine is the actual connection to Postgres
-engine = create_async_engine(DATABASE_URL, echo=True)   # Create an asynchronous engine for connecting to the PostgreSQL database, with echo enabled for logging SQL statements
+engine = create_async_engine(   # Create an asynchronous engine for connecting to the PostgreSQL database, with a sized connection pool
+    DATABASE_URL, echo=SQL_ECHO, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+    pool_pre_ping=True  # check a pooled connection is still alive before handing it out (Postgres restarts, idle timeouts)
+)
 
 #1 create the shopping cart FACTORY (blueprint for creating sessions)
 # sessions are the actual shopping carts that we use to interact with the database.
@@ -5,8 +5,19 @@ from app.routers import models
 from app.routers import benchmarks
 from app.routers import ws
 from app.routers import battle
-from app.services.influx import client, write_api, query_api
+from app.services.influx import client, write_api, query_api, benchmark_writer, close_query_client
+from app.services.battle_queue import start_workers, stop_workers
+from app.services.providers.ollama_pool import ollama_pool
+from app.services.providers.residency import residency
+from app.services.event_bus import event_bus
+from app.services.battle_history import battle_history
+from app.services.rollups import ensure_rollups
+from app.services.websocket_manager import manager
+from app.services.verdict_cache import verdict_cache
+from app.services.model_registry import registry_cache
+from app.services import metrics
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 
 app = FastAPI(  #This initializes a FastAPI app instance with metadata such as title, description, and version. This information is used in the automatically generated API documentation (Swagger UI) and helps users understand the purpose and version of the API.
@@ -24,20 +35,62 @@ app.add_middleware(
     allow_headers=["*"]     #allows Content-Type: app/json 
 )
 
+def create_missing_indexes(conn):
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
 @app.on_event("startup")    #This decorator registers the startup function to be called when the FastAPI app starts up. The startup function is responsible for establishing a connection to the database and creating the necessary tables if they don't already exist. It includes a retry mechanism to handle potential connection issues gracefully, ensuring that the application can start successfully even if the database is temporarily unavailable.
 async def startup():
+    benchmark_writer.start()    #background task that batches benchmark points into InfluxDB
+    battle_history.start()      #background task that COPYs finished battles into Postgres
+    ollama_pool.start()     #periodic health + residency checks across the ollama hosts
+    event_bus.start()   #publish live events to Redis + relay other workers' events to our websocket clients
+    start_workers()     #battle queue workers (BATTLE_WORKERS per process)
     retries = 5
     for i in range(retries):
         try:
             async with engine.begin() as conn:  #This creates an asynchronous connection to the database using the engine defined in the database module.
                 await conn.run_sync(Base.metadata.create_all)  #This creates all tables defined via SQLAlchemy if they don't exist yet. This ensure that the database schema is set up correctly before the application starts handling requests.
+                await conn.run_sync(create_missing_indexes)  #create_all skips tables that already exist, so indexes added to an existing table are created here
             print("Database connected and tables created successfully.")
             break
         except Exception as e:
             print(f"Database connection failed, retrying in 5 seconds... ({i+1}/{retries})")
             await asyncio.sleep(2)
+    await ensure_rollups()  #hourly/daily InfluxDB rollup buckets + tasks for long-range charts
     # Creates all tables defined via SQLAlchemy if they don't exist yet. This ensure that the database schema is set up correctly before the application starts handling requests.
 
+@app.on_event("shutdown")
+async def shutdown():
+    await stop_workers()
+    await ollama_pool.stop()
+    await ollama_pool.close()     #close the keep-alive connections to every ollama host
+    await event_bus.stop()
+    await benchmark_writer.stop()   #drain buffered points so nothing queued is lost on restart
+    await battle_history.stop()
+    await close_query_client()
+
+#counters the services already keep, exposed at scrape time rather than counted twice
+metrics.Callback("websocket_clients", "Connected websocket clients", "gauge", lambda: manager.stats()["clients"])
+metrics.Callback("websocket_dropped_messages_total", "Messages discarded for slow websocket clients", "counter", lambda: manager.dropped_messages)
+metrics.Callback("websocket_slow_disconnects_total", "Websocket clients closed because their send queue overflowed", "counter", lambda: manager.slow_disconnects)
+metrics.Callback("influx_points_total", "Benchmark points by write result", "counter",
+                 lambda: {k: v for k, v in benchmark_writer.stats().items() if k != "pending"}, "result")
+metrics.Callback("battle_history_total", "Battles written to Postgres by result", "counter",
+                 lambda: {k: v for k, v in battle_history.stats().items() if k != "pending"}, "result")
+metrics.Callback("influx_points_pending", "Benchmark points buffered and not yet written", "gauge", lambda: benchmark_writer.queue.qsize())
+metrics.Callback("verdict_cache_lookups_total", "Judge verdict cache lookups by result", "counter",
+                 lambda: {"local_hit": verdict_cache.local_hits, "redis_hit": verdict_cache.redis_hits, "miss": verdict_cache.misses}, "result")
+metrics.Callback("event_bus_messages_total", "Live events by result (published, relayed from other workers, dropped, failed)", "counter",
+                 lambda: {k: v for k, v in event_bus.stats().items() if k in ("published", "relayed", "dropped", "failed")}, "result")
+metrics.Callback("ollama_in_flight", "Requests running on each Ollama host", "gauge",
+                 lambda: {h.url: h.in_flight for h in ollama_pool.hosts}, "host")
+metrics.Callback("model_warmups_total", "Pre-battle warm-ups by result (loaded = the model was cold)", "counter",
+                 lambda: {"loaded": residency.loads, "already_resident": residency.warm_hits}, "result")
+metrics.Callback("model_registry_lookups_total", "Model registry reads by result (revalidated = cache past its TTL but the version hadn't moved)", "counter",
+                 lambda: {k: v for k, v in registry_cache.stats().items() if k != "entries"}, "result")
+
 app.include_router(models.router)   # this line includes the router defined in the models module, which contains the API endpoints related to managing AI models.
 app.include_router(benchmarks.router)   # this lines includes the router defined in the benchmarks module, which contains the API endpoints related to managing benchmarks and benchmark results.
 app.include_router(ws.router)   # this line includes the router defined in the ws.module, which contains the API endpoints related to managing websocket connections and broadcasting messages to clients.
@@ -45,4 +98,8 @@ app.include_router(battle.router)
 
 @app.get("/health")
 async def health_check():
-    return {"status": "online", "message": "AI Battle API is running"}
\ No newline at end of file
+    return {"status": "online", "message": "AI Battle API is running"}
+
+@app.get("/metrics", response_class=PlainTextResponse)    #Prometheus text format - stage latency histograms + counters
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
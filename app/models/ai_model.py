@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, func
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index, func
 from app.database import Base
 
 class AIModel(Base):
@@ -9,4 +9,9 @@ class AIModel(Base):
     version = Column(String(50), nullable=False)  # Version of the AI model, required field with a maximum length of 50 characters
     creator = Column(String(255), nullable=False)  # Creator of the AI model, required field with a maximum length of 255 characters
     description = Column(Text, nullable=True)  # Optional description of the AI model, stored as text for longer entries
-    registered_at = Column(DateTime(timezone=True), server_default=func.now())  # Timestamp for when the model was registered, automatically set to the current time when a new record is created
\ No newline at end of file
+    registered_at = Column(DateTime(timezone=True), server_default=func.now())  # Timestamp for when the model was registered, automatically set to the current time when a new record is created
+
+    __table_args__ = (
+        Index("ix_ai_models_name_id", "name", "id"),  # Registry pages filtered by name, in id order
+        Index("ix_ai_models_creator_id", "creator", "id"),  # Registry pages filtered by creator, in id order
+    )
@@ -0,0 +1,47 @@
+from sqlalchemy import Column, BigInteger, Integer, String, Text, Float, Boolean, DateTime, ForeignKey, Index
+from app.database import Base
+
+# Every finished battle and each fighter's result. Written in batches by the battle history writer
+# (app/services/battle_history.py), read with keyset pagination by GET /battle/history and GET /battle/{battle_id}.
+
+class Battle(Base):
+    __tablename__ = "battles"
+
+    id = Column(String(36), primary_key=True)  # The battle_id handed out by /battle/start (a UUID string)
+    category = Column(String(32), nullable=False)
+    judge = Column(String(255), nullable=False)  # Scores are only comparable within one judge, same as the leaderboard
+    prompt = Column(Text, nullable=False)
+    winner = Column(String(255), nullable=True)  # Null when no fighter produced a scored response
+    batch_judge = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)  # When the battle finished - set by the app so a batch keeps its order
+
+    __table_args__ = (
+        Index("ix_battles_category_judge_created", "category", "judge", "created_at", "id"),  # Filtered history pages, newest first
+        Index("ix_battles_created", "created_at", "id"),  # Unfiltered history pages
+    )
+
+class BattleResult(Base):
+    __tablename__ = "battle_results"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    battle_id = Column(String(36), ForeignKey("battles.id", ondelete="CASCADE"), nullable=False, index=True)
+    model_name = Column(String(255), nullable=False)
+    response = Column(Text, nullable=False, default="")
+    error = Column(Text, nullable=True)
+    overall = Column(Float, nullable=True)  # Null when the judge failed (unscored) or the fighter errored
+    correctness = Column(Integer, nullable=True)
+    reasoning = Column(Integer, nullable=True)
+    completeness = Column(Integer, nullable=True)
+    conciseness = Column(Integer, nullable=True)
+    coherence = Column(Integer, nullable=True)
+    summary = Column(Text, nullable=True)
+    latency_ms = Column(Float, nullable=True)
+    tokens_per_second = Column(Float, nullable=True)
+    ttft_ms = Column(Float, nullable=True)
+    load_ms = Column(Float, nullable=True)
+    prompt_eval_ms = Column(Float, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)  # Copied from the battle so a model's history pages off one index
+
+    __table_args__ = (
+        Index("ix_battle_results_model_created", "model_name", "created_at", "battle_id"),  # History filtered by model, newest first
+    )
@@ -1,31 +1,48 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response, Query
 from pydantic import BaseModel
 from typing import Optional
 import asyncio
-import json
-import random
-from pathlib import Path
-from app.services.providers.ollama_provider import run_model
-from app.services.judge import judge_response
-from app.services.influx import write_benchmark
-from app.services.websocket_manager import manager
-from app.services.redis_service import invalidate_cache, set_cached_leaderboard
-from app.services.influx import query_latest_scores
+import uuid
+from app.services.battle_engine import run_battle
+from app.services.providers.ollama_pool import ollama_pool
+from app.services.providers.residency import residency
+from app.services.battle_queue import enqueue_battle, get_job, save_job, queue_depth
+from app.services.verdict_cache import verdict_cache
+from app.services.tournament import start_tournament, get_tournament
+from app.services.prompt_store import prompt_store, STRATIFY_FIELDS
+from app.services.battle_history import list_battles, get_battle_record, battle_history
 
 router = APIRouter(prefix="/battle", tags=["battle"])
 
 VALID_CATEGORIES = ["reasoning", "coding", "knowledge", "creative"]
 
-#Load prompts from start up
-PROMPT_PATH = Path(__file__).parent.parent / "prompts" / "prompts.json"
-with open(PROMPT_PATH) as f:
-    PROMPT_LIBRARY = json.load(f)   #what does json.load do? it reads the json file and converts it into a python dictionary or list, depending on the structure of the json data. In this case, it likely creates a dictionary where each key is a category and the value is a list of prompts for that category.
+#Prompts come from the JSONL prompt store (app/prompts/prompts.jsonl), indexed on first use and hot reloaded when the file changes
+
+async def _from_prompt_store(method, *args, **kwargs):
+    "Run a prompt store call off the event loop - a library that has never loaded is a 503, not a 500"
+    try:
+        return await asyncio.to_thread(method, *args, **kwargs)
+    except OSError as e:
+        raise HTTPException(status_code=503, detail=f"Prompt library unavailable: {e}")
 
 class BattleRequest(BaseModel):
     category: str
     models: Optional[list[str]] = None
     prompt: Optional[str] = None    #if prompt is provided, use it. Otherwise, select random prompt from category
     judge: str
+    stream_tokens: bool = True  #forward token deltas to websocket clients as battle_token events while the fighters generate
+    wait: bool = True   #False = job mode: enqueue the battle, return its battle_id right away and poll GET /battle/{battle_id}
+    batch_judge: bool = False   #score every fighter in one judge call (fewer judge prefills, but judging starts after the slowest fighter)
+
+class TournamentRequest(BaseModel):
+    category: str
+    models: list[str]
+    judge: str
+    prompts: Optional[int] = None   #how many library prompts to sample from the category, None = every prompt in the category
+    tag: Optional[str] = None   #only prompts with this tag
+    difficulty: Optional[str] = None    #only prompts of this difficulty
+    stratify_by: Optional[str] = None   #"difficulty" or "tag" - sample each stratum in proportion to its size
+    batch_judge: bool = False   #one judge call per prompt covering every model, instead of one per response
 
 class BattleResponse(BaseModel):
     battle_id: str
@@ -37,20 +54,23 @@ class BattleResponse(BaseModel):
 @router.get("/models/available")
 async def get_available_models():
     # Implementation for fetching available models
-    import ollama
     import os
     try:
-        client = ollama.Client(host=os.getenv("OLLAMA_BASE_URL", "http://host.docker.internal:11434"))
-        models = client.list()  #fetch the list of available models from ollama
+        models = await ollama_pool.list_models()  #the models pulled on every ollama host in the pool, cached for a few seconds
         return {
-            "models": [m["name"] for m in models["models"]],   #return the names of the models in a list
+            "models": models,   #return the names of the models in a list
             "judge": os.getenv("JUDGE_MODEL", "deepseek-r1")
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching models: {e}")
+
+@router.get("/models/hosts")
+async def get_ollama_hosts():
+    "Health, in-flight requests and resident models for every Ollama host in the pool, plus warm-up counters"
+    return {"hosts": ollama_pool.status(), "residency": residency.stats()}
     
 @router.post("/start")
-async def start_battle(request: BattleRequest):
+async def start_battle(request: BattleRequest, response: Response):
     if request.category not in VALID_CATEGORIES:
         raise HTTPException(status_code=400, detail=f"Invalid category. Must be one of {VALID_CATEGORIES}")
     
@@ -60,87 +80,149 @@ async def start_battle(request: BattleRequest):
     if request.judge in request.models:
         raise HTTPException(status_code=400, detail="Judge cannot be in models due to bias")
     
-    prompt = request.prompt or random.choice(PROMPT_LIBRARY[request.category])   #if the client doesn't provide a prompt, we select a random prompt from the PROMPT_LIBRARY based on the requested category. This ensures that we always have a valid prompt to use for the battle, even if the client doesn't specify one.
-
-    print(f"Starting battle with prompt: {prompt} for models: {request.models}")
-
-    await manager.broadcast({
-        "type": "battle_start",
+    prompt = request.prompt
+    if not prompt:  #no prompt given - draw the next one from the category, no repeats until the category has been cycled through
+        entry = await _from_prompt_store(prompt_store.draw, request.category)
+        if entry is None:
+            raise HTTPException(status_code=400, detail=f"No prompts in the library for category {request.category}")
+        prompt = entry["prompt"]
+    battle_id = str(uuid.uuid4())  #generate a unique ID for this battle, which can be used for tracking and referencing the battle in the future if needed.
+    job = {
         "category": request.category,
         "models": request.models,
-        "prompt": prompt,
         "judge": request.judge,
-    })
-
-    # Run models and judge asynchronously
-    print("> Running models...")
-    model_tasks = [run_model(model, prompt) for model in request.models]    #create list of asynchronous tasks to run each model with the given prompt.
-    battle_results = await asyncio.gather(*model_tasks) #run_model is an asynchronous function that takes a model name and a prompt, runs the model with the prompt, and returns the result. By using asyncio.gather, we can run all the models concurrently and wait for all of them to finish before proceeding to the judging step.
-    #battle_results will be a list of results corresponding to each model, in the same order as the request.models list. Each result should contain the model's response to the prompt, and possibly other metadata like latency or token usage.
-
-    print("> Judging results...")
-    results = []
-    for result in battle_results:
-        if result.error:
-            print(f"Error running model: {result.error}")
-            continue
-        else:
-            print(f"Model response: {result.model_name}...")
-            scores = judge_response(prompt, result.response, request.judge)
-
-        if not result.error:
-            write_benchmark(result.model_name, "accuracy", scores["overall"], category=request.category, judge=request.judge)  #write the overall accuracy to InfluxDB for benchmarking purposes, so we can track how each model performs over time and see trends in their performance.
-            write_benchmark(result.model_name, "latency_ms", result.latency_ms, category=request.category, judge=request.judge)  #also write latency as a benchmark metric, since it's an important aspect of model performance that we want to track and compare across models.
-            write_benchmark(result.model_name, "tokens_per_second", result.tokens_per_second, category=request.category, judge=request.judge)  #also write tokens per second as a benchmark metric, since it's another important aspect of model performance that we want to track and compare across models.)
-            
-        results.append({
-            "model": result.model_name,
-            "response": result.response,
-            "latency_ms": result.latency_ms,
-            "tokens_per_second": result.tokens_per_second,
-            "scores": scores,
-            "error": result.error
-        })
-
-    # Determine winner based on overall score
-    valid_results = [r for r in results if not r["error"]]
-    winner = max(valid_results, key=lambda r: r["scores"]["overall"])["model"] if valid_results else "No valid responses"
-
-    #update leaderboard cache in Redis
-    await invalidate_cache(request.category, request.judge)
-    leaderboard = query_latest_scores(request.category, request.judge)
-    await set_cached_leaderboard(leaderboard, request.category, request.judge, "accuracy")
-
-    #broadcast results to WebSocket clients
-    await manager.broadcast({
-        "type": "battle_results",
-        "category": request.category,
         "prompt": prompt,
-        "results": results,
-        "winner": winner,
-        "leaderboard": leaderboard
-    })
-       
-    print(f"Battle complete! Winner: {winner}")
-
-    import uuid
-    return {
-        "battle_id": str(uuid.uuid4()),  #generate a unique ID for this battle, which can be used for tracking and referencing the battle in the future if needed.
-        "category": request.category,
-        "prompt": prompt,
-        "results": results,
-        "winner": winner
+        "stream_tokens": request.stream_tokens,
+        "batch_judge": request.batch_judge
     }
 
+    if not request.wait:
+        #job mode: hand the battle to the queue workers and return immediately, poll GET /battle/{battle_id} for the result
+        try:
+            await enqueue_battle(battle_id, job)
+        except Exception as e:
+            raise HTTPException(status_code=503, detail=f"Battle queue unavailable: {e}")
+        response.status_code = 202
+        return {"battle_id": battle_id, "state": "queued", "status_url": f"/battle/{battle_id}"}
+
+    result = await run_battle(battle_id, **job)
+    try:
+        await save_job(battle_id, state="done", request=job, result=result)   #so GET /battle/{id} also works for synchronous battles
+    except Exception as e:
+        print(f"Could not record battle {battle_id}: {e}")
+    return result
+
+@router.post("/tournament", status_code=202)
+async def create_tournament(request: TournamentRequest):
+    "Run every model on M prompts from a category, scheduled model-by-model to avoid weight swaps. Progress streams over the websocket"
+    if request.category not in VALID_CATEGORIES:
+        raise HTTPException(status_code=400, detail=f"Invalid category. Must be one of {VALID_CATEGORIES}")
+    if len(request.models) < 2:
+        raise HTTPException(status_code=400, detail="At least 2 models must be provided for a tournament.")
+    if request.judge in request.models:
+        raise HTTPException(status_code=400, detail="Judge cannot be in models due to bias")
+
+    if request.prompts is not None and request.prompts < 1:
+        raise HTTPException(status_code=400, detail="prompts must be at least 1")
+    if request.stratify_by is not None and request.stratify_by not in STRATIFY_FIELDS:
+        raise HTTPException(status_code=400, detail=f"stratify_by must be one of {list(STRATIFY_FIELDS)}")
+    entries = await _from_prompt_store(prompt_store.sample, request.category, request.prompts,
+                                       tag=request.tag, difficulty=request.difficulty, stratify_by=request.stratify_by)
+    if not entries:
+        raise HTTPException(status_code=400, detail="No library prompts match the category and filters")
+    prompts = [entry["prompt"] for entry in entries]
+
+    tournament_id = str(uuid.uuid4())
+    await start_tournament(tournament_id, category=request.category, models=request.models, judge=request.judge, prompts=prompts,
+                           batch_judge=request.batch_judge)
+    return {"tournament_id": tournament_id, "state": "queued", "status_url": f"/battle/tournament/{tournament_id}"}
+
+@router.get("/tournament/{tournament_id}")
+async def get_tournament_status(tournament_id: str):
+    try:
+        state = await get_tournament(tournament_id)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Tournament store unavailable: {e}")
+    if not state:
+        raise HTTPException(status_code=404, detail="Tournament not found")
+    return state
+
+@router.get("/queue")
+async def get_queue_status():
+    "How many battles are waiting for a worker"
+    try:
+        return {"queued": await queue_depth()}
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Battle queue unavailable: {e}")
+
+@router.get("/judge/cache")
+async def get_verdict_cache_stats():
+    "Hit/miss counters for the judge verdict cache"
+    return verdict_cache.stats()
+
+@router.get("/prompts")
+async def get_prompt_library():
+    "Prompt counts per category and the difficulties available, from the current version of the library file"
+    return await _from_prompt_store(prompt_store.stats)
+
+@router.post("/prompts/reload")
+async def reload_prompt_library():
+    "Re-index the prompt library now instead of waiting for the mtime check"
+    try:
+        return await asyncio.to_thread(prompt_store.reload)
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"Could not load prompt library: {e}")
+
 @router.get("/prompts/{category}")
-async def get_prompts(category: str):
-    "preview available prompts for a category"
+async def get_prompts(category: str, offset: int = 0, limit: int = 50, tag: Optional[str] = None, difficulty: Optional[str] = None):
+    "preview available prompts for a category, one page at a time"
     if category not in VALID_CATEGORIES:
         raise HTTPException(
             status_code=400, 
             detail=f"Invalid category. Must be one of {VALID_CATEGORIES}"
         )
+    if offset < 0 or not 1 <= limit <= 500:
+        raise HTTPException(status_code=400, detail="offset must be >= 0 and limit between 1 and 500")
+    total, prompts = await _from_prompt_store(prompt_store.page, category, offset, limit, tag=tag, difficulty=difficulty)
     return {
         "category": category,
-        "prompts": PROMPT_LIBRARY[category]
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "prompts": prompts
     }
+
+@router.get("/history")    #must stay above /{battle_id}, or "history" would be taken for a battle id
+async def get_battle_history(category: Optional[str] = None, judge: Optional[str] = None, model: Optional[str] = None,
+                             limit: int = Query(50, ge=1, le=200), cursor: Optional[str] = None):
+    "Finished battles newest first, keyset paginated - pass next_cursor back as cursor for the next page"
+    try:
+        battles, next_cursor = await list_battles(category, judge, model, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Battle history unavailable: {e}")
+    return {"battles": battles, "next_cursor": next_cursor}
+
+@router.get("/history/stats")
+async def get_battle_history_stats():
+    "Counters for the background Postgres history writer"
+    return battle_history.stats()
+
+@router.get("/{battle_id}")
+async def get_battle(battle_id: str):
+    "State of a queued/running battle, and its results once done - from Postgres once the Redis job has expired"
+    try:
+        job = await get_job(battle_id)
+    except Exception as e:
+        print(f"Battle queue unavailable, checking history: {e}")
+        job = None
+    if job:
+        return {"battle_id": battle_id, **job}
+    try:
+        record = await get_battle_record(battle_id)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Battle history unavailable: {e}")
+    if not record:
+        raise HTTPException(status_code=404, detail="Battle not found")
+    return {"battle_id": battle_id, "state": "done", "result": record}    #same shape as a finished job
@@ -1,32 +1,92 @@
-from fastapi import APIRouter, HTTPException
-from app.services.influx import query_benchmarks, query_latest_scores
-from app.services.redis_service import set_cached_leaderboard, get_cached_leaderboard
+from fastapi import APIRouter, HTTPException, Query, Request
+from pydantic import BaseModel
+from typing import Optional
+from app.services.influx import query_benchmarks, benchmark_writer, write_benchmark
+from app.services.ingest import ingest, FORMATS
+from app.services.rollups import query_benchmark_series, pick_resolution, RESOLUTIONS, AGGREGATES
+from app.services.leaderboard import get_leaderboard as load_leaderboard
+from app.services.ratings import get_ratings, refit_ratings
+from app.routers.battle import VALID_CATEGORIES
 
 router = APIRouter(prefix="/benchmarks", tags=["Benchmarks"])
 
 # Valid metrics models can submit
-VALID_METRICS = {"accuracy", "latency_ms", "tokens_per_second", "memory_mb"}
+VALID_METRICS = {"accuracy", "latency_ms", "tokens_per_second", "memory_mb", "ttft_ms", "itl_ms_mean", "itl_ms_p95", "load_ms", "prompt_eval_ms"}
 
 # This file defines the API endpoints for submitting and retrieving benchmark data for AI models.
 
+class BenchmarkSubmit(BaseModel):
+    model_name: str
+    metric: str
+    value: float
+    category: str
+    judge: str
+
+    model_config = {"protected_namespaces": ()}    #model_name is a field here, not pydantic's model_ namespace
+
+@router.post("/")
+async def submit_benchmark(benchmark: BenchmarkSubmit):
+    "Submit one benchmark point - queued for the background InfluxDB writer like a battle's"
+    if benchmark.metric not in VALID_METRICS:
+        raise HTTPException(status_code=400, detail=f"Invalid metric. Must be one of: {VALID_METRICS}")
+    await write_benchmark(benchmark.model_name, benchmark.metric, benchmark.value, benchmark.category, benchmark.judge)
+    return {"status": "queued"}
+
+@router.post("/ingest")
+async def ingest_benchmarks(request: Request, format: Optional[str] = None):
+    """Bulk import from a streamed NDJSON or line-protocol body, one point per line. format defaults from the
+    Content-Type (application/x-ndjson or application/json = ndjson, anything else = lp). Bad lines are skipped and reported"""
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "ndjson" if "json" in content_type else "lp"    #covers application/x-ndjson
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Must be one of: {sorted(FORMATS)}")
+    return await ingest(request.stream(), format, VALID_METRICS)
+
 @router.get("/leaderboard/latest")
 async def get_leaderboard(category: str, judge: str, metric: str = "accuracy"):
-    #try cache first
-    cached = await get_cached_leaderboard(category, judge, metric)
-    if cached:
-        return {"leaderboard": cached, "source": "cache"}
-    
-    #cache miss, query InfluxDB
-    results = query_latest_scores(category, judge, metric)
-    await set_cached_leaderboard(results, category, judge, metric)  #update cache with fresh data from InfluxDB
-    return {"leaderboard": results, "source": "influxdb"}
+    #served from the Redis sorted set, InfluxDB is only touched to seed a cold board
+    if category not in VALID_CATEGORIES:    #checked before any Redis key is built from them
+        raise HTTPException(status_code=400, detail=f"Invalid category. Must be one of {VALID_CATEGORIES}")
+    if metric not in VALID_METRICS:
+        raise HTTPException(status_code=400, detail=f"Invalid metric. Must be one of: {VALID_METRICS}")
+    results, source = await load_leaderboard(category, judge, metric)
+    return {"leaderboard": results, "source": source}
+
+@router.get("/ratings")
+async def get_model_ratings(category: str, judge: str):
+    "Head-to-head ratings for one (category, judge) - Elo updated every battle, Bradley-Terry + 95% CI after a refit"
+    return {"category": category, "judge": judge, "ratings": await get_ratings(category, judge)}
+
+@router.post("/ratings/refit")
+async def refit_model_ratings(category: str, judge: str, bootstrap: int = 100):
+    "Refit Bradley-Terry over the full battle history with bootstrap confidence intervals"
+    if not 0 <= bootstrap <= 1000:
+        raise HTTPException(status_code=400, detail="bootstrap must be between 0 and 1000")
+    return {"category": category, "judge": judge, "ratings": await refit_ratings(category, judge, bootstrap)}
+
+@router.get("/writer/stats")
+async def get_writer_stats():
+    "Counters for the background InfluxDB batch writer"
+    return benchmark_writer.stats()
 
 @router.get("/{model_name}/{metric}")
-async def get_benchmarks(model_name: str, metric: str, hours: int = 1):
+async def get_benchmarks(model_name: str, metric: str, hours: int = Query(1, ge=1, le=24 * 366),
+                         resolution: str = "auto", agg: str = "mean"):
+    "Benchmark history - raw points, or one aggregate (mean/min/max/p95) per window; auto picks the window from hours"
     if metric not in VALID_METRICS:
         raise HTTPException(
             status_code=400,
             detail=f"Invalid metric. Must be one of: {VALID_METRICS}"
         )
-    results = query_benchmarks(model_name, metric, hours)
-    return {"model_name": model_name, "metric": metric, "data": results}
\ No newline at end of file
+    if resolution != "auto" and resolution != "raw" and resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"Invalid resolution. Must be auto, raw or one of: {list(RESOLUTIONS)}")
+    if agg not in AGGREGATES:
+        raise HTTPException(status_code=400, detail=f"Invalid agg. Must be one of: {list(AGGREGATES)}")
+    if resolution == "auto":
+        resolution = pick_resolution(hours)
+    if resolution == "raw":
+        results, source = await query_benchmarks(model_name, metric, hours), "raw"
+        return {"model_name": model_name, "metric": metric, "resolution": "raw", "source": source, "data": results}
+    results, source = await query_benchmark_series(model_name, metric, hours, resolution, agg)
+    return {"model_name": model_name, "metric": metric, "resolution": resolution, "agg": agg, "source": source, "data": results}
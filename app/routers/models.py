@@ -1,4 +1,5 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, Query
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
@@ -6,6 +7,7 @@ from typing import Optional
 from datetime import datetime
 from app.database import get_db
 from app.models.ai_model import AIModel
+from app.services.model_registry import registry_cache
 
 router = APIRouter(prefix="/models", tags=["models"])
 
@@ -37,20 +39,50 @@ async def register_model(model: ModelCreate, db: AsyncSession = Depends(get_db))
     db.add(new_model)   #adds the new model instance to the database session
     await db.commit()   #commits the transaction to save the new model to the databsase
     await db.refresh(new_model) #refreshes the new_model instance to get the updated data from the database, including the generated ID and timestamp
+    await registry_cache.bump()     #new registry version - cached pages and ETags handed out so far are stale
     return new_model    #returns the newly created model, which will be serialized to JSON using the ModelResponse schema defined earlier
 
-@router.get("/", response_model=list[ModelResponse])    #Endpoint to list all registered AI models, returns a list of ModelResponse Objects
-async def list_models(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(AIModel))
-    return result.scalars().all()
+def _cached_response(etag: str | None, body, headers: dict | None = None) -> Response:
+    "304 when the client's copy is current (body is None), else the JSON body - with the ETag either way so it can revalidate next time"
+    headers = dict(headers or {})
+    if etag:
+        headers["ETag"] = etag
+        headers["Cache-Control"] = "no-cache"   #clients may keep the copy but must revalidate - a 304 costs no query
+    if body is None:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(body, headers=headers)
+
+@router.get("/", response_model=list[ModelResponse])    #Endpoint to list registered AI models one page at a time, returns a list of ModelResponse Objects
+async def list_models(request: Request, name: Optional[str] = None, creator: Optional[str] = None,
+                      after: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=500), db: AsyncSession = Depends(get_db)):
+    "Keyset paginated by id - when there are more rows the X-Next-After header holds the after= value for the next page"
+    async def load():
+        query = select(AIModel).where(AIModel.id > after)   #seek past the last id seen instead of OFFSET, so deep pages cost the same
+        if name:
+            query = query.where(AIModel.name == name)
+        if creator:
+            query = query.where(AIModel.creator == creator)
+        rows = (await db.execute(query.order_by(AIModel.id).limit(limit + 1))).scalars().all()    #one extra row says whether there is a next page
+        page = [ModelResponse.model_validate(m).model_dump(mode="json") for m in rows[:limit]]
+        return {"models": page, "next_after": page[-1]["id"] if len(rows) > limit else None}
+
+    etag, body = await registry_cache.get(("list", name, creator, after, limit), load, request.headers.get("if-none-match"))
+    if body is None:
+        return _cached_response(etag, None)
+    headers = {"X-Next-After": str(body["next_after"])} if body["next_after"] is not None else None
+    return _cached_response(etag, body["models"], headers)
 
 @router.get("/{model_id}", response_model=ModelResponse)    #Endpoint to get details of a specific AI model by its ID, returns a ModelResponse Object if found, otherwise raises a 404 error
-async def get_model(model_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(AIModel).where(AIModel.id == model_id))
-    model = result.scalar_one_or_none()
-    if not model:
+async def get_model(model_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    async def load():
+        result = await db.execute(select(AIModel).where(AIModel.id == model_id))
+        model = result.scalar_one_or_none()
+        return ModelResponse.model_validate(model).model_dump(mode="json") if model else {}    #{} caches the miss too, until the next registration
+
+    etag, body = await registry_cache.get(("model", model_id), load, request.headers.get("if-none-match"))
+    if body == {}:
         raise HTTPException(status_code=404, detail="Model not found")
-    return model
+    return _cached_response(etag, body)
 
 #this file defines the api endpoints for managing ai models, including registring 
 #new models, listing all models, and retrieving details of a specific model.
@@ -1,38 +1,132 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from app.services.websocket_manager import manager
-from app.services.redis_service import get_cached_leaderboard, get_pubsub
+from app.services.websocket_manager import manager, TOPIC_FIELDS
+from app.services.event_bus import event_bus
+from app.services.leaderboard import get_leaderboard
+from app.services.providers.ollama_pool import ollama_pool, _normalize
+from app.routers.battle import VALID_CATEGORIES
 import json
 import asyncio
+import os
 
 router = APIRouter(tags=["WebSocket"])
 
+WS_MAX_TOPIC_VALUES = int(os.getenv("WS_MAX_TOPIC_VALUES", "8"))    #values per topic field a client may subscribe to
+WS_MAX_LEADERBOARDS = int(os.getenv("WS_MAX_LEADERBOARDS", "8"))    #(category, judge) pairs per client - each costs a snapshot load
+
+@router.get("/ws/stats")
+async def websocket_stats():
+    "Connected clients and outgoing queue depth across them, plus this worker's cross-worker event relay"
+    return {**manager.stats(), "relay": event_bus.stats()}
+
+def _topic_values(value) -> list[str]:
+    "Accepts a single value, a comma-separated string or a list"
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = [value]
+    return [v.strip() for item in value for v in str(item).split(",") if v.strip()]
+
+async def _send_snapshots(websocket: WebSocket, pairs: list[tuple[str, str]]):
+    "One init message per subscribed (category, judge) leaderboard, loaded concurrently"
+    if not pairs:
+        await manager.send(websocket, {"type": "init", "leaderboard": []})  #no leaderboard topic to load - the client fetches its own
+        return
+
+    async def snapshot(category: str, judge: str) -> dict:
+        try:
+            leaderboard, _ = await get_leaderboard(category, judge)
+        except Exception as e:
+            print(f"Could not fetch initial leaderboard for {category}/{judge}: {e}")
+            leaderboard = []
+        return {"type": "init", "category": category, "judge": judge, "leaderboard": leaderboard}
+
+    for message in await asyncio.gather(*(snapshot(c, j) for c, j in pairs)):
+        await manager.send(websocket, message)
+
+def _leaderboard_pairs(subscription: dict) -> list[tuple[str, str]]:
+    return [(c, j) for c in subscription.get("category", []) for j in subscription.get("judge", [])]
+
+async def _known_judges() -> set[str]:
+    "The configured judge plus every model pulled in the Ollama pool - no other model can have judged a battle"
+    judges = {os.getenv("JUDGE_MODEL", "deepseek-r1")}
+    try:
+        judges.update(await ollama_pool.list_models())
+    except Exception as e:
+        print(f"Could not list judge models: {e}")
+    return {_normalize(j) for j in judges}
+
+async def _check_topics(topics: dict, current: dict) -> str | None:
+    "Why subscribing to these topics on top of current is refused, or None if it is allowed"
+    unknown = [c for c in topics.get("category", []) if c not in VALID_CATEGORIES]
+    if unknown:
+        return f"Unknown category {unknown}. Must be one of {VALID_CATEGORIES}"
+    if topics.get("judge"):
+        judges = await _known_judges()
+        unknown = [j for j in topics["judge"] if _normalize(j) not in judges]
+        if unknown:
+            return f"Unknown judge {unknown}. See GET /battle/models/available"
+    merged = {field: set(current.get(field, [])) | set(topics.get(field, [])) for field in TOPIC_FIELDS}
+    for field, values in merged.items():
+        if len(values) > WS_MAX_TOPIC_VALUES:
+            return f"At most {WS_MAX_TOPIC_VALUES} {field} values per client"
+    if len(merged["category"]) * len(merged["judge"]) > WS_MAX_LEADERBOARDS:
+        return f"At most {WS_MAX_LEADERBOARDS} (category, judge) leaderboards per client"
+    return None
+
 @router.websocket("/ws/leaderboard")
 async def leaderboard_websocket(websocket: WebSocket):
+    # Topics can be set on connect (?category=coding&judge=llama3&type=battle_results, comma-separated or repeated)
+    # and changed later with {"action": "subscribe" | "unsubscribe", "category": [...], "judge": [...], "type": [...]}.
+    # A client that never subscribes gets every event.
     await manager.connect(websocket)
 
     try:
-        # Send current leaderboard on connect — try cache first
-        try:
-            leaderboard = await get_cached_leaderboard() or []
-            await websocket.send_text(json.dumps({
-                "type": "init",
-                "leaderboard": leaderboard
-            }))
-        except Exception as e:
-            print(f"Could not fetch initial leaderboard: {e}")
-            await websocket.send_text(json.dumps({
-                "type": "init",
-                "leaderboard": []
-            }))
+        params = websocket.query_params
+        topics = {field: _topic_values(params.getlist(field)) for field in TOPIC_FIELDS}
+        error = await _check_topics(topics, {})
+        if error:
+            await manager.send(websocket, {"type": "error", "detail": error})
+            topics = {}     #connected with an unfiltered feed - the client can subscribe again within the limits
+        subscription = manager.subscribe(websocket, **topics)
+        await _send_snapshots(websocket, _leaderboard_pairs(subscription))
 
-        # Keep connection alive, listen for pings
+        # Keep connection alive, listen for pings and subscription changes
         while True:
             data = await websocket.receive_text()
             if data == "ping":
-                await websocket.send_text('{"type": "pong"}')
+                await manager.send(websocket, {"type": "pong"})
+                continue
+
+            try:
+                request = json.loads(data)
+                action = request.get("action")
+            except (ValueError, AttributeError):
+                await manager.send(websocket, {"type": "error", "detail": "Expected 'ping' or a JSON subscribe/unsubscribe message"})
+                continue
+
+            topics = {field: _topic_values(request.get(field)) for field in TOPIC_FIELDS}
+            if action == "subscribe":
+                error = await _check_topics(topics, {} if request.get("replace") else manager.subscription(websocket))
+                if error:
+                    await manager.send(websocket, {"type": "error", "detail": error})
+                    continue    #the existing subscription is left as it was
+                before = set(_leaderboard_pairs(manager.subscription(websocket)))
+                if request.get("replace"):
+                    manager.unsubscribe(websocket, **manager.subscription(websocket))
+                    before = set()
+                subscription = manager.subscribe(websocket, **topics)
+                await manager.send(websocket, {"type": "subscribed", "topics": subscription})
+                new_pairs = [pair for pair in _leaderboard_pairs(subscription) if pair not in before]
+                if new_pairs:
+                    await _send_snapshots(websocket, new_pairs)     #only the leaderboards the client didn't have yet
+            elif action == "unsubscribe":
+                subscription = manager.unsubscribe(websocket, **topics)
+                await manager.send(websocket, {"type": "subscribed", "topics": subscription})
+            else:
+                await manager.send(websocket, {"type": "error", "detail": f"Unknown action {action!r}"})
 
     except WebSocketDisconnect:
         manager.disconnect(websocket)
     except Exception as e:
         print(f"WebSocket error: {e}")
-        manager.disconnect(websocket)
\ No newline at end of file
+        manager.disconnect(websocket)
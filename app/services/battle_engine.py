@@ -0,0 +1,164 @@
+import asyncio
+import time
+from typing import Optional
+from app.services.providers.ollama_provider import run_model
+from app.services.providers.residency import residency
+from app.services.judge import judge_response_async, judge_batch_async
+from app.services.influx import write_benchmarks
+from app.services.event_bus import event_bus
+from app.services.leaderboard import get_leaderboard, record_result
+from app.services.ratings import update_ratings
+from app.services.battle_history import battle_history
+from app.services.metrics import timed, record, start_battle_timings, battles
+
+# The battle pipeline itself - shared by the synchronous /battle/start path and the queue workers
+
+async def record_verdict(result, scores: dict, category: str, judge: str, load_ms: float) -> dict:
+    "Write one judged response's metrics to InfluxDB and the live leaderboards - shared by battles and tournaments"
+    metrics = {
+        "accuracy": scores["overall"],
+        "latency_ms": result.latency_ms,
+        "tokens_per_second": result.tokens_per_second,
+        "ttft_ms": result.ttft_ms,     #time to first token, separates prompt eval from generation speed (load is excluded)
+        "itl_ms_mean": result.itl_ms_mean,
+        "itl_ms_p95": result.itl_ms_p95,
+        "load_ms": load_ms,
+        "prompt_eval_ms": result.prompt_eval_ms,
+    }
+    if scores.get("unscored"):
+        del metrics["accuracy"]     #the judge failed - keep the zero placeholder off the leaderboard
+    #queued for the background batch writer, so InfluxDB round trips never sit on the critical path
+    with timed("influx_enqueue"):
+        await write_benchmarks(result.model_name, metrics, category=category, judge=judge)
+    await record_result(category, judge, result.model_name, metrics)    #ZADD into the live leaderboards
+    return metrics
+
+async def run_battle(battle_id: str, category: str, models: list[str], judge: str, prompt: str, stream_tokens: bool = True,
+                     batch_judge: bool = False) -> dict:
+    """Run every fighter on the prompt, judge each one as it finishes, record metrics and broadcast progress.
+    With batch_judge, the judge waits for every fighter and scores them all in one call instead"""
+    print(f"Starting battle {battle_id} with prompt: {prompt} for models: {models}")
+    started = time.perf_counter()
+    timings = start_battle_timings()    #every task spawned below inherits this, so their stage timings land here too
+
+    await event_bus.publish({
+        "type": "battle_start",
+        "battle_id": battle_id,
+        "category": category,
+        "models": models,
+        "prompt": prompt,
+        "judge": judge,
+    })
+
+    async def forward_token(model_name: str, delta: str):
+        await event_bus.publish({
+            "type": "battle_token",
+            "battle_id": battle_id,
+            "category": category,
+            "judge": judge,
+            "model": model_name,
+            "delta": delta,
+        })
+
+    on_token = forward_token if stream_tokens else None
+
+    #load every fighter and the judge before the clock starts, so a cold model isn't penalised for its load time
+    with timed("warmup"):
+        warmup_ms = await residency.warm([*models, judge])
+
+    async def judge_and_record(result, scores: Optional[dict] = None) -> Optional[dict]:
+        #scores one fighter as soon as it finishes, so judging overlaps with the fighters still generating
+        if result.error:
+            print(f"Error running model: {result.error}")
+            return None
+
+        print(f"Model response: {result.model_name}...")
+        if scores is None:
+            scores = await judge_response_async(prompt, result.response, judge)
+        metrics = await record_verdict(result, scores, category, judge,
+                                       warmup_ms.get(result.model_name, 0.0) + result.load_ms)     #untimed warm-up load + any reload mid-run
+
+        entry = {
+            "model": result.model_name,
+            "response": result.response,
+            "latency_ms": result.latency_ms,
+            "tokens_per_second": result.tokens_per_second,
+            "ttft_ms": result.ttft_ms,
+            "itl_ms_mean": result.itl_ms_mean,
+            "itl_ms_p95": result.itl_ms_p95,
+            "load_ms": metrics["load_ms"],
+            "prompt_eval_ms": result.prompt_eval_ms,
+            "scores": scores,
+            "error": result.error
+        }
+        #push each model's score out as it lands instead of waiting for the slowest fighter
+        await event_bus.publish({
+            "type": "battle_score",
+            "battle_id": battle_id,
+            "category": category,
+            "judge": judge,
+            **entry
+        })
+        return entry
+
+    # Run fighters concurrently and hand each one to the judge the moment it finishes
+    print("> Running models...")
+    async def fight(index: int, model: str):
+        return index, await run_model(model, prompt, on_token=on_token)
+
+    judge_tasks = {}
+    if batch_judge:
+        #one judge call for the whole battle - no overlap with generation, but one prefill instead of one per fighter
+        fighters = dict(await asyncio.gather(*(fight(i, model) for i, model in enumerate(models))))
+        answered = {i: r for i, r in fighters.items() if not r.error}
+        verdicts = await judge_batch_async(prompt, {r.model_name: r.response for r in answered.values()}, judge) if answered else {}
+        for index, result in fighters.items():
+            judge_tasks[index] = asyncio.create_task(judge_and_record(result, verdicts.get(result.model_name)))
+    else:
+        for finished in asyncio.as_completed([fight(i, model) for i, model in enumerate(models)]):  #yields fighters in completion order, not request order
+            index, result = await finished
+            judge_tasks[index] = asyncio.create_task(judge_and_record(result))
+
+    print("> Waiting on judge...")
+    await asyncio.gather(*judge_tasks.values())
+    results = [judge_tasks[i].result() for i in sorted(judge_tasks) if judge_tasks[i].result()]   #report in the order the client asked for
+
+    # Determine winner based on overall score
+    valid_results = [r for r in results if not r["error"] and not r["scores"].get("unscored")]
+    winner = max(valid_results, key=lambda r: r["scores"]["overall"])["model"] if valid_results else "No valid responses"
+
+    try:
+        with timed("ratings_update"):
+            await update_ratings(category, judge, results)  #incremental Elo from this battle's head-to-head outcomes
+    except Exception as e:
+        print(f"Error updating ratings: {e}")
+
+    leaderboard, _ = await get_leaderboard(category, judge)    #already updated incrementally as each model was scored
+
+    #broadcast results to WebSocket clients
+    await event_bus.publish({
+        "type": "battle_results",
+        "battle_id": battle_id,
+        "category": category,
+        "prompt": prompt,
+        "judge": judge,
+        "results": results,
+        "winner": winner,
+        "leaderboard": leaderboard
+    })
+       
+    record("battle", time.perf_counter() - started)
+    battles.inc("ok" if valid_results else "no_valid_responses")
+    timings_ms = {stage: round(seconds * 1000, 1) for stage, seconds in timings.items()}
+    print(f"Battle complete! Winner: {winner} - stage timings (ms): {timings_ms}")
+
+    battle = {
+        "battle_id": battle_id,
+        "category": category,
+        "prompt": prompt,
+        "results": results,
+        "winner": winner,
+        "timings_ms": timings_ms    #longest single call per stage, e.g. the slowest fighter and the slowest judge call
+    }
+    await battle_history.record(battle, judge, batch_judge)     #queued for the Postgres history writer, never waits on the database
+    return battle
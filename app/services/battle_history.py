@@ -0,0 +1,157 @@
+import asyncio
+import base64
+import os
+from datetime import datetime, timezone
+from asyncpg.exceptions import DataError, IntegrityConstraintViolationError
+from sqlalchemy import select, tuple_
+from app.database import engine, SessionLocal
+from app.models.battle import Battle, BattleResult
+from app.services.influx_writer import BatchWriter
+
+# Battle history in Postgres. Finished battles are queued and COPY'd in batches by a background task, so a battle
+# never waits on a database round trip. Reads page with a keyset cursor on (created_at, id): every page is one
+# index range scan, however deep into millions of rows it starts.
+
+BATTLE_HISTORY_BATCH_SIZE = int(os.getenv("BATTLE_HISTORY_BATCH_SIZE", "200"))    #battles per COPY
+BATTLE_HISTORY_FLUSH_INTERVAL = float(os.getenv("BATTLE_HISTORY_FLUSH_INTERVAL", "1.0"))
+BATTLE_HISTORY_QUEUE_SIZE = int(os.getenv("BATTLE_HISTORY_QUEUE_SIZE", "5000"))
+BATTLE_HISTORY_RETRIES = 2
+
+BATTLE_COLUMNS = ["id", "category", "judge", "prompt", "winner", "batch_judge", "created_at"]
+RESULT_COLUMNS = ["battle_id", "model_name", "response", "error", "overall", "correctness", "reasoning", "completeness",
+                  "conciseness", "coherence", "summary", "latency_ms", "tokens_per_second", "ttft_ms", "load_ms",
+                  "prompt_eval_ms", "created_at"]
+SCORE_FIELDS = ["correctness", "reasoning", "completeness", "conciseness", "coherence"]
+
+def battle_rows(battle: dict, judge: str, batch_judge: bool = False, created_at: datetime | None = None) -> tuple[tuple, list[tuple]]:
+    "A run_battle result as COPY records - (battle row, result rows) in BATTLE_COLUMNS / RESULT_COLUMNS order"
+    created_at = created_at or datetime.now(timezone.utc)
+    winner = battle["winner"] if any(r["model"] == battle["winner"] for r in battle["results"]) else None   #"No valid responses" is not a model
+    row = (battle["battle_id"], battle["category"], judge, battle["prompt"], winner, batch_judge, created_at)
+    results = []
+    for r in battle["results"]:
+        scores = r.get("scores") or {}
+        scored = not scores.get("unscored") and not r.get("error")
+        results.append((
+            battle["battle_id"], r["model"], r.get("response") or "", r.get("error") or None,
+            scores.get("overall") if scored else None,
+            *(int(scores[k]) if scored and k in scores else None for k in SCORE_FIELDS),
+            scores.get("summary"), r.get("latency_ms"), r.get("tokens_per_second"), r.get("ttft_ms"),
+            r.get("load_ms"), r.get("prompt_eval_ms"), created_at
+        ))
+    return row, results
+
+def encode_cursor(created_at: datetime, battle_id: str) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{battle_id}".encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    "Raises ValueError for anything encode_cursor didn't produce"
+    try:
+        created_at, battle_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(created_at), battle_id
+    except Exception:
+        raise ValueError("invalid cursor")
+
+
+class HistoryWriter(BatchWriter):
+    "Queues finished battles and COPYs them into battles + battle_results in one transaction per batch"
+
+    def __init__(self):
+        super().__init__(None, batch_size=BATTLE_HISTORY_BATCH_SIZE, flush_interval=BATTLE_HISTORY_FLUSH_INTERVAL,
+                         max_queue=BATTLE_HISTORY_QUEUE_SIZE, name="Battle history")
+
+    async def record(self, battle: dict, judge: str, batch_judge: bool = False):
+        await self.submit(battle_rows(battle, judge, batch_judge))
+
+    async def _copy(self, battles: list[tuple], results: list[tuple]):
+        async with engine.connect() as conn:
+            raw = (await conn.get_raw_connection()).driver_connection  #the asyncpg connection - COPY is far cheaper than INSERTs
+            async with raw.transaction():   #SQLAlchemy hasn't sent BEGIN on this connection, so without this each COPY commits on its own
+                await raw.copy_records_to_table("battles", records=battles, columns=BATTLE_COLUMNS)
+                if results:
+                    await raw.copy_records_to_table("battle_results", records=results, columns=RESULT_COLUMNS)
+
+    async def _flush(self, batch: list[tuple[tuple, list[tuple]]]):
+        battles = [row for row, _ in batch]
+        results = [r for _, rows in batch for r in rows]
+        for attempt in range(BATTLE_HISTORY_RETRIES + 1):
+            try:
+                await self._copy(battles, results)
+                self.flushed += len(batch)
+                return
+            except (DataError, IntegrityConstraintViolationError) as e:
+                #Postgres rejected a row - retrying the same batch can't help, so split it until the bad battle is alone
+                if len(batch) == 1:
+                    print(f"Battle history dropped battle {batch[0][0][0]}: {e}")
+                    self.failed += 1
+                    return
+                middle = len(batch) // 2
+                await self._flush(batch[:middle])
+                await self._flush(batch[middle:])
+                return
+            except Exception as e:
+                print(f"Battle history write failed ({attempt + 1}/{BATTLE_HISTORY_RETRIES + 1}): {e}")
+                if attempt < BATTLE_HISTORY_RETRIES:
+                    await asyncio.sleep(0.5 * 2 ** attempt)
+        self.failed += len(batch)
+
+
+def _result_summary(r: BattleResult) -> dict:
+    return {"model": r.model_name, "overall": r.overall, "latency_ms": r.latency_ms,
+            "tokens_per_second": r.tokens_per_second, "error": r.error}
+
+def _result_full(r: BattleResult) -> dict:
+    scores = None
+    if r.overall is not None:
+        scores = {**{k: getattr(r, k) for k in SCORE_FIELDS}, "overall": r.overall, "summary": r.summary}
+    return {"model": r.model_name, "response": r.response, "latency_ms": r.latency_ms, "tokens_per_second": r.tokens_per_second,
+            "ttft_ms": r.ttft_ms, "load_ms": r.load_ms, "prompt_eval_ms": r.prompt_eval_ms, "scores": scores, "error": r.error}
+
+def _battle_dict(b: Battle, results: list[dict]) -> dict:
+    return {"battle_id": b.id, "category": b.category, "judge": b.judge, "prompt": b.prompt, "winner": b.winner,
+            "batch_judge": b.batch_judge, "created_at": b.created_at.isoformat(), "results": results}
+
+async def list_battles(category: str | None = None, judge: str | None = None, model: str | None = None,
+                       limit: int = 50, cursor: str | None = None) -> tuple[list[dict], str | None]:
+    "One page of battles, newest first - returns (battles, cursor for the next page or None)"
+    if model:   #page off the (model_name, created_at) index, then filter the joined battle
+        order = (BattleResult.created_at.desc(), BattleResult.battle_id.desc())
+        query = select(Battle).join(BattleResult, BattleResult.battle_id == Battle.id).where(BattleResult.model_name == model)
+        position = tuple_(BattleResult.created_at, BattleResult.battle_id)
+    else:
+        order = (Battle.created_at.desc(), Battle.id.desc())
+        query = select(Battle)
+        position = tuple_(Battle.created_at, Battle.id)
+    if category:
+        query = query.where(Battle.category == category)
+    if judge:
+        query = query.where(Battle.judge == judge)
+    if cursor:
+        query = query.where(position < tuple_(*decode_cursor(cursor)))  #row comparison - an index seek, not an OFFSET scan
+    query = query.order_by(*order).limit(limit + 1)     #one extra row says whether there is a next page
+
+    async with SessionLocal() as session:
+        battles = (await session.execute(query)).scalars().all()
+        page, more = battles[:limit], len(battles) > limit
+        results: dict[str, list[dict]] = {b.id: [] for b in page}
+        if page:
+            rows = await session.execute(
+                select(BattleResult.battle_id, BattleResult.model_name, BattleResult.overall, BattleResult.latency_ms,
+                       BattleResult.tokens_per_second, BattleResult.error)     #no response text in listings
+                .where(BattleResult.battle_id.in_(results)).order_by(BattleResult.id))
+            for row in rows:
+                results[row.battle_id].append(_result_summary(row))
+    next_cursor = encode_cursor(page[-1].created_at, page[-1].id) if more else None
+    return [_battle_dict(b, results[b.id]) for b in page], next_cursor
+
+async def get_battle_record(battle_id: str) -> dict | None:
+    "A stored battle with every fighter's response and per-dimension scores"
+    async with SessionLocal() as session:
+        battle = await session.get(Battle, battle_id)
+        if battle is None:
+            return None
+        rows = (await session.execute(select(BattleResult).where(BattleResult.battle_id == battle_id).order_by(BattleResult.id))).scalars().all()
+    return _battle_dict(battle, [_result_full(r) for r in rows])
+
+
+battle_history = HistoryWriter()
@@ -0,0 +1,201 @@
+import asyncio
+import json
+import os
+import time
+from redis.exceptions import WatchError
+from app.services.redis_service import redis_client
+from app.services.battle_engine import run_battle
+from app.services.event_bus import WORKER_ID
+
+# Redis-backed battle job queue. /battle/start pushes a job and returns its battle_id right away;
+# worker coroutines (in the API process, or standalone via `python -m app.services.battle_queue`) take and run them.
+# Delivery is at-least-once: a worker BLMOVEs a job into its own processing list and only removes it once the battle
+# has finished. Each process refreshes a heartbeat key while it runs; when a process dies its heartbeat expires and
+# any other process's reaper moves its in-flight jobs back to the front of the queue.
+
+BATTLE_QUEUE_KEY = "battle:queue"
+BATTLE_PROCESSING_KEY = "battle:processing"     #hash: processing list key -> the process (WORKER_ID) that owns it
+BATTLE_WORKERS = int(os.getenv("BATTLE_WORKERS", "2"))     #worker coroutines per process, 0 disables in-process workers
+JOB_TTL_SECONDS = int(os.getenv("BATTLE_JOB_TTL_SECONDS", str(24 * 3600)))  #job status/results are kept for a day
+BATTLE_HEARTBEAT_SECONDS = int(os.getenv("BATTLE_HEARTBEAT_SECONDS", "10"))  #heartbeat refresh and reaper interval
+BATTLE_HEARTBEAT_TTL = 3 * BATTLE_HEARTBEAT_SECONDS    #a process silent this long is presumed dead
+BATTLE_MAX_ATTEMPTS = int(os.getenv("BATTLE_MAX_ATTEMPTS", "3"))   #deliveries before a job that keeps killing workers is failed
+
+_workers: list[asyncio.Task] = []
+
+def _job_key(battle_id: str) -> str:
+    return f"battle:job:{battle_id}"
+
+def _processing_key(worker_id: int) -> str:
+    return f"battle:processing:{WORKER_ID}:{worker_id}"
+
+def _heartbeat_key(owner: str) -> str:
+    return f"battle:heartbeat:{owner}"
+
+async def save_job(battle_id: str, **fields):
+    "Update a job's status hash - dict values are stored as JSON"
+    mapping = {k: json.dumps(v) if isinstance(v, (dict, list)) else str(v) for k, v in fields.items()}
+    mapping["updated_at"] = str(time.time())
+    key = _job_key(battle_id)
+    await redis_client.hset(key, mapping=mapping)
+    await redis_client.expire(key, JOB_TTL_SECONDS)
+
+async def enqueue_battle(battle_id: str, job: dict):
+    "Record the job as queued and push it onto the shared queue"
+    await save_job(battle_id, state="queued", request=job, created_at=time.time())
+    await redis_client.lpush(BATTLE_QUEUE_KEY, json.dumps({"battle_id": battle_id, **job}))
+
+async def get_job(battle_id: str) -> dict | None:
+    job = await redis_client.hgetall(_job_key(battle_id))
+    if not job:
+        return None
+    for field in ("request", "result"):
+        if field in job:
+            job[field] = json.loads(job[field])
+    return job
+
+async def queue_depth() -> int:
+    return await redis_client.llen(BATTLE_QUEUE_KEY)
+
+async def peek_jobs(limit: int) -> list[dict]:
+    "The next `limit` queued jobs, oldest first, without taking them"
+    raw = await redis_client.lrange(BATTLE_QUEUE_KEY, -limit, -1)  #LPUSH + BLMOVE from the right - the oldest jobs sit at the tail
+    return [json.loads(job) for job in reversed(raw)]
+
+async def _beat():
+    await redis_client.set(_heartbeat_key(WORKER_ID), str(time.time()), ex=BATTLE_HEARTBEAT_TTL)
+
+async def _requeue(processing: str) -> int:
+    "Move every job in a processing list back to the front of the queue - jobs over BATTLE_MAX_ATTEMPTS are failed instead"
+    moved = 0
+    while raw := await redis_client.lindex(processing, -1):
+        battle_id = json.loads(raw)["battle_id"]
+        attempts = await redis_client.hincrby(_job_key(battle_id), "attempts", 1)
+        if attempts >= BATTLE_MAX_ATTEMPTS:
+            await redis_client.lrem(processing, 1, raw)
+            await save_job(battle_id, state="failed", error=f"worker lost mid-battle {attempts} times")
+            continue
+        await redis_client.lmove(processing, BATTLE_QUEUE_KEY, "RIGHT", "RIGHT")    #RIGHT = next to be taken
+        await save_job(battle_id, state="queued")
+        moved += 1
+    return moved
+
+async def _claim(processing: str, owner: str) -> bool:
+    "Hand a dead process's processing list over to this process - False if another reaper got to it first"
+    async with redis_client.pipeline(transaction=True) as pipe:
+        try:
+            await pipe.watch(BATTLE_PROCESSING_KEY)
+            if await pipe.hget(BATTLE_PROCESSING_KEY, processing) != owner:
+                return False
+            pipe.multi()
+            pipe.hset(BATTLE_PROCESSING_KEY, processing, WORKER_ID)    #if we die mid-drain our own reaper entry is reaped in turn
+            await pipe.execute()
+            return True
+        except WatchError:     #the hash changed under us - leave it to the next pass rather than race another reaper
+            return False
+
+async def reap_stale_jobs() -> int:
+    "Requeue the in-flight jobs of every process whose heartbeat has expired"
+    requeued = 0
+    for processing, owner in (await redis_client.hgetall(BATTLE_PROCESSING_KEY)).items():
+        if owner == WORKER_ID or await redis_client.exists(_heartbeat_key(owner)):
+            continue
+        if not await _claim(processing, owner):
+            continue
+        requeued += await _requeue(processing)
+        await redis_client.hdel(BATTLE_PROCESSING_KEY, processing)
+    if requeued:
+        print(f"Requeued {requeued} battle(s) from dead workers")
+    return requeued
+
+async def _keeper():
+    "Refresh this process's heartbeat and reap dead processes' jobs, from startup on"
+    while True:
+        try:
+            await _beat()
+            await reap_stale_jobs()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Battle queue heartbeat failed: {e}")
+        await asyncio.sleep(BATTLE_HEARTBEAT_SECONDS)
+
+async def _worker(worker_id: int):
+    print(f"> Battle worker {worker_id} started")
+    processing = _processing_key(worker_id)
+    registered = False
+    while True:
+        try:
+            if not registered:
+                await _beat()   #alive before the list is registered, so no reaper takes it for a dead one
+                await redis_client.hset(BATTLE_PROCESSING_KEY, processing, WORKER_ID)
+                await _requeue(processing)  #left over from an earlier process that had the same WORKER_ID
+                registered = True
+            raw = await redis_client.blmove(BATTLE_QUEUE_KEY, processing, 5, "RIGHT", "LEFT")  #short timeout keeps the loop responsive to cancellation
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Battle worker {worker_id} could not reach Redis: {e}")
+            await asyncio.sleep(2)
+            continue
+        if not raw:
+            continue
+
+        job = json.loads(raw)
+        battle_id = job.pop("battle_id")
+        try:
+            await save_job(battle_id, state="running", worker=f"{WORKER_ID}:{worker_id}")
+            result = await run_battle(battle_id, **job)
+            await save_job(battle_id, state="done", result=result)
+        except asyncio.CancelledError:
+            #shutting down - hand the job back (front of the queue) for another worker instead of failing it
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.lrem(processing, 1, raw)
+                pipe.rpush(BATTLE_QUEUE_KEY, raw)
+                await pipe.execute()
+            await save_job(battle_id, state="queued")
+            raise
+        except Exception as e:
+            print(f"Battle {battle_id} failed: {e}")
+            await save_job(battle_id, state="failed", error=str(e))
+        await redis_client.lrem(processing, 1, raw)
+
+def start_workers(count: int = BATTLE_WORKERS):
+    if count:
+        _workers.append(asyncio.create_task(_keeper()))
+    for i in range(count):
+        _workers.append(asyncio.create_task(_worker(i)))
+
+async def stop_workers():
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    try:
+        await redis_client.delete(_heartbeat_key(WORKER_ID))    #our lists are empty now - no need to wait for the TTL
+    except Exception as e:
+        print(f"Could not clear the battle worker heartbeat: {e}")
+
+async def _run_standalone():
+    #dedicated worker process: no HTTP server, just the writer plus the queue workers
+    from app.services.influx import benchmark_writer
+    from app.services.providers.ollama_pool import ollama_pool
+    from app.services.event_bus import event_bus
+    from app.services.battle_history import battle_history
+    benchmark_writer.start()
+    battle_history.start()
+    ollama_pool.start()
+    event_bus.start(subscribe=False)    #no websocket clients here - only publish, the API workers relay to dashboards
+    start_workers(max(BATTLE_WORKERS, 1))
+    try:
+        await asyncio.gather(*_workers)
+    finally:
+        await stop_workers()
+        await ollama_pool.stop()
+        await ollama_pool.close()
+        await event_bus.stop()
+        await benchmark_writer.stop()
+        await battle_history.stop()
+
+if __name__ == "__main__":
+    asyncio.run(_run_standalone())
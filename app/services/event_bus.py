@@ -0,0 +1,127 @@
+import asyncio
+import json
+import os
+import uuid
+from app.services import redis_service
+from app.services.websocket_manager import manager, topic_of, TOPIC_FIELDS
+from app.services.metrics import timed
+
+# Cross-worker live updates: every event goes straight to this worker's websocket clients, and is also
+# published to Redis so the subscriber task in every other worker/replica relays it to theirs
+
+WORKER_ID = os.getenv("WORKER_ID") or uuid.uuid4().hex[:12]     #origin tag, lets a worker skip its own events coming back
+EVENT_PUBLISH_QUEUE_SIZE = int(os.getenv("EVENT_PUBLISH_QUEUE_SIZE", "10000"))    #events waiting to be published before new ones are dropped
+EVENT_PUBLISH_BATCH = 200   #max PUBLISH commands per pipeline round trip
+EVENT_RESUBSCRIBE_DELAY = 1.0   #seconds between reconnect attempts when the subscription drops
+
+
+class EventBus:
+    "Publishes events to Redis from a background task and relays other workers' events to local clients"
+
+    def __init__(self, worker_id: str = WORKER_ID, max_queue: int = EVENT_PUBLISH_QUEUE_SIZE):
+        self.worker_id = worker_id
+        self.outbox: asyncio.Queue[str] = asyncio.Queue(maxsize=max_queue)
+        self._publisher: asyncio.Task | None = None
+        self._subscriber: asyncio.Task | None = None
+        #counters, exposed through stats()
+        self.published = 0
+        self.relayed = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def start(self, subscribe: bool = True):
+        "Start the publisher, plus the subscriber unless this process has no websocket clients (standalone queue worker)"
+        if self._publisher is None or self._publisher.done():
+            self._publisher = asyncio.create_task(self._publish_loop())
+        if subscribe and (self._subscriber is None or self._subscriber.done()):
+            self._subscriber = asyncio.create_task(self._subscribe_loop())
+        print(f"> Event bus started (worker {self.worker_id})")
+
+    async def stop(self):
+        if self._subscriber:
+            self._subscriber.cancel()
+            await asyncio.gather(self._subscriber, return_exceptions=True)
+            self._subscriber = None
+        if self._publisher:
+            while not self.outbox.empty() and not self._publisher.done():   #give queued events a chance to go out before shutdown
+                await asyncio.sleep(0.01)
+            self._publisher.cancel()
+            await asyncio.gather(self._publisher, return_exceptions=True)
+            self._publisher = None
+
+    async def publish(self, message: dict):
+        "Deliver to local clients now and queue for the other workers - never waits on Redis"
+        with timed("broadcast"):
+            await self._publish(message)
+
+    async def _publish(self, message: dict):
+        if self._publisher is None:
+            await manager.broadcast(message)    #not started (tests, single process without Redis) - local delivery only
+            return
+        topic = topic_of(message)
+        text = json.dumps(message)
+        manager.broadcast_text(text, topic)
+        try:
+            #the topic travels in a small JSON header line in front of the event, so relaying workers can route it
+            #without parsing the event - JSON-encoded because topic values (judge names) are user input
+            self.outbox.put_nowait(json.dumps([self.worker_id, *(topic[field] for field in TOPIC_FIELDS)]) + "\n" + text)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def relay(self, payload: str):
+        "Hand one event from the channel to local clients, unless this worker published it"
+        header, _, text = payload.partition("\n")    #json.dumps never emits a raw newline, so the first one ends the header
+        try:
+            origin, *values = json.loads(header)
+        except (ValueError, TypeError):
+            return
+        if origin == self.worker_id or len(values) != len(TOPIC_FIELDS):
+            return
+        manager.broadcast_text(text, dict(zip(TOPIC_FIELDS, values)))
+        self.relayed += 1
+
+    async def _publish_loop(self):
+        while True:
+            batch = [await self.outbox.get()]
+            while len(batch) < EVENT_PUBLISH_BATCH and not self.outbox.empty():
+                batch.append(self.outbox.get_nowait())
+            try:
+                await redis_service.publish_events(batch)
+                self.published += len(batch)
+            except Exception as e:
+                self.failed += len(batch)
+                print(f"Error publishing {len(batch)} events to Redis: {e}")
+
+    async def _subscribe_loop(self):
+        while True:
+            pubsub = await redis_service.get_pubsub()
+            if pubsub is None:
+                await asyncio.sleep(EVENT_RESUBSCRIBE_DELAY)
+                continue
+            try:
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self.relay(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Event subscription lost, resubscribing: {e}")
+                await asyncio.sleep(EVENT_RESUBSCRIBE_DELAY)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    def stats(self) -> dict:
+        return {
+            "worker_id": self.worker_id,
+            "published": self.published,
+            "relayed": self.relayed,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "pending": self.outbox.qsize()
+        }
+
+
+event_bus = EventBus()
@@ -1,9 +1,12 @@
 from influxdb_client import InfluxDBClient, Point, WritePrecision
 from influxdb_client.client.write_api import SYNCHRONOUS
+from influxdb_client.client.influxdb_client_async import InfluxDBClientAsync
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
+from app.services.influx_writer import BatchWriter
+from app.services import metrics
 
-INFLUXDB_URL = "http://influxdb:8086"
+INFLUXDB_URL = os.getenv("INFLUXDB_URL", "http://influxdb:8086")
 INFLUXDB_TOKEN = os.getenv("INFLUXDB_TOKEN") or ""
 INFLUXDB_ORG = os.getenv("INFLUXDB_ORG") or ""
 INFLUXDB_BUCKET = os.getenv("INFLUXDB_BUCKET") or ""
@@ -32,35 +35,93 @@ client = InfluxDBClient(
 write_api = client.write_api(write_options=SYNCHRONOUS)
 query_api = client.query_api()
 
-LOWER_IS_BETTER = {"latency_ms", "memory_mb"}
+LOWER_IS_BETTER = {"latency_ms", "memory_mb", "ttft_ms", "itl_ms_mean", "itl_ms_p95", "load_ms", "prompt_eval_ms"}
 
-def write_benchmark(model_name: str, metric: str, value: float, category: str, judge: str):
-    "Write a single benchmark data point to InfluxDB"
-    point = (
+def _benchmark_point(model_name: str, metric: str, value: float, category: str, judge: str, time: datetime) -> Point:
+    return (
         Point("benchmark")  #Point is a data structure representing a single measurement in InfluxDB, with a measurement name of "benchmark"
         .tag("model_name", model_name)  #tag is a key-value pair used for indexing and querying in InfluxDB, here we add a tag for the model name
         .tag("metric", metric)  
         .tag("judge",judge)
         .tag("category", category)
         .field("value", float(value))  #field is the actual data value we want to store, here we add a field for the metric value
-        .time(datetime.utcnow(), WritePrecision.NS)
+        .time(time, WritePrecision.NS)
     )
-    write_api.write(bucket=INFLUXDB_BUCKET, org=INFLUXDB_ORG, record=point)
 
-def query_benchmarks(model_name: str, metric: str, hours: int = 1):
+def _write_lines(payload: str):
+    "Blocking write of a line-protocol batch - only ever called from the batch writer's worker thread"
+    with metrics.timed("influx_write"):
+        write_api.write(bucket=INFLUXDB_BUCKET, org=INFLUXDB_ORG, record=payload)
+
+#shared buffered writer - started/stopped with the app in main.py
+benchmark_writer = BatchWriter(_write_lines)
+
+async def write_benchmark(model_name: str, metric: str, value: float, category: str, judge: str):
+    "Queue a single benchmark data point for the background InfluxDB writer"
+    point = _benchmark_point(model_name, metric, value, category, judge, datetime.utcnow())
+    await benchmark_writer.submit(point.to_line_protocol())
+
+async def write_benchmarks(model_name: str, metrics: dict[str, float], category: str, judge: str):
+    "Queue several metrics for one model, all stamped with the same time"
+    now = datetime.utcnow()
+    for metric, value in metrics.items():
+        await benchmark_writer.submit(_benchmark_point(model_name, metric, value, category, judge, now).to_line_protocol())
+
+#Flux queries are constant strings with bind parameters (_name, passed through params=) instead of f-string interpolation,
+#so InfluxDB can reuse the compiled plan and user input can never change the query shape
+BENCHMARKS_QUERY = '''
+    from(bucket: _bucket)
+        |> range(start: _start)
+        |> filter(fn: (r) => r._measurement == "benchmark")
+        |> filter(fn: (r) => r.model_name == _model_name)
+        |> filter(fn: (r) => r.metric == _metric)
+        |> sort(columns: ["_time"], desc: true)
+'''
+
+LATEST_SCORES_QUERY = '''
+    from(bucket: _bucket)
+        |> range(start: -24h)
+        |> filter(fn: (r) => r._measurement == "benchmark")
+        |> filter(fn: (r) => r.category == _category)
+        |> filter(fn: (r) => r.judge == _judge)
+        |> filter(fn: (r) => r.metric == _metric)
+        |> group(columns: ["model_name"])
+        |> last()
+'''
+
+INFLUX_QUERY_POOL_SIZE = int(os.getenv("INFLUX_QUERY_POOL_SIZE", "25"))    #max simultaneous HTTP connections for queries
+
+#async client for reads - created lazily because its aiohttp session must be opened inside the running event loop
+_async_client: InfluxDBClientAsync | None = None
+
+def _get_query_api():
+    global _async_client
+    if _async_client is None:
+        _async_client = InfluxDBClientAsync(
+            url=INFLUXDB_URL,
+            token=INFLUXDB_TOKEN,
+            org=INFLUXDB_ORG,
+            connection_pool_maxsize=INFLUX_QUERY_POOL_SIZE  #keep-alive pool shared by every query on this worker
+        )
+    return _async_client.query_api()
+
+async def close_query_client():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+
+async def query_benchmarks(model_name: str, metric: str, hours: int = 1):
     "Query recent benchmark scores for a model"
-    query = f'''    
-        from(bucket: "{INFLUXDB_BUCKET}")
-            |> range(start: -{hours}h)
-            |> filter(fn: (r) => r._measurement == "benchmark")
-            |> filter(fn: (r) => r.model_name == "{model_name}")
-            |> filter(fn: (r) => r.metric == "{metric}")
-            |> sort(columns: ["_time"], desc: true)
-    '''
-    tables = query_api.query(query)
-    results = []
-    for table in tables:
-        for record in table.records:
+    with metrics.timed("influx_query"):
+        records = await _get_query_api().query_stream(BENCHMARKS_QUERY, params={
+            "_bucket": INFLUXDB_BUCKET,
+            "_start": -timedelta(hours=hours),
+            "_model_name": model_name,
+            "_metric": metric
+        })
+        results = []
+        async for record in records:    #records are parsed as the response streams in, not after the whole body arrives
             results.append({
                 "time": record.get_time(),
                 "model_name": record["model_name"],
@@ -69,22 +130,17 @@ def query_benchmarks(model_name: str, metric: str, hours: int = 1):
             })
     return results
 
-def query_latest_scores(category: str, judge: str, metric: str = "accuracy"):  #powers the leaderboard
+async def query_latest_scores(category: str, judge: str, metric: str = "accuracy"):  #powers the leaderboard
     "Get the most recent score per model per metric - for the leaderboard"
-    query = f'''
-        from(bucket: "{INFLUXDB_BUCKET}")
-            |> range(start: -24h)
-            |> filter(fn: (r) => r._measurement == "benchmark")
-            |> filter(fn: (r) => r.category == "{category}")
-            |> filter(fn: (r) => r.judge == "{judge}")
-            |> filter(fn: (r) => r.metric == "{metric}")
-            |> group(columns: ["model_name"])
-            |> last()
-        '''
-    tables = query_api.query(query)
-    results = []
-    for table in tables:
-        for record in table.records:
+    with metrics.timed("influx_query"):
+        records = await _get_query_api().query_stream(LATEST_SCORES_QUERY, params={
+            "_bucket": INFLUXDB_BUCKET,
+            "_category": category,
+            "_judge": judge,
+            "_metric": metric
+        })
+        results = []
+        async for record in records:
             results.append({
                 "time": record.get_time().isoformat(),  #convert datetime to ISO string for JSON serialization
                 "model_name": record["model_name"],
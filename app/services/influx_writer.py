@@ -0,0 +1,129 @@
+import asyncio
+import os
+import time
+from typing import Callable
+
+# Tunables for the background writer - batches flush when either limit is hit
+INFLUX_BATCH_SIZE = int(os.getenv("INFLUX_BATCH_SIZE", "500"))    #max points per line-protocol write
+INFLUX_FLUSH_INTERVAL = float(os.getenv("INFLUX_FLUSH_INTERVAL", "1.0"))  #seconds a point may wait before its batch is flushed
+INFLUX_QUEUE_SIZE = int(os.getenv("INFLUX_QUEUE_SIZE", "10000"))  #bounded buffer, callers wait when it is full (backpressure)
+INFLUX_ENQUEUE_TIMEOUT = float(os.getenv("INFLUX_ENQUEUE_TIMEOUT", "2.0"))   #how long a caller waits on a full buffer before the point is dropped
+INFLUX_WRITE_RETRIES = int(os.getenv("INFLUX_WRITE_RETRIES", "2"))
+
+
+class BatchWriter:
+    """Buffers line-protocol points and flushes them to InfluxDB in batches from a background task.
+
+    write_batch is a blocking callable taking one line-protocol string; it runs in a worker thread
+    so a slow InfluxDB never stalls the event loop. Other stores subclass it and override _flush.
+    """
+
+    def __init__(self, write_batch: Callable[[str], None] | None, batch_size: int = INFLUX_BATCH_SIZE,
+                 flush_interval: float = INFLUX_FLUSH_INTERVAL, max_queue: int = INFLUX_QUEUE_SIZE,
+                 enqueue_timeout: float | None = None, name: str = "InfluxDB"):
+        self.write_batch = write_batch
+        self.name = name    #used in log lines
+        self.enqueue_timeout = enqueue_timeout     #None = INFLUX_ENQUEUE_TIMEOUT
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: asyncio.Queue[str | None] = asyncio.Queue(maxsize=max_queue)
+        self._task: asyncio.Task | None = None
+        self._progress: asyncio.Condition | None = None    #notified after every batch, lets callers wait for their points to land
+        self._settled = 0   #points flushed or failed so far, in submission order (single consumer, FIFO)
+        #counters, exposed through stats()
+        self.queued = 0
+        self.flushed = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            print(f"> {self.name} batch writer started")
+
+    async def stop(self):
+        "Flush everything still buffered, then stop the background task"
+        if self._task is None:
+            return
+        await self.queue.put(None)  #sentinel - queued behind every pending point, so they all get flushed first
+        await self._task
+        self._task = None
+        print(f"> {self.name} batch writer drained: {self.stats()}")
+
+    def mark(self) -> int:
+        "Position of the most recently queued point - pass to wait_settled() to wait for it"
+        return self.queued
+
+    async def wait_settled(self, mark: int, timeout: float = 10.0) -> bool:
+        "Wait until every point queued up to mark has been flushed (or given up on). Returns False on timeout"
+        if self._progress is None:
+            self._progress = asyncio.Condition()
+        async with self._progress:
+            try:
+                await asyncio.wait_for(self._progress.wait_for(lambda: self._settled >= mark), timeout)
+                return True
+            except asyncio.TimeoutError:
+                return False
+
+    async def submit(self, line: str):
+        "Queue one line-protocol point; waits (bounded) when the buffer is full instead of growing without limit"
+        try:
+            await asyncio.wait_for(self.queue.put(line), timeout=self.enqueue_timeout or INFLUX_ENQUEUE_TIMEOUT)
+            self.queued += 1
+        except asyncio.TimeoutError:
+            self.dropped += 1
+            print(f"{self.name} write buffer full - dropping point")
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queued,
+            "flushed": self.flushed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "pending": self.queue.qsize()
+        }
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            first = await self.queue.get()    #block until there is at least one point
+            if first is None:
+                self.queue.task_done()
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    line = await asyncio.wait_for(self.queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                if line is None:    #shutting down - flush what we have right away
+                    self.queue.task_done()
+                    stopping = True
+                    break
+                batch.append(line)
+            try:
+                await self._flush(batch)
+            finally:
+                self._settled += len(batch)
+                for _ in batch:
+                    self.queue.task_done()
+                if self._progress is not None:
+                    async with self._progress:
+                        self._progress.notify_all()
+
+    async def _flush(self, batch: list[str]):
+        payload = "\n".join(batch)
+        for attempt in range(INFLUX_WRITE_RETRIES + 1):
+            try:
+                await asyncio.to_thread(self.write_batch, payload)
+                self.flushed += len(batch)
+                return
+            except Exception as e:
+                print(f"{self.name} batch write failed ({attempt + 1}/{INFLUX_WRITE_RETRIES + 1}): {e}")
+                if attempt < INFLUX_WRITE_RETRIES:
+                    await asyncio.sleep(0.5 * 2 ** attempt)    #exponential backoff between retries
+        self.failed += len(batch)
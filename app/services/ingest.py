@@ -0,0 +1,176 @@
+import asyncio
+import json
+import math
+import os
+import re
+from datetime import datetime, timezone
+from typing import AsyncIterator
+from app.services import influx
+from app.services.influx import _benchmark_point
+from app.services.influx_writer import INFLUX_WRITE_RETRIES
+
+# Bulk import of benchmark points from offline evaluation runs. The request body is read as a stream and parsed line
+# by line (NDJSON or InfluxDB line protocol), so memory stays bounded by one batch however large the upload is.
+# Every line is validated and re-serialized through the same Point builder battles use; bad lines are reported by
+# number and skipped. Batches go straight to InfluxDB - one in flight while the next is parsed - rather than through
+# the shared battle writer, whose bounded queue would drop points under a bulk load. A slow InfluxDB slows the
+# upload instead.
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "5000"))  #points per write - larger than the live writer's, nothing waits on a single point
+INGEST_MAX_ERRORS = int(os.getenv("INGEST_MAX_ERRORS", "1000"))  #line errors listed in the report, the rest are only counted
+INGEST_MAX_LINE_BYTES = 64 * 1024   #a longer line is rejected without buffering it
+FORMATS = {"ndjson", "lp"}
+
+REQUIRED_TAGS = ("model_name", "metric", "category", "judge")
+_UNESCAPED_SPACE = re.compile(r"(?<!\\) ")
+_UNESCAPED_COMMA = re.compile(r"(?<!\\),")
+_UNESCAPED_EQUALS = re.compile(r"(?<!\\)=")
+
+def _unescape(text: str) -> str:
+    return text.replace("\\,", ",").replace("\\=", "=").replace("\\ ", " ")
+
+def _check(fields: dict, valid_metrics: set[str]) -> float:
+    "Validates the tags and returns the value as a finite float - raises ValueError with a message for the report"
+    for tag in REQUIRED_TAGS:
+        if not isinstance(fields.get(tag), str) or not fields[tag]:
+            raise ValueError(f"missing {tag}")
+    if fields["metric"] not in valid_metrics:
+        raise ValueError(f"invalid metric {fields['metric']!r}")
+    value = fields.get("value")
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError("value must be a finite number")
+    return float(value)
+
+def parse_ndjson_line(text: str, valid_metrics: set[str]) -> str:
+    """One {"model_name", "metric", "value", "category", "judge", "time"?} object -> a line-protocol point.
+    time is an ISO 8601 string or epoch seconds, now when missing"""
+    try:
+        row = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"invalid JSON: {e.msg}")
+    if not isinstance(row, dict):
+        raise ValueError("expected a JSON object")
+    value = _check(row, valid_metrics)
+    stamp = row.get("time")
+    if stamp is None:
+        time = datetime.now(timezone.utc)
+    elif isinstance(stamp, str):
+        try:
+            time = datetime.fromisoformat(stamp.replace("Z", "+00:00"))
+        except ValueError:
+            raise ValueError(f"invalid time {stamp!r}")
+        if time.tzinfo is None:
+            time = time.replace(tzinfo=timezone.utc)
+    elif isinstance(stamp, (int, float)) and not isinstance(stamp, bool) and math.isfinite(stamp):
+        time = int(stamp * 1_000_000_000)  #epoch seconds -> ns
+    else:
+        raise ValueError("time must be an ISO 8601 string or epoch seconds")
+    return _benchmark_point(row["model_name"], row["metric"], value, row["category"], row["judge"], time).to_line_protocol()
+
+def parse_line_protocol(text: str, valid_metrics: set[str]) -> str:
+    "One benchmark,model_name=..,metric=..,category=..,judge=.. value=<number> [ns timestamp] line, normalized"
+    parts = _UNESCAPED_SPACE.split(text.strip())
+    if len(parts) not in (2, 3):
+        raise ValueError("expected measurement,tags fields [timestamp]")
+    measurement, *tags = _UNESCAPED_COMMA.split(parts[0])
+    if measurement != "benchmark":
+        raise ValueError(f"measurement must be benchmark, got {measurement!r}")
+    fields = {}
+    for pair in tags:
+        kv = _UNESCAPED_EQUALS.split(pair, 1)
+        if len(kv) != 2 or not kv[0] or not kv[1]:
+            raise ValueError(f"invalid tag {_unescape(pair)!r}")
+        fields[_unescape(kv[0])] = _unescape(kv[1])
+    for pair in _UNESCAPED_COMMA.split(parts[1]):
+        key, _, raw = pair.partition("=")
+        if key != "value":
+            raise ValueError(f"unexpected field {key!r}, only value is accepted")
+        try:
+            fields["value"] = float(raw[:-1] if raw.endswith(("i", "u")) else raw)
+        except ValueError:
+            raise ValueError(f"invalid value {raw!r}")
+    value = _check(fields, valid_metrics)
+    try:
+        time = int(parts[2]) if len(parts) == 3 else datetime.now(timezone.utc)
+    except ValueError:
+        raise ValueError(f"invalid timestamp {parts[2]!r}, expected integer nanoseconds")
+    return _benchmark_point(fields["model_name"], fields["metric"], value, fields["category"], fields["judge"], time).to_line_protocol()
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, str | None]]:
+    "(line number, text) for every non-blank line of a streamed body - text is None for a line over INGEST_MAX_LINE_BYTES"
+    pending, number, skipping = b"", 0, False
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            number += 1
+            if skipping:    #the tail of an over-long line
+                skipping = False
+                yield number, None
+            elif line.strip():
+                yield number, line.decode("utf-8", errors="replace")
+        if len(pending) > INGEST_MAX_LINE_BYTES:
+            pending, skipping = b"", True
+    if skipping:
+        yield number + 1, None
+    elif pending.strip():
+        yield number + 1, pending.decode("utf-8", errors="replace")
+
+async def _write(payload: str) -> str | None:
+    "Write one batch with the live writer's retry policy - returns the error if every attempt failed"
+    for attempt in range(INFLUX_WRITE_RETRIES + 1):
+        try:
+            await asyncio.to_thread(influx._write_lines, payload)
+            return None
+        except Exception as e:
+            error = str(e)
+            print(f"Ingest batch write failed ({attempt + 1}/{INFLUX_WRITE_RETRIES + 1}): {e}")
+            if attempt < INFLUX_WRITE_RETRIES:
+                await asyncio.sleep(0.5 * 2 ** attempt)
+    return error
+
+async def ingest(chunks: AsyncIterator[bytes], format: str, valid_metrics: set[str]) -> dict:
+    "Parse, validate and write a streamed body - returns counts plus the first INGEST_MAX_ERRORS line errors"
+    parse = parse_ndjson_line if format == "ndjson" else parse_line_protocol
+    report = {"lines": 0, "written": 0, "rejected": 0, "failed": 0, "errors": [], "errors_truncated": False}
+
+    def reject(entry: dict):
+        if len(report["errors"]) < INGEST_MAX_ERRORS:
+            report["errors"].append(entry)
+        else:
+            report["errors_truncated"] = True
+
+    in_flight: tuple[asyncio.Task, int, int, int] | None = None    #(write, first line, last line, points)
+
+    async def settle():
+        task, first, last, count = in_flight
+        error = await task
+        if error is None:
+            report["written"] += count
+        else:
+            report["failed"] += count
+            reject({"lines": [first, last], "error": f"write failed: {error}"})
+
+    batch, first, last = [], 0, 0
+    async for number, text in iter_lines(chunks):
+        report["lines"] += 1
+        try:
+            if text is None:
+                raise ValueError(f"line longer than {INGEST_MAX_LINE_BYTES} bytes")
+            batch.append(parse(text, valid_metrics))
+            first, last = first or number, number
+        except ValueError as e:
+            report["rejected"] += 1
+            reject({"line": number, "error": str(e)})
+            continue
+        if len(batch) >= INGEST_BATCH_SIZE:
+            if in_flight:
+                await settle()  #at most one write in flight - a slow InfluxDB pushes back on the upload
+            in_flight = (asyncio.create_task(_write("\n".join(batch))), first, last, len(batch))
+            batch, first = [], 0
+    if in_flight:
+        await settle()
+    if batch:
+        in_flight = (asyncio.create_task(_write("\n".join(batch))), first, last, len(batch))
+        await settle()
+    return report
@@ -1,31 +1,85 @@
-import ollama
+import asyncio
 import json
+import random
 import re
 import os
+from app.services.verdict_cache import verdict_cache, verdict_key
+from app.services.providers.ollama_pool import ollama_pool
+from app.services.providers.residency import residency
+from app.services import metrics
 
+JUDGE_CONCURRENCY = int(os.getenv("JUDGE_CONCURRENCY", "2"))  #max judge calls in flight per judge model, so a burst of fighters can't flood one judge
 
-OLLAMA_HOST = os.getenv("OLLAMA_BASE_URL", "http://host.docker.internal:11434")
-client = ollama.Client(host=OLLAMA_HOST)
+_judge_slots: dict[str, asyncio.Semaphore] = {}    #one semaphore per judge model, created on first use
 
-JUDGE_PROMPT = """You are an expert AI evaluator. Score the following response to this prompt.
+JUDGE_PROMPT_VERSION = "v2"    #bump whenever the rubric, format or truncation changes so cached verdicts from the old one are not reused
+JUDGE_RESPONSE_TOKENS = int(os.getenv("JUDGE_RESPONSE_TOKENS", "512"))  #responses are truncated to this many tokens before judging (and before hashing for the verdict cache)
+JUDGE_NUM_PREDICT = int(os.getenv("JUDGE_NUM_PREDICT", "256"))  #max tokens per verdict - a verdict is ~60, the cap stops runaway thinking
+JUDGE_FORMAT = os.getenv("JUDGE_FORMAT", "json")     #"json" = any JSON object, "schema" = Ollama structured outputs (needs Ollama 0.5+), "" = free text
+JUDGE_MAX_ATTEMPTS = int(os.getenv("JUDGE_MAX_ATTEMPTS", "2"))  #calls per verdict before giving up - a retry costs a full judge call
 
-PROMPT: {prompt}
-
-RESPONSE: {response}
-
-Score the response on these 5 dimensions, each from 0 to 10:
+_RUBRIC = """Score on these 5 dimensions, each an integer from 0 to 10:
 1. Correctness: Is the answer factually/logically correct?
 2. Reasoning: Does it show clear step-by-step thinking?
 3. Completeness: Does it fully address the prompt?
 4. Conciseness: Is it free of unnecessary padding?
 5. Coherence: Is it well structured and easy to follow?
 
-You MUST respond with ONLY a JSON object. No thinking tags, no explanation, no extra text.
+You MUST respond with ONLY a JSON object. No thinking tags, no explanation, no extra text."""
+
+#the rubric is a fixed system message, so every judge call starts with the same prefix and Ollama can reuse its cached prompt eval
+JUDGE_SYSTEM = f"""You are an expert AI evaluator. The user gives you a PROMPT and a RESPONSE to it. Score the RESPONSE.
+
+{_RUBRIC}
 Respond with ONLY this exact format:
-{{"correctness": 0, "reasoning": 0, "completeness": 0, "conciseness": 0, "coherence": 0, "overall": 0, "summary": "one sentence"}}"""
+{{"correctness": 0, "reasoning": 0, "completeness": 0, "conciseness": 0, "coherence": 0, "summary": "one sentence"}}"""
+
+JUDGE_PROMPT = """PROMPT: {prompt}
+
+RESPONSE: {response}"""
+
+#batch mode: every fighter's response to one prompt in a single call, under shuffled anonymous labels so the
+#judge can't favour a model by name or by always preferring whichever answer came first
+JUDGE_BATCH_SYSTEM = f"""You are an expert AI evaluator. The user gives you a PROMPT and several responses to it, labelled RESPONSE A, RESPONSE B, and so on. Score each response independently.
+
+{_RUBRIC}
+Respond with ONLY one entry per response label, in this exact format:
+{{"A": {{"correctness": 0, "reasoning": 0, "completeness": 0, "conciseness": 0, "coherence": 0, "summary": "one sentence"}}, "B": {{...}}}}"""
+
+JUDGE_BATCH_PROMPT = """PROMPT: {prompt}
 
-def _default_score(reason: str) -> dict:
-    return {
+{responses}"""
+
+REQUIRED_SCORES = ["correctness", "reasoning", "completeness", "conciseness", "coherence"]
+
+VERDICT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        **{k: {"type": "integer", "minimum": 0, "maximum": 10} for k in REQUIRED_SCORES},
+        "summary": {"type": "string"}
+    },
+    "required": REQUIRED_SCORES + ["summary"]
+}
+
+_TOKEN = re.compile(r"\w+|[^\w\s]")  #a word or a punctuation mark - a tokenizer-free stand-in, close to a BPE token count for English and code
+
+def truncate_tokens(text: str, limit: int = JUDGE_RESPONSE_TOKENS) -> str:
+    "The text up to its limit-th token, so long answers cost the judge the same whatever their character mix"
+    for i, match in enumerate(_TOKEN.finditer(text)):
+        if i == limit - 1:
+            return text[:match.end()]
+    return text
+
+def _format(labels: list[str] | None = None):
+    "The format argument for Ollama - one verdict schema, or one per batch label"
+    if JUDGE_FORMAT != "schema":
+        return JUDGE_FORMAT
+    if labels is None:
+        return VERDICT_SCHEMA
+    return {"type": "object", "properties": {label: VERDICT_SCHEMA for label in labels}, "required": labels}
+
+def _default_score(reason: str, unscored: bool = False) -> dict:
+    scores = {
         "correctness": 0,
         "reasoning": 0,
         "completeness": 0,
@@ -34,43 +88,145 @@ def _default_score(reason: str) -> dict:
         "overall": 0,
         "summary": reason
     }
+    if unscored:
+        scores["unscored"] = True   #the judge failed - the zeros are placeholders, not a score to rank on
+    return scores
 
-def judge_response(prompt: str, response: str, judge: str) -> dict:
-    """judge a model response on 5 research dimensions"""
-
-    if not response or len(response.strip()) < 10:
-        return _default_score("No response provided")
-
-    try:
-        result = client.chat(
+async def _chat(judge: str, system: str, content: str, format="", num_predict: int = JUDGE_NUM_PREDICT) -> str:
+    async with ollama_pool.lease(judge) as client:    #judge calls share the host pool (and its connections) with the fighters
+        result = await client.chat(
             model=judge,
-            messages=[{
-                "role": "user",
-                "content": JUDGE_PROMPT.format(
-                    prompt=prompt,
-                    response=response[:2000]  # cap at 2000 chars
-                )
-            }],
-            options={"temperature": 0.1}  # low temp for consistent scoring
+            messages=[{"role": "system", "content": system}, {"role": "user", "content": content}],
+            format=format,
+            options={"temperature": 0.1, "num_predict": num_predict},  # low temp for consistent scoring, bounded output
+            keep_alive=residency.keep_alive(judge)
         )
+    metrics.judge_tokens.observe(result.get("eval_count", 0))
+    content = result["message"]["content"]
+    print(f"Raw judge response: {content}")
+    return re.sub(r'<tool_call>.*?</tool_call>|<think>.*?(</think>|$)', '', content, flags=re.DOTALL).strip()  # remove any <tool_call> / thinking the model adds
+
+def _extract_json(content: str) -> dict | None:
+    "The first JSON object in the text, even if the model wrapped it in prose"
+    decoder = json.JSONDecoder()
+    start = content.find("{")
+    while start != -1:
+        try:
+            value, _ = decoder.raw_decode(content, start)   #parses one balanced object - trailing text (or a second object) is ignored
+            if isinstance(value, dict):
+                return value
+        except json.JSONDecodeError:
+            pass
+        start = content.find("{", start + 1)
+    return None
 
-        content = result["message"]["content"]
-        print(f"Raw judge response: {content}")
-        content = re.sub(r'<tool_call>.*?</tool_call>', '', content, flags=re.DOTALL).strip()  # remove any <tool_call> tags if model adds them
-
-        # Extract JSON even if model adds extra text
-        json_match = re.search(r'\{.*\}', content, re.DOTALL)   #use regex to extract the JSON object from the model's response. 
-        if json_match:
-            scores = json.loads(json_match.group())
-            required =  ["correctness", "reasoning", "completeness", "conciseness", "coherence"]
-            # Always recompute overall in Python — never trust the LLM's arithmetic
-            if all(k in scores for k in required):
-                avg = sum(scores[k] for k in required) / len(required)
-                scores["overall"] = round(avg * 10, 1)
+def _complete(scores) -> dict | None:
+    "The scores with overall recomputed, or None if a dimension is missing"
+    # Always recompute overall in Python — never trust the LLM's arithmetic
+    if not isinstance(scores, dict) or not all(isinstance(scores.get(k), (int, float)) for k in REQUIRED_SCORES):
+        return None
+    if not all(0 <= scores[k] <= 10 for k in REQUIRED_SCORES):
+        return None
+    avg = sum(scores[k] for k in REQUIRED_SCORES) / len(REQUIRED_SCORES)
+    scores["overall"] = round(avg * 10, 1)
+    return scores
+
+async def _run_judge(prompt: str, response: str, judge: str) -> dict | None:
+    "Judge one response, retrying up to JUDGE_MAX_ATTEMPTS calls - returns the parsed scores, or None if every attempt failed"
+    content = JUDGE_PROMPT.format(prompt=prompt, response=truncate_tokens(response))
+    for attempt in range(1, JUDGE_MAX_ATTEMPTS + 1):
+        try:
+            scores = _complete(_extract_json(await _chat(judge, JUDGE_SYSTEM, content, _format())))
+            if scores:
                 print(f"Judge scores: {scores}")
+                metrics.judge_calls.inc("ok")
                 return scores
+            metrics.judge_calls.inc("parse_failure")    #answered, but not with the scores we asked for
+        except Exception as e:
+            print(f"Judge error (attempt {attempt}/{JUDGE_MAX_ATTEMPTS}): {e}")
+            metrics.judge_calls.inc("error")
+    return None
+
+def _label(i: int) -> str:
+    "Spreadsheet-style column name - A..Z, then AA, AB..."
+    label = ""
+    i += 1
+    while i:
+        i, rem = divmod(i - 1, 26)
+        label = chr(ord("A") + rem) + label
+    return label
 
+def _batch_labels(models: list[str], rng: random.Random = random) -> dict[str, str]:
+    "label -> model, in a random order - 'A' is not always the first fighter"
+    shuffled = rng.sample(models, len(models))
+    return {_label(i): model for i, model in enumerate(shuffled)}
+
+async def _run_batch_judge(prompt: str, responses: dict[str, str], judge: str) -> dict[str, dict]:
+    "One judge call for every response - returns model -> scores for the ones that parsed, the rest are left out"
+    labels = _batch_labels(list(responses))
+    blocks = "\n\n".join(f"RESPONSE {label}:\n{truncate_tokens(responses[model])}" for label, model in labels.items())
+    try:
+        verdicts = _extract_json(await _chat(judge, JUDGE_BATCH_SYSTEM, JUDGE_BATCH_PROMPT.format(prompt=prompt, responses=blocks),
+                                             _format(list(labels)), JUDGE_NUM_PREDICT * len(labels))) or {}
     except Exception as e:
-        print(f"Judge error: {e}")
-    
-    return _default_score("Scoring Unavailable")
\ No newline at end of file
+        print(f"Batch judge error: {e}")
+        metrics.judge_calls.inc("error")
+        return {}
+    scored = {}
+    for label, model in labels.items():
+        scores = _complete(verdicts.get(label) or verdicts.get(f"RESPONSE {label}"))
+        if scores:
+            scored[model] = scores
+    metrics.judge_calls.inc("ok" if len(scored) == len(labels) else "parse_failure")
+    print(f"Batch judge scored {len(scored)}/{len(labels)} responses")
+    return scored
+
+def _judge_slot(judge: str) -> asyncio.Semaphore:
+    slot = _judge_slots.get(judge)
+    if slot is None:
+        slot = _judge_slots[judge] = asyncio.Semaphore(JUDGE_CONCURRENCY)
+    return slot
+
+async def judge_response_async(prompt: str, response: str, judge: str) -> dict:
+    """judge a model response on 5 research dimensions, limited to JUDGE_CONCURRENCY calls per judge model.
+    Verdicts are cached by content, so the same judge never re-scores the same (prompt, response) pair"""
+    if not response or len(response.strip()) < 10:
+        return _default_score("No response provided")
+
+    key = verdict_key(judge, JUDGE_PROMPT_VERSION, prompt, truncate_tokens(response))
+    cached = await verdict_cache.get(key)
+    if cached:
+        print(f"> Verdict cache hit for judge {judge}")
+        return cached
+
+    with metrics.timed("judge_wait"):   #queued behind other calls to the same judge
+        await _judge_slot(judge).acquire()
+    try:
+        with metrics.timed("judge_chat"):
+            scores = await _run_judge(prompt, response, judge)
+    finally:
+        _judge_slot(judge).release()
+    if scores is None:
+        return _default_score("Scoring Unavailable", unscored=True)    #failures are not cached, the next battle gets a fresh attempt
+    await verdict_cache.set(key, scores)
+    return scores
+
+async def judge_batch_async(prompt: str, responses: dict[str, str], judge: str) -> dict[str, dict]:
+    """judge every fighter's response to one prompt in a single call - model -> scores.
+    Responses the batch verdict leaves out (or the whole batch if it can't be parsed) are judged one by one"""
+    verdicts = {model: _default_score("No response provided") for model, text in responses.items() if not text or len(text.strip()) < 10}
+    pending = {model: text for model, text in responses.items() if model not in verdicts}
+    if len(pending) > 1:
+        #batch verdicts are scored side by side, so they are not stored in the single-response verdict cache
+        with metrics.timed("judge_wait"):
+            await _judge_slot(judge).acquire()
+        try:
+            with metrics.timed("judge_batch_chat"):
+                verdicts.update(await _run_batch_judge(prompt, pending, judge))
+        finally:
+            _judge_slot(judge).release()
+    missing = [model for model in pending if model not in verdicts]
+    if missing:
+        fallback = await asyncio.gather(*(judge_response_async(prompt, pending[m], judge) for m in missing))
+        verdicts.update(zip(missing, fallback))
+    return verdicts
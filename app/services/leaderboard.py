@@ -0,0 +1,80 @@
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable
+from app.services.influx import query_latest_scores, LOWER_IS_BETTER
+from app.services.redis_service import read_leaderboard, seed_leaderboard, record_scores, claim_sync
+from app.services.metrics import timed, leaderboard_reads
+
+# Leaderboard reads and writes. The hot path is Redis sorted sets only - InfluxDB is read to seed a board on a
+# cold Redis, to re-sync it in the background once it is older than the soft TTL, and as a fallback if Redis is unreachable.
+# Each of those InfluxDB reads is single-flight: one per board per process, and one per board across workers.
+
+LEADERBOARD_SOFT_TTL_SECONDS = int(os.getenv("LEADERBOARD_SOFT_TTL_SECONDS", "300"))   #after this, serve the board as-is and re-sync it in the background
+LEADERBOARD_SYNC_CLAIM_SECONDS = int(os.getenv("LEADERBOARD_SYNC_CLAIM_SECONDS", "30"))   #how long one worker owns a sync - also the retry backoff if InfluxDB is down
+
+_inflight: dict[tuple, asyncio.Task] = {}     #key -> the one running refresh every concurrent caller awaits
+
+def _single_flight(key: tuple, refresh: Callable[[], Awaitable]) -> asyncio.Task:
+    "Start refresh() unless one is already running for this key - concurrent callers share the same task"
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(refresh())
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    return task
+
+async def _sync_board(category: str, judge: str, metric: str) -> bool:
+    "Reload one board from InfluxDB if no other worker is already doing it. True if this call synced it"
+    try:
+        if not await claim_sync(category, judge, metric, LEADERBOARD_SYNC_CLAIM_SECONDS):
+            return False    #another worker holds the claim
+        rows = await query_latest_scores(category, judge, metric)
+        await seed_leaderboard(rows, category, judge, metric)
+        return True
+    except Exception as e:
+        print(f"Error syncing leaderboard {category}/{judge}/{metric} from InfluxDB: {e}")
+        return False
+
+async def get_leaderboard(category: str, judge: str, metric: str = "accuracy") -> tuple[list, str]:
+    "Returns (ranked rows, source) where source is 'cache' for the sorted set or 'influxdb' for a rebuild"
+    with timed("leaderboard_read"):
+        rows, source = await _load_leaderboard(category, judge, metric)
+    leaderboard_reads.inc(source)
+    return rows, source
+
+async def _load_leaderboard(category: str, judge: str, metric: str) -> tuple[list, str]:
+    desc = metric not in LOWER_IS_BETTER
+    try:
+        board, synced_at = await read_leaderboard(category, judge, metric, desc=desc)
+    except Exception as e:
+        print(f"Error reading leaderboard from Redis: {e}")
+        try:
+            #no Redis to coordinate through - still only one Flux query per board at a time from this process
+            query = _single_flight(("query", category, judge, metric), lambda: query_latest_scores(category, judge, metric))
+            return await asyncio.shield(query), "influxdb"
+        except Exception as e:
+            print(f"Error querying leaderboard from InfluxDB: {e}")
+            return [], "unavailable"
+
+    if board is not None:
+        if time.time() - synced_at > LEADERBOARD_SOFT_TTL_SECONDS:
+            _single_flight(("sync", category, judge, metric), lambda: _sync_board(category, judge, metric))  #stale-while-revalidate
+        return board, "cache"
+
+    #cold start - this board has never been built on this Redis, seed it from InfluxDB once
+    seeded = await asyncio.shield(_single_flight(("sync", category, judge, metric), lambda: _sync_board(category, judge, metric)))
+    try:
+        board, _ = await read_leaderboard(category, judge, metric, desc=desc, require_seeded=False)     #merged with anything recorded live meanwhile
+    except Exception as e:
+        print(f"Error reading leaderboard from Redis: {e}")
+        return [], "unavailable"
+    return board or [], "influxdb" if seeded else "cache"     #not seeded = InfluxDB down or another worker seeding - serve what has been recorded live
+
+async def record_result(category: str, judge: str, model_name: str, metrics: dict[str, float]):
+    "Push a freshly scored result into every metric's board"
+    try:
+        with timed("leaderboard_update"):
+            await record_scores(category, judge, model_name, metrics)
+    except Exception as e:
+        print(f"Error updating leaderboard in Redis: {e}")
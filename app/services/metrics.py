@@ -0,0 +1,125 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable
+
+# Lightweight in-process metrics, rendered in the Prometheus text format on GET /metrics.
+# Recording is a bisect + a dict update under a lock (~1µs), so it is cheap enough for the per-token path.
+# Counters that already exist elsewhere (writer stats, verdict cache, websocket manager) are read at scrape time
+# through callbacks instead of being counted twice.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)   #seconds
+
+_registry: list = []
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.values: dict[tuple, float] = {}
+        self._lock = threading.Lock()   #judge parsing and Influx writes record from worker threads
+        _registry.append(self)
+
+    def inc(self, *labels, amount: float = 1.0):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(self.labelnames, k)} {v}" for k, v in sorted(self.values.items())]
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames, self.buckets = name, help, labelnames, buckets
+        self.values: dict[tuple, list] = {}     #labels -> [count per bucket (non-cumulative, last = +Inf), sum]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.values.get(labels)
+            if series is None:
+                series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {round(total, 6)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+class Callback:
+    "A gauge or counter whose value(s) are read from fn() at scrape time - fn returns a number or {label value: number}"
+
+    def __init__(self, name: str, help: str, kind: str, fn: Callable, labelname: str = ""):
+        self.name, self.help, self.kind, self.fn, self.labelname = name, help, kind, fn, labelname
+        _registry.append(self)
+
+    def render(self) -> list[str]:
+        try:
+            value = self.fn()
+        except Exception as e:
+            print(f"Error collecting metric {self.name}: {e}")
+            return []
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        if isinstance(value, dict):
+            lines += [f"{self.name}{_labels((self.labelname,), (k,))} {v}" for k, v in value.items()]
+        else:
+            lines.append(f"{self.name} {value}")
+        return lines
+
+def render() -> str:
+    return "\n".join(line for metric in _registry for line in metric.render()) + "\n"
+
+
+# --- the app's metrics ---
+stage_seconds = Histogram("battle_stage_seconds", "Time spent in each stage of the battle pipeline", ("stage",))
+judge_calls = Counter("judge_calls_total", "Judge LLM calls by outcome (ok, parse_failure, error)", ("outcome",))
+leaderboard_reads = Counter("leaderboard_reads_total", "Leaderboard reads by source (cache = Redis hit, influxdb = miss/seed, unavailable)", ("source",))
+battles = Counter("battles_total", "Finished battles by outcome", ("outcome",))
+fighter_calls = Counter("fighter_calls_total", "Fighter generations by outcome (ok, error)", ("outcome",))
+judge_tokens = Histogram("judge_output_tokens", "Tokens the judge generated per call (eval_count)", buckets=(16, 32, 64, 128, 256, 512, 1024, 2048))
+
+
+# --- per-battle timing context ---
+# run_battle starts one, and every task it spawns (fighters, judge calls) inherits it through the contextvar,
+# so stages timed anywhere in the pipeline land in that battle's breakdown as well as in the histogram.
+_battle_timings: ContextVar[dict | None] = ContextVar("battle_timings", default=None)
+
+def start_battle_timings() -> dict:
+    timings: dict[str, float] = {}  #stage -> longest single occurrence in seconds (fighters and judges overlap, so the max is what the battle waited on)
+    _battle_timings.set(timings)
+    return timings
+
+def record(stage: str, seconds: float):
+    stage_seconds.observe(seconds, stage)
+    timings = _battle_timings.get()
+    if timings is not None and seconds > timings.get(stage, 0.0):
+        timings[stage] = seconds
+
+@contextmanager
+def timed(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - started)
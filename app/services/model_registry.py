@@ -0,0 +1,89 @@
+import hashlib
+import os
+import time
+from typing import Awaitable, Callable
+from app.services.redis_service import redis_client
+
+# Read cache for the model registry. Every registration bumps a version counter in Redis, shared by all workers.
+# Responses are cached in process per (version, query) and carry an ETag derived from both, so a dashboard
+# polling with If-None-Match gets a 304 without touching Postgres. A worker trusts its cache for
+# MODEL_CACHE_TTL_SECONDS before re-checking the version, so other workers' registrations show up within that.
+
+MODEL_CACHE_TTL_SECONDS = float(os.getenv("MODEL_CACHE_TTL_SECONDS", "2"))
+MODEL_CACHE_SIZE = 256  #distinct queries kept - filters and pages a dashboard polls
+REGISTRY_VERSION_KEY = "models:version"
+
+def _etag(version: int, key: tuple) -> str:
+    return '"' + hashlib.sha1(repr((version, key)).encode()).hexdigest()[:16] + '"'
+
+def _parse_if_none_match(header: str | None) -> set[str]:
+    "The header's entity tags with any W/ prefix dropped - GET compares weakly, and * stands for any current representation"
+    if not header:
+        return set()
+    return {tag.strip().removeprefix("W/") for tag in header.split(",") if tag.strip()}
+
+def _fresh(tags: set[str], etag: str, body) -> bool:
+    "Whether the client's copy is current - {} is a cached not-found, which never matches so it stays a 404"
+    return body != {} and ("*" in tags or etag in tags)
+
+class RegistryCache:
+    def __init__(self):
+        self._entries: dict[tuple, tuple[int, str, object, float]] = {}     #query -> (version, etag, body, checked_at)
+        self._writes = 0    #local registrations - a load that overlapped one is not cached
+        self.hits = 0
+        self.revalidated = 0    #cache older than the TTL, but the version hadn't moved
+        self.misses = 0
+
+    async def version(self) -> int | None:
+        "The shared registry version, None if Redis is unreachable"
+        try:
+            return int(await redis_client.get(REGISTRY_VERSION_KEY) or 0)
+        except Exception as e:
+            print(f"Could not read the model registry version: {e}")
+            return None
+
+    async def bump(self):
+        "Call after every write to the registry"
+        self._writes += 1
+        self._entries.clear()
+        try:
+            await redis_client.incr(REGISTRY_VERSION_KEY)
+        except Exception as e:
+            print(f"Could not bump the model registry version: {e}")
+
+    async def get(self, key: tuple, load: Callable[[], Awaitable[object]], if_none_match: str | None = None) -> tuple[str | None, object]:
+        """(etag, body) for a query - from the cache while the registry version is unchanged, else from load().
+        body is None when if_none_match (a list of tags, weak or strong, or *) already names the current version -
+        the client's copy is fresh, and nothing is loaded unless only * matched"""
+        tags = _parse_if_none_match(if_none_match)
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry and now - entry[3] < MODEL_CACHE_TTL_SECONDS:
+            self.hits += 1
+            return entry[1], None if _fresh(tags, entry[1], entry[2]) else entry[2]
+        version = await self.version()
+        if version is None:     #no shared version to validate against - serve straight from Postgres, uncached
+            self.misses += 1
+            return None, await load()
+        etag = _etag(version, key)
+        if entry and entry[0] == version:
+            self.revalidated += 1
+            self._entries[key] = (version, etag, entry[2], now)
+            return etag, None if _fresh(tags, etag, entry[2]) else entry[2]
+        if etag in tags:    #an ETag is only handed out with a 200 and models aren't deleted - no load needed to know it is current
+            self.hits += 1
+            return etag, None
+        self.misses += 1
+        writes = self._writes
+        body = await load()
+        if writes == self._writes:  #a registration landed while we were loading - this body may predate it, don't cache it
+            if len(self._entries) >= MODEL_CACHE_SIZE:
+                self._entries.pop(next(iter(self._entries)))    #oldest query first
+            self._entries[key] = (version, etag, body, now)
+        return etag, None if _fresh(tags, etag, body) else body
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "revalidated": self.revalidated, "misses": self.misses, "entries": len(self._entries)}
+
+
+registry_cache = RegistryCache()
@@ -0,0 +1,197 @@
+import json
+import os
+import random
+import threading
+import time
+import weakref
+from array import array
+from collections import defaultdict
+from pathlib import Path
+from typing import Optional
+
+# Prompt library on disk as JSONL, one prompt per line:
+#   {"id": "coding-001", "category": "coding", "difficulty": "medium", "tags": ["python"], "prompt": "..."}
+# Only byte offsets and the category/tag/difficulty index are kept in memory - a prompt is read from the
+# file when it is drawn, so libraries with tens of thousands of prompts per category stay cheap to hold.
+
+PROMPT_LIBRARY_PATH = os.getenv("PROMPT_LIBRARY_PATH", str(Path(__file__).parent.parent / "prompts" / "prompts.jsonl"))
+PROMPT_RELOAD_CHECK_SECONDS = float(os.getenv("PROMPT_RELOAD_CHECK_SECONDS", "5"))    #how often the file's mtime is checked for hot reload
+STRATIFY_FIELDS = ("difficulty", "tag")     #stratifying by tag uses each prompt's first tag, so every prompt lands in exactly one stratum
+
+
+class _Index:
+    "Offsets of every prompt in one version of the library file, grouped by category, tag and difficulty"
+
+    def __init__(self, path: str):
+        self.fd = os.open(path, os.O_RDONLY)    #held open, so a reader keeps seeing this version even if the file is replaced
+        weakref.finalize(self, os.close, self.fd)
+        stat = os.fstat(self.fd)
+        self.version = (stat.st_mtime_ns, stat.st_size)
+        self.starts = array("q")    #byte offset of each line, plus one past the end
+        self.lines: dict[str, array] = defaultdict(lambda: array("l"))    #category -> line numbers of its prompts
+        #category -> field -> value -> positions in lines[category]
+        self.groups: dict[str, dict[str, dict[str, array]]] = defaultdict(lambda: defaultdict(lambda: defaultdict(lambda: array("l"))))
+        self.skipped = 0
+
+        offset = 0
+        with open(self.fd, "rb", closefd=False) as f:
+            for raw in f:
+                line_no = len(self.starts)
+                self.starts.append(offset)
+                offset += len(raw)
+                if not raw.strip():
+                    continue
+                try:
+                    entry = json.loads(raw)
+                    category = entry["category"]
+                except (ValueError, KeyError, TypeError):
+                    self.skipped += 1
+                    continue
+                position = len(self.lines[category])
+                self.lines[category].append(line_no)
+                tags = entry.get("tags") or []
+                for tag in tags:
+                    self.groups[category]["tag"][tag].append(position)
+                if entry.get("difficulty"):
+                    self.groups[category]["difficulty"][entry["difficulty"]].append(position)
+                self.groups[category]["primary_tag"][tags[0] if tags else ""].append(position)
+        self.starts.append(offset)
+        #plain dicts from here on - lookups from reader threads must not insert keys
+        self.lines = dict(self.lines)
+        self.groups = {c: {field: dict(values) for field, values in fields.items()} for c, fields in self.groups.items()}
+        if self.skipped:
+            print(f"Skipped {self.skipped} malformed lines in prompt library {path}")
+
+    def read(self, category: str, position: int) -> dict:
+        line_no = self.lines[category][position]
+        start, end = self.starts[line_no], self.starts[line_no + 1]
+        return json.loads(os.pread(self.fd, end - start, start))
+
+    def positions(self, category: str, tag: Optional[str] = None, difficulty: Optional[str] = None) -> list[int]:
+        "Positions of the category's prompts matching the filters, in file order"
+        if category not in self.lines:
+            return []
+        matched = None
+        for field, value in (("tag", tag), ("difficulty", difficulty)):
+            if value is not None:
+                group = set(self.groups[category].get(field, {}).get(value, ()))
+                matched = group if matched is None else matched & group
+        return list(range(len(self.lines[category]))) if matched is None else sorted(matched)
+
+
+class PromptStore:
+    "Lazily indexed JSONL prompt library with sampling, pagination and hot reload"
+
+    def __init__(self, path: str = PROMPT_LIBRARY_PATH, check_interval: float = PROMPT_RELOAD_CHECK_SECONDS):
+        self.path = path
+        self.check_interval = check_interval
+        self._index: _Index | None = None
+        self._checked_at = 0.0
+        self._decks: dict[str, list[int]] = {}  #category -> shuffled positions not drawn yet
+        self._lock = threading.Lock()   #called from worker threads (asyncio.to_thread)
+        self.reloads = 0
+
+    def _current(self) -> _Index:
+        "The loaded index, rebuilt first if the file changed since the last check"
+        with self._lock:
+            index = self._index
+            now = time.monotonic()
+            due = index is None or now - self._checked_at >= self.check_interval
+            if due:
+                self._checked_at = now  #other callers keep using the current index while this one checks/rebuilds
+        if due:
+            try:
+                stat = os.stat(self.path)
+                if index is None or (stat.st_mtime_ns, stat.st_size) != index.version:
+                    self._swap(_Index(self.path), expected=index)   #built outside the lock - draws never wait on a re-index
+            except OSError as e:    #missing, or caught mid-replace - the loaded version stays good, its fd is still open
+                if index is None:
+                    raise
+                print(f"Could not check prompt library {self.path}, keeping the loaded version: {e}")
+        return self._index
+
+    def _swap(self, fresh: _Index, expected: _Index | None = None, force: bool = False):
+        with self._lock:
+            if not force and self._index is not expected:
+                return  #another caller already loaded a newer version
+            self._index = fresh
+            self._decks = {}
+            self.reloads += 1
+        print(f"> Loaded prompt library {self.path}: {self.counts()}")
+
+    def reload(self) -> dict:
+        "Re-read the file now instead of waiting for the mtime check"
+        self._swap(_Index(self.path), force=True)
+        return self.stats()
+
+    def counts(self) -> dict[str, int]:
+        return {category: len(lines) for category, lines in self._index.lines.items()} if self._index else {}
+
+    def draw(self, category: str) -> Optional[dict]:
+        "Next prompt for a battle - no prompt repeats until the whole category has been drawn"
+        self._current()
+        with self._lock:
+            index = self._index     #the decks belong to this index - both are replaced together in _swap
+            deck = self._decks.get(category)
+            if not deck:
+                deck = index.positions(category)
+                if not deck:
+                    return None
+                random.shuffle(deck)
+                self._decks[category] = deck
+            position = deck.pop()
+        return index.read(category, position)
+
+    def sample(self, category: str, k: Optional[int] = None, tag: Optional[str] = None,
+               difficulty: Optional[str] = None, stratify_by: Optional[str] = None) -> list[dict]:
+        """k distinct prompts (every matching prompt if k is None).
+
+        stratify_by="difficulty" or "tag" splits k across the strata in proportion to their size, so a small
+        sample keeps the library's mix instead of whatever random.sample happens to pick.
+        """
+        index = self._current()
+        candidates = index.positions(category, tag, difficulty)
+        if k is None or k >= len(candidates):
+            chosen = candidates
+        elif stratify_by in STRATIFY_FIELDS:
+            field = "primary_tag" if stratify_by == "tag" else "difficulty"
+            wanted = set(candidates)
+            strata = [[p for p in group if p in wanted] for group in index.groups[category].get(field, {}).values()]
+            unlabelled = wanted.difference(*strata)     #e.g. prompts without a difficulty form their own stratum
+            strata = [s for s in strata + [sorted(unlabelled)] if s]
+            chosen = []
+            for stratum, quota in zip(strata, _allocate(k, [len(s) for s in strata])):
+                chosen += random.sample(stratum, quota)
+        else:
+            chosen = random.sample(candidates, k)
+        return [index.read(category, p) for p in chosen]
+
+    def page(self, category: str, offset: int = 0, limit: int = 50, tag: Optional[str] = None,
+             difficulty: Optional[str] = None) -> tuple[int, list[dict]]:
+        "(total matching, one page of prompts in file order)"
+        index = self._current()
+        positions = index.positions(category, tag, difficulty)
+        return len(positions), [index.read(category, p) for p in positions[offset:offset + limit]]
+
+    def stats(self) -> dict:
+        index = self._current()
+        return {
+            "path": self.path,
+            "categories": self.counts(),
+            "difficulties": {c: sorted(g.get("difficulty", {})) for c, g in index.groups.items()},
+            "skipped_lines": index.skipped,
+            "reloads": self.reloads
+        }
+
+def _allocate(k: int, sizes: list[int]) -> list[int]:
+    "Split k across strata in proportion to their sizes (largest remainder), never more than a stratum holds"
+    total = sum(sizes)
+    exact = [k * size / total for size in sizes]
+    quotas = [int(x) for x in exact]
+    by_remainder = sorted(range(len(sizes)), key=lambda i: exact[i] - quotas[i], reverse=True)
+    for i in by_remainder[:k - sum(quotas)]:
+        quotas[i] += 1
+    return [min(q, size) for q, size in zip(quotas, sizes)]
+
+
+prompt_store = PromptStore()   #nothing is read until the first prompt is needed
@@ -0,0 +1,148 @@
+import ollama
+import httpx
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+# A pool of Ollama servers. Every chat leases the least-loaded healthy host, preferring hosts that already
+# have the model in memory, so fighters and judges spread across machines instead of queueing on one box.
+# Each host has one ollama.AsyncClient with a keep-alive connection pool that fighters, judges, health checks and
+# model listing all share - a generation is a coroutine holding a connection, not a thread.
+
+OLLAMA_HOST = os.getenv("OLLAMA_BASE_URL", "http://host.docker.internal:11434")
+OLLAMA_HOSTS = [h.strip() for h in os.getenv("OLLAMA_HOSTS", OLLAMA_HOST).split(",") if h.strip()]   #comma separated, defaults to the single OLLAMA_BASE_URL
+OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "10"))   #seconds between /api/ps health checks
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "256"))    #per host - requests past this wait for a free connection
+OLLAMA_MAX_KEEPALIVE = int(os.getenv("OLLAMA_MAX_KEEPALIVE", "64"))     #idle connections kept open per host for reuse
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))    #reads have no timeout, a cold model can take minutes to load
+OLLAMA_MODELS_TTL_SECONDS = float(os.getenv("OLLAMA_MODELS_TTL_SECONDS", "30"))     #how long the pulled-model list is reused
+
+def _normalize(model: str) -> str:
+    "Ollama reports loaded models with their tag - treat 'mistral' and 'mistral:latest' as the same model"
+    return model if ":" in model else f"{model}:latest"
+
+class OllamaHost:
+    def __init__(self, url: str):
+        self.url = url
+        #the connection pool is ours - ollama.AsyncClient builds its own httpx.AsyncClient around it and has no close of its own
+        self.transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(max_connections=OLLAMA_MAX_CONNECTIONS, max_keepalive_connections=OLLAMA_MAX_KEEPALIVE)
+        )
+        self.client = ollama.AsyncClient(
+            host=url,
+            timeout=httpx.Timeout(None, connect=OLLAMA_CONNECT_TIMEOUT),
+            transport=self.transport
+        )
+        self.in_flight = 0  #requests currently running on this host
+        self.loaded: set[str] = set()   #models resident in memory, from the last /api/ps
+        self.healthy = True
+        self.last_error = ""
+
+    def status(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "loaded": sorted(self.loaded),
+            "last_error": self.last_error
+        }
+
+class OllamaPool:
+    def __init__(self, urls: list[str]):
+        self.hosts = [OllamaHost(url) for url in urls]
+        self._task: asyncio.Task | None = None
+        self._models: list[str] = []
+        self._models_at = 0.0   #when _models was fetched
+        self._models_task: asyncio.Task | None = None   #the one listing every concurrent caller awaits
+
+    def pick(self, model: str) -> OllamaHost:
+        "Least-loaded healthy host, preferring one that already holds the model"
+        wanted = _normalize(model)
+        candidates = [h for h in self.hosts if h.healthy] or self.hosts   #if every host looks down, try them anyway
+        return min(candidates, key=lambda h: (wanted not in h.loaded, h.in_flight))
+
+    @asynccontextmanager
+    async def lease(self, model: str):
+        "Reserve a host for one request - yields its ollama.AsyncClient and tracks it as in flight until the block exits"
+        host = self.pick(model)     #pick + increment with no await in between, so concurrent leases see each other
+        host.in_flight += 1
+        try:
+            yield host.client
+            host.loaded.add(_normalize(model))  #a successful call means the model is now resident there
+        except (ConnectionError, httpx.TransportError) as e:
+            host.healthy = False    #unreachable host - skip it until the next health check says otherwise
+            host.last_error = str(e)
+            raise
+        finally:
+            host.in_flight -= 1
+
+    def resident_models(self) -> set[str]:
+        "Every model loaded on at least one healthy host"
+        return {m for h in self.hosts if h.healthy for m in h.loaded}
+
+    async def list_models(self) -> list[str]:
+        "Union of the models pulled on every reachable host, cached for OLLAMA_MODELS_TTL_SECONDS"
+        if time.monotonic() - self._models_at < OLLAMA_MODELS_TTL_SECONDS:
+            return self._models
+        if self._models_task is None or self._models_task.done():
+            self._models_task = asyncio.create_task(self._fetch_models())   #concurrent callers share one round of /api/tags
+        return await asyncio.shield(self._models_task)
+
+    async def _fetch_models(self) -> list[str]:
+        async def tags(host: OllamaHost) -> list[str] | None:
+            try:
+                return [m["name"] for m in (await host.client.list())["models"]]
+            except Exception as e:
+                print(f"Could not list models on {host.url}: {e}")
+                return None
+        results = await asyncio.gather(*(tags(h) for h in self.hosts))
+        names = []
+        for listed in results:
+            for name in listed or []:
+                if name not in names:
+                    names.append(name)
+        if any(listed is not None for listed in results):   #don't cache an outage - the next call retries
+            self._models, self._models_at = names, time.monotonic()
+        return names
+
+    async def refresh(self):
+        "Health check every host and record which models it has loaded"
+        async def check(host: OllamaHost):
+            try:
+                ps = await host.client.ps()
+                host.loaded = {_normalize(m["name"]) for m in ps.get("models", [])}
+                host.healthy = True
+                host.last_error = ""
+            except Exception as e:
+                if host.healthy:
+                    print(f"Ollama host {host.url} is unhealthy: {e}")
+                host.healthy = False
+                host.last_error = str(e)
+        await asyncio.gather(*(check(h) for h in self.hosts))
+
+    async def _health_loop(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(OLLAMA_HEALTH_INTERVAL)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._health_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def close(self):
+        "Close every host's connection pool - on shutdown, after stop()"
+        for host in self.hosts:
+            await host.transport.aclose()
+
+    def status(self) -> list[dict]:
+        return [h.status() for h in self.hosts]
+
+
+ollama_pool = OllamaPool(OLLAMA_HOSTS)
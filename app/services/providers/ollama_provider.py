@@ -1,15 +1,15 @@
-import ollama 
 import time
 from dataclasses import dataclass
-import os
-import asyncio
-import threading
+from typing import Awaitable, Callable, Optional
 
-#Point ollama client at the host machine, not localhost, since the FastAPI server is running inside a Docker container. host.docker.internal is a special DNS name that resolves to the internal IP address of the host machine from within the Docker container, allowing the containerized application to communicate with services running on the host.
-OLLAMA_HOST = os.getenv("OLLAMA_BASE_URL", "http://host.docker.internal:11434")
+#Requests go through the shared host pool - each chat is routed to the least-loaded Ollama server that already holds the model,
+#and streamed over that host's pooled async connection, so a fighter costs a coroutine rather than a thread.
+#With a single OLLAMA_BASE_URL the pool has one host, pointed at the host machine (host.docker.internal) from inside the container.
+from app.services.providers.ollama_pool import ollama_pool
+from app.services.providers.residency import residency
+from app.services import metrics
 
-#Create a configured client instance that points to the ollama server running on the host machine, so we can use this client to send request to the ollama server
-ollama_client = ollama.Client(host=OLLAMA_HOST)
+TokenCallback = Callable[[str, str], Awaitable[None]]   #async callback(model_name, delta) invoked for every streamed token chunk
 
 @dataclass
 class BattleResult:
@@ -20,43 +20,92 @@ class BattleResult:
     prompt_tokens: int
     response_tokens: int
     error: str = ''
+    ttft_ms: float = 0.0    #time to first token - how long until the model started answering (prompt eval, excluding any model load)
+    itl_ms_mean: float = 0.0    #mean inter-token latency between streamed chunks
+    itl_ms_p95: float = 0.0     #95th percentile inter-token latency, catches stalls the mean hides
+    load_ms: float = 0.0    #Ollama's load_duration - time spent loading the model, taken out of latency_ms and ttft_ms
+    prompt_eval_ms: float = 0.0     #Ollama's prompt_eval_duration - time spent reading the prompt
 
-async def run_model(model_name: str, prompt: str) -> BattleResult:
-    "Send a prompt to an ollama model and measure performance metrics."
-    start_time = time.time()
+def _latency_stats(start: float, token_times: list[float]) -> tuple[float, float, float]:
+    "Compute (ttft_ms, itl_ms_mean, itl_ms_p95) from the arrival time of each streamed token chunk"
+    if not token_times:
+        return 0.0, 0.0, 0.0
+    ttft_ms = max((token_times[0] - start) * 1000, 0.0)
+    gaps = sorted((b - a) * 1000 for a, b in zip(token_times, token_times[1:]))
+    if not gaps:
+        return round(ttft_ms, 2), 0.0, 0.0
+    mean = sum(gaps) / len(gaps)
+    p95 = gaps[min(len(gaps) - 1, int(round(0.95 * (len(gaps) - 1))))]
+    return round(ttft_ms, 2), round(mean, 2), round(p95, 2)
+
+async def run_model(model_name: str, prompt: str, on_token: Optional[TokenCallback] = None) -> BattleResult:
+    "Stream a prompt through an ollama model, forwarding token deltas to on_token and measuring performance metrics."
+    start_time = time.perf_counter()
+    parts: list[str] = []
+    token_times: list[float] = []
+    final: dict = {}
     try:
-        response = await asyncio.to_thread(ollama_client.chat,
-            model=model_name,
-            messages=[{"role": "user", "content": prompt}],
-            options={
-                "temperature": 0.7, #Control the randomness of the output, with higher values producing more creative responses
-                "num_predictions": 512 #max tokens to generate
-            }
-        )
+        async with ollama_pool.lease(model_name) as client:    #counts as in flight on the chosen host for the whole generation
+            stream = await client.chat(
+                model=model_name,
+                messages=[{"role": "user", "content": prompt}],
+                options={
+                    "temperature": 0.7, #Control the randomness of the output, with higher values producing more creative responses
+                    "num_predict": 512 #max tokens to generate
+                },
+                stream=True,
+                keep_alive=residency.keep_alive(model_name)   #every request resets it, so send the one chosen for this model
+            )
+            async for chunk in stream:
+                arrived = time.perf_counter()   #timestamp on arrival, before forwarding the token
+                delta = chunk.get("message", {}).get("content", "")
+                if delta:
+                    token_times.append(arrived)
+                    parts.append(delta)
+                    if on_token:
+                        try:
+                            await on_token(model_name, delta)
+                        except Exception as e:
+                            print(f"Error forwarding token for {model_name}: {e}")
+                if chunk.get("done"):
+                    final = chunk   #the last chunk carries eval_count / eval_duration for the whole generation
 
-        end_time = time.time()
-        latency_ms = (end_time - start_time) * 1000  # Convert to milliseconds
+        end_time = time.perf_counter()
+        load_ms = final.get("load_duration", 0) / 1e6   #non-zero if the model was evicted after warm-up
+        latency_ms = max((end_time - start_time) * 1000 - load_ms, 0.0)  # Convert to milliseconds, warm inference only
 
-        response_text = response["message"]["content"]    # Count the number of tokens in the response
-        eval_count = response.get("eval_count", 0)    # Get the number of evaluations if available, default to 0
-        prompt_eval_count = response.get("prompt_eval_count", 0)    # Get the number of prompt evaluations if available, default to 0
-        eval_duration = response.get("eval_duration", 0)    # Get the total evaluation duration if available, default to 0
+        eval_count = final.get("eval_count", 0)    # Get the number of evaluations if available, default to 0
+        prompt_eval_count = final.get("prompt_eval_count", 0)    # Get the number of prompt evaluations if available, default to 0
+        eval_duration = final.get("eval_duration", 0)    # Get the total evaluation duration if available, default to 0
 
         tokens_per_second = eval_count / (eval_duration / 1e9) if eval_duration > 0 else 0
         # Calculate tokens per second, ensuring no division by zero
+        ttft_ms, itl_ms_mean, itl_ms_p95 = _latency_stats(start_time + load_ms / 1000, token_times)  #the load happens before the first token
+        prompt_eval_ms = final.get("prompt_eval_duration", 0) / 1e6
+        metrics.record("fighter_chat", latency_ms / 1000)
+        metrics.record("fighter_ttft", ttft_ms / 1000)
+        metrics.record("prompt_eval", prompt_eval_ms / 1000)
+        if load_ms >= 1:
+            metrics.record("model_load", load_ms / 1000)
+        metrics.fighter_calls.inc("ok")
 
         return BattleResult(
             model_name = model_name,
-            response = response_text,
+            response = "".join(parts),
             latency_ms = round(latency_ms, 2),
             tokens_per_second = round(tokens_per_second, 2),
             prompt_tokens = prompt_eval_count,
-            response_tokens = eval_count
+            response_tokens = eval_count,
+            ttft_ms = ttft_ms,
+            itl_ms_mean = itl_ms_mean,
+            itl_ms_p95 = itl_ms_p95,
+            load_ms = round(load_ms, 2),
+            prompt_eval_ms = round(prompt_eval_ms, 2)
         )
 
     except Exception as e:
-        end_time = time.time()
-        latency_ms = (end_time - start_time) * 1000  # Convert to milliseconds
+        end_time = time.perf_counter()
+        metrics.fighter_calls.inc("error")
         return BattleResult(
             model_name=model_name,
             response="",
@@ -65,4 +114,4 @@ async def run_model(model_name: str, prompt: str) -> BattleResult:
             prompt_tokens=0,
             response_tokens=0,
             error=str(e)
-        )
\ No newline at end of file
+        )
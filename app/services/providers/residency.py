@@ -0,0 +1,79 @@
+import asyncio
+import os
+from app.services.providers.ollama_pool import ollama_pool, _normalize
+from app.services import metrics
+
+# Keeps battle models resident in Ollama. Before a battle's timed run, every fighter and the judge are loaded
+# with an empty generate, so load time is paid (and recorded) up front instead of inside a fighter's latency.
+# Every Ollama request resets the model's keep_alive, so the value chosen here is also sent on each chat:
+# longer for models that queued battles still need, the default otherwise so idle models free their memory.
+
+RESIDENCY_WARMUP = os.getenv("RESIDENCY_WARMUP", "1") == "1"     #0 skips the pre-load (latency then includes any cold load again)
+RESIDENCY_KEEP_ALIVE = os.getenv("RESIDENCY_KEEP_ALIVE", "5m")    #Ollama's own default - how long an idle model stays loaded
+RESIDENCY_KEEP_ALIVE_BUSY = os.getenv("RESIDENCY_KEEP_ALIVE_BUSY", "30m")     #for models that queued battles are waiting on
+RESIDENCY_QUEUE_LOOKAHEAD = int(os.getenv("RESIDENCY_QUEUE_LOOKAHEAD", "50"))   #queued battles inspected for upcoming models
+
+class ResidencyManager:
+    def __init__(self):
+        self._keep_alive: dict[str, str] = {}   #model -> keep_alive to send with its requests, set at warm-up
+        self._warming: dict[str, asyncio.Task] = {}     #model -> the one load every concurrent battle awaits
+        self.loads = 0      #warm-ups that had to load the model
+        self.warm_hits = 0  #warm-ups that found it already resident
+
+    def keep_alive(self, model: str) -> str:
+        return self._keep_alive.get(_normalize(model), RESIDENCY_KEEP_ALIVE)
+
+    async def upcoming_models(self) -> set[str]:
+        "Fighters and judges of the next queued battles"
+        from app.services.battle_queue import peek_jobs     #imported here - the queue imports the battle engine, which imports us
+        try:
+            jobs = await peek_jobs(RESIDENCY_QUEUE_LOOKAHEAD)
+        except Exception as e:
+            print(f"Could not read the battle queue for residency: {e}")
+            return set()
+        return {_normalize(m) for job in jobs for m in [*job.get("models", []), job.get("judge")] if m}
+
+    async def warm(self, models: list[str]) -> dict[str, float]:
+        "Load every model before a timed run - returns model -> load time in ms (0 if it was already resident)"
+        upcoming = await self.upcoming_models()
+        for model in models:
+            self._keep_alive[_normalize(model)] = RESIDENCY_KEEP_ALIVE_BUSY if _normalize(model) in upcoming else RESIDENCY_KEEP_ALIVE
+        if not RESIDENCY_WARMUP:
+            return {}
+        loads = await asyncio.gather(*(self._warm_shared(m) for m in dict.fromkeys(models)))
+        return dict(zip(dict.fromkeys(models), loads))
+
+    async def _warm_shared(self, model: str) -> float:
+        key = _normalize(model)
+        task = self._warming.get(key)
+        if task is None:
+            task = self._warming[key] = asyncio.create_task(self._warm_one(model))
+            task.add_done_callback(lambda _: self._warming.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _warm_one(self, model: str) -> float:
+        try:
+            async with ollama_pool.lease(model) as client:
+                response = await client.generate(model=model, prompt="", keep_alive=self.keep_alive(model))     #empty prompt = load only
+        except Exception as e:
+            print(f"Could not warm up {model}: {e}")    #the fighter's own call will report the error
+            return 0.0
+        load_ms = response.get("load_duration", 0) / 1e6
+        if load_ms >= 1:    #a resident model reports a few µs
+            self.loads += 1
+            metrics.record("model_load", load_ms / 1000)
+            print(f"> Loaded {model} in {load_ms:.0f}ms before the timed run")
+        else:
+            self.warm_hits += 1
+        return round(load_ms, 2)
+
+    def stats(self) -> dict:
+        return {
+            "warmup": RESIDENCY_WARMUP,
+            "loads": self.loads,
+            "warm_hits": self.warm_hits,
+            "keep_alive": dict(self._keep_alive)
+        }
+
+
+residency = ResidencyManager()
@@ -0,0 +1,157 @@
+import asyncio
+import json
+import os
+import numpy as np
+from redis.exceptions import WatchError
+from app.services.redis_service import redis_client
+
+# Head-to-head ratings per (category, judge).
+# Every battle updates Elo incrementally from its pairwise outcomes and appends them to a history list;
+# a Bradley-Terry refit over the whole history (with bootstrap confidence intervals) can be run on demand.
+# Reads are always a single HGETALL of the precomputed table, so they stay O(1) in the size of the history.
+
+ELO_K = float(os.getenv("ELO_K", "32"))     #how far one game moves a rating
+ELO_BASE = 1500.0   #starting rating, also the mean of the Bradley-Terry scale
+BT_PRIOR = 1.0      #virtual tied games between every pair - keeps unbeaten/winless models finite
+BT_ITERATIONS = 500
+
+def _table_key(category: str, judge: str) -> str:
+    return f"ratings:{category}:{judge}"
+
+def _history_key(category: str, judge: str) -> str:
+    return f"ratings:history:{category}:{judge}"
+
+def pairwise_outcomes(results: list[dict]) -> list[tuple[str, str, float]]:
+    "Every pair of scored models in one battle -> (model_a, model_b, score of a: 1 win, 0.5 tie, 0 loss)"
+    scored = [(r["model"], r["scores"]["overall"]) for r in results
+              if r.get("scores") and not r.get("error") and not r["scores"].get("unscored")]   #a failed verdict is no result, not a loss
+    outcomes = []
+    for i, (a, score_a) in enumerate(scored):
+        for b, score_b in scored[i + 1:]:
+            outcomes.append((a, b, 1.0 if score_a > score_b else 0.5 if score_a == score_b else 0.0))
+    return outcomes
+
+def elo_update(ratings: dict[str, float], outcomes: list[tuple[str, str, float]], k: float = ELO_K) -> dict[str, float]:
+    "Apply one battle's outcomes to the ratings. All pairs use pre-battle ratings, so the order of pairs doesn't matter"
+    updated = dict(ratings)
+    for a, b, score_a in outcomes:
+        ra, rb = ratings.get(a, ELO_BASE), ratings.get(b, ELO_BASE)
+        expected_a = 1 / (1 + 10 ** ((rb - ra) / 400))
+        delta = k * (score_a - expected_a)
+        updated[a] = updated.get(a, ELO_BASE) + delta
+        updated[b] = updated.get(b, ELO_BASE) - delta
+    return updated
+
+def bradley_terry(a_idx: np.ndarray, b_idx: np.ndarray, score_a: np.ndarray, n_models: int, weights: np.ndarray | None = None) -> np.ndarray:
+    """Fit Bradley-Terry strengths with the MM algorithm (Hunter 2004), returned on the Elo scale.
+
+    a_idx/b_idx/score_a describe each (possibly aggregated) game; weights counts how many times each one happened.
+    """
+    w = np.ones(len(a_idx)) if weights is None else weights
+    wins = (np.bincount(a_idx, weights=w * score_a, minlength=n_models)
+            + np.bincount(b_idx, weights=w * (1 - score_a), minlength=n_models)
+            + BT_PRIOR * 0.5 * (n_models - 1))
+    games = np.zeros((n_models, n_models))
+    np.add.at(games, (a_idx, b_idx), w)
+    games = games + games.T + BT_PRIOR * (1 - np.eye(n_models))
+
+    strength = np.ones(n_models)
+    for _ in range(BT_ITERATIONS):
+        denom = (games / (strength[:, None] + strength[None, :])).sum(axis=1)
+        updated = wins / denom
+        updated /= np.exp(np.log(updated).mean())  #pin the geometric mean to 1 so the scale doesn't drift
+        if np.max(np.abs(updated - strength)) < 1e-9:
+            strength = updated
+            break
+        strength = updated
+    return ELO_BASE + 400 * np.log10(strength)
+
+def refit(history: list[str], bootstrap: int = 100, seed: int = 0) -> dict[str, dict]:
+    "Bradley-Terry over the full history plus percentile bootstrap 95% intervals"
+    rows = [entry.split("\t") for entry in history]
+    models = sorted({m for a, b, _ in rows for m in (a, b)})
+    if not models:
+        return {}
+    index = {m: i for i, m in enumerate(models)}
+    a_idx = np.fromiter((index[a] for a, _, _ in rows), dtype=np.int64, count=len(rows))
+    b_idx = np.fromiter((index[b] for _, b, _ in rows), dtype=np.int64, count=len(rows))
+    score_a = np.fromiter((float(s) for _, _, s in rows), dtype=np.float64, count=len(rows))
+
+    #collapse identical (a, b, outcome) games into counts - the fit and every bootstrap then scale with
+    #the number of distinct matchups, not with the length of the history
+    combos, counts = np.unique(np.stack([a_idx, b_idx, score_a * 2]), axis=1, return_counts=True)
+    ca, cb, cs = combos[0].astype(np.int64), combos[1].astype(np.int64), combos[2] / 2
+    point = bradley_terry(ca, cb, cs, len(models), counts.astype(np.float64))
+
+    low = high = point
+    if bootstrap > 0:
+        rng = np.random.default_rng(seed)
+        #resampling games with replacement == drawing multinomial counts over the distinct matchups
+        resampled = rng.multinomial(len(rows), counts / counts.sum(), size=bootstrap)
+        fits = np.stack([bradley_terry(ca, cb, cs, len(models), r.astype(np.float64)) for r in resampled])
+        low, high = np.percentile(fits, [2.5, 97.5], axis=0)
+
+    games = np.bincount(a_idx, minlength=len(models)) + np.bincount(b_idx, minlength=len(models))
+    return {m: {"bt": round(float(point[i]), 1), "ci_low": round(float(low[i]), 1), "ci_high": round(float(high[i]), 1),
+                "bt_games": int(games[i])} for m, i in index.items()}
+
+async def update_ratings(category: str, judge: str, results: list[dict]):
+    "Incremental Elo update from one battle, plus appending its outcomes to the refit history"
+    outcomes = pairwise_outcomes(results)
+    if not outcomes:
+        return
+    table, history = _table_key(category, judge), _history_key(category, judge)
+    async with redis_client.pipeline(transaction=True) as pipe:
+        while True:     #optimistic lock - retry if another worker updated the table between our read and write
+            try:
+                await pipe.watch(table)
+                current = {m: json.loads(v) for m, v in (await pipe.hgetall(table)).items()}
+                elo = elo_update({m: row["elo"] for m, row in current.items()}, outcomes)
+                touched = {m for a, b, _ in outcomes for m in (a, b)}
+                for model in touched:
+                    row = current.get(model, {})
+                    row["elo"] = elo[model]     #kept unrounded so rounding error doesn't build up over many battles
+                    row["games"] = row.get("games", 0) + sum(1 for a, b, _ in outcomes if model in (a, b))
+                    current[model] = row
+                pipe.multi()
+                pipe.hset(table, mapping={m: json.dumps(current[m]) for m in touched})
+                pipe.rpush(history, *(f"{a}\t{b}\t{s}" for a, b, s in outcomes))
+                await pipe.execute()
+                return
+            except WatchError:
+                continue
+
+def rank_rows(rows: list[dict]) -> list[dict]:
+    """Best first by Elo - every model has one and it is current after each battle. Bradley-Terry columns come from
+    the last refit, only some models may have them and they go stale as battles land, so they are flagged, not ranked on"""
+    for row in rows:
+        row["elo"] = round(row["elo"], 1)
+        if "bt" in row:
+            row["bt_stale"] = row["games"] > row["bt_games"]    #battles since the refit that aren't in the fit
+    return sorted(rows, key=lambda r: (-r["elo"], r["model_name"]))
+
+async def get_ratings(category: str, judge: str) -> list[dict]:
+    "The precomputed table, best Elo first"
+    table = await redis_client.hgetall(_table_key(category, judge))
+    return rank_rows([{"model_name": m, **json.loads(v)} for m, v in table.items()])
+
+async def refit_ratings(category: str, judge: str, bootstrap: int = 100) -> list[dict]:
+    "Refit Bradley-Terry over the whole history off the event loop and merge it into the served table"
+    history = await redis_client.lrange(_history_key(category, judge), 0, -1)
+    fitted = await asyncio.to_thread(refit, history, bootstrap)
+    if fitted:
+        table = _table_key(category, judge)
+        async with redis_client.pipeline(transaction=True) as pipe:
+            while True:     #battles keep updating Elo during the fit - re-read the rows and only replace the Bradley-Terry fields
+                try:
+                    await pipe.watch(table)
+                    current = {m: json.loads(v) for m, v in zip(fitted, await pipe.hmget(table, list(fitted))) if v}
+                    for model, fit in fitted.items():
+                        current.setdefault(model, {"elo": ELO_BASE, "games": 0}).update(fit)
+                    pipe.multi()
+                    pipe.hset(table, mapping={m: json.dumps(row) for m, row in current.items()})
+                    await pipe.execute()
+                    break
+                except WatchError:
+                    continue
+    return await get_ratings(category, judge)
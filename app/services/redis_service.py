@@ -1,62 +1,100 @@
 import redis.asyncio as aioredis
 import os
-import json
+import time
+from datetime import datetime, timezone
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
 #single shared async redis client instance for the application
 redis_client = aioredis.from_url(REDIS_URL, decode_responses=True)
 
-CACHE_TTL_SECONDS = 30 #Cache exprires after 30 seconds to ensure we don't serve stale data for too long
+LEADERBOARD_WINDOW_SECONDS = 24 * 3600    #same 24h window the Flux leaderboard query uses - older entries drop off
 
-def _cache_key(category: str, judge: str, metric: str) -> str:
-    return f"leaderboard:{category}:{judge}:{metric}"
+# Leaderboards live in Redis sorted sets, one per (category, judge, metric), updated with ZADD as results are scored:
+#   lb:{category}:{judge}:{metric}        member = model_name, score = latest value
+#   lb:{category}:{judge}:{metric}:time   member = model_name, score = unix time of that value (for the 24h window)
+#   lb:{category}:{judge}:{metric}:ready  unix time the board was last synced from InfluxDB (missing = never seeded or expired)
+#   lb:{category}:{judge}:{metric}:sync   short-lived claim held by the one worker currently syncing the board
+def _board_key(category: str, judge: str, metric: str) -> str:
+    return f"lb:{category}:{judge}:{metric}"
 
-async def get_cached_leaderboard(category, judge, metric) -> list | None:
-    try:
-        cached = await redis_client.get(_cache_key(category, judge, metric))
-        if cached:
-            print("> Cache hit - serving leaderboard from redis")
-            return json.loads(cached)
-        print("Cache miss - querying InfluxDB for latest leaderboard")
-        return None
-    except Exception as e:
-        print(f"Error accessing Redis cache: {e}")
-        return None
-    
-async def set_cached_leaderboard(results, category, judge, metric):
-    try:
-        await redis_client.setex(   #stores value with an expiry
-            _cache_key(category, judge, metric),
-            CACHE_TTL_SECONDS,
-            json.dumps(results)
-        )
-        print("> Updated leaderboard cache in redis")
-    except Exception as e:
-        print(f"Error setting Redis cache: {e}")
+async def record_scores(category: str, judge: str, model_name: str, metrics: dict[str, float], timestamp: float | None = None):
+    "ZADD one model's latest value into the board for every metric - O(log n) per metric, one round trip"
+    now = timestamp or time.time()
+    pipe = redis_client.pipeline(transaction=False)
+    for metric, value in metrics.items():
+        board = _board_key(category, judge, metric)
+        pipe.zadd(board, {model_name: float(value)})
+        pipe.zadd(f"{board}:time", {model_name: now})
+    await pipe.execute()
 
-async def invalidate_cache(category, judge):
-    try:
-        pattern = f"leaderboard:{category}:{judge}:*"
-        keys = await redis_client.keys(pattern)
-        if keys:
-            await redis_client.delete(*keys)
-    except Exception as e:
-        print(f"error, not invalidated")
+async def claim_sync(category: str, judge: str, metric: str, seconds: int) -> bool:
+    "SET NX EX - True for exactly one caller across all workers until the claim expires"
+    return bool(await redis_client.set(f"{_board_key(category, judge, metric)}:sync", 1, nx=True, ex=seconds))
+
+async def seed_leaderboard(rows: list[dict], category: str, judge: str, metric: str):
+    "Sync a board from InfluxDB rows - a model's value is only replaced by a newer one, never by an older one"
+    board = _board_key(category, judge, metric)
+    pipe = redis_client.pipeline(transaction=False)
+    for row in rows:
+        pipe.zadd(f"{board}:time", {row["model_name"]: datetime.fromisoformat(row["time"]).timestamp()}, gt=True, ch=True)   #GT - a live ZADD is usually newer than Influx
+    newer = await pipe.execute()
+
+    pipe = redis_client.pipeline(transaction=False)
+    for row, changed in zip(rows, newer):
+        if changed:
+            pipe.zadd(board, {row["model_name"]: float(row["value"])})
+    pipe.set(f"{board}:ready", time.time(), ex=LEADERBOARD_WINDOW_SECONDS)   #resynced once a window, and never left behind for a board nobody reads
+    await pipe.execute()
+    print(f"> Synced leaderboard {board} from InfluxDB ({sum(newer)}/{len(rows)} models updated)")
+
+async def read_leaderboard(category: str, judge: str, metric: str, desc: bool = True, require_seeded: bool = True) -> tuple[list | None, float | None]:
+    """Ranked board from the sorted set (highest first unless desc=False) and when it was last synced from InfluxDB.
+
+    The board is None if it has never been seeded on this Redis (unless require_seeded=False).
+    """
+    board = _board_key(category, judge, metric)
+    synced_at = await redis_client.get(f"{board}:ready")
+    synced_at = float(synced_at) if synced_at is not None else None
+    if require_seeded and synced_at is None:
+        return None, None
+
+    cutoff = time.time() - LEADERBOARD_WINDOW_SECONDS
+    expired = await redis_client.zrangebyscore(f"{board}:time", "-inf", cutoff)
+    if expired:     #models with no result in the window fall off the board, like the Flux range(start: -24h)
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.zrem(board, *expired)
+        pipe.zrem(f"{board}:time", *expired)
+        await pipe.execute()
+
+    ranked = await redis_client.zrange(board, 0, -1, desc=desc, withscores=True)
+    if not ranked:
+        return [], synced_at
+    times = await redis_client.zmscore(f"{board}:time", [model for model, _ in ranked])
+    return [{
+        "time": datetime.fromtimestamp(ts or 0, timezone.utc).isoformat(),
+        "model_name": model,
+        "metric": metric,
+        "value": value
+    } for (model, value), ts in zip(ranked, times)], synced_at
     
-async def publish_benchmark(data: dict):
-    try:
-        await redis_client.publish("benchmarks", json.dumps(data))
-        print("> Published benchmark update to Redis channel")
-    except Exception as e:
-        print(f"Error publishing to Redis channel: {e}")
+# Live events (battle_start, battle_token, battle_score, battle_results, tournament_*) fan out to every API worker
+# through one pub/sub channel. Payloads are '["<origin worker id>", type, category, judge]\n<json>' so a worker can skip its own events
+EVENTS_CHANNEL = os.getenv("EVENTS_CHANNEL", "events")
+
+async def publish_events(payloads: list[str]):
+    "PUBLISH a batch of already-serialized events in one round trip"
+    pipe = redis_client.pipeline(transaction=False)
+    for payload in payloads:
+        pipe.publish(EVENTS_CHANNEL, payload)
+    await pipe.execute()
 
 async def get_pubsub():
     try:
-        pubsub = redis_client.pubsub()
-        await pubsub.subscribe("benchmarks")
-        print("> Subscribed to Redis channel for benchmark updates")
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(EVENTS_CHANNEL)
+        print(f"> Subscribed to Redis channel {EVENTS_CHANNEL} for live events")
         return pubsub
     except Exception as e:
         print(f"Error subscribing to Redis channel: {e}")
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,156 @@
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from influxdb_client import BucketRetentionRules, TaskCreateRequest
+from app.services.influx import client, INFLUXDB_BUCKET, INFLUXDB_ORG, _get_query_api
+from app.services import metrics
+
+# Downsampled benchmark history. Charts ask for a window (1m ... 1d) and an aggregate, and InfluxDB does the work
+# with aggregateWindow, so a week of history comes back as ~170 points instead of every raw one.
+# Two InfluxDB tasks roll raw points into hourly and daily buckets (mean/min/max/p95 per model and metric), so
+# long-range charts read those instead of scanning raw data; only the last window or two, which a task may not
+# have rolled up yet, is aggregated from raw points at query time.
+
+INFLUX_ROLLUPS = os.getenv("INFLUX_ROLLUPS", "1") == "1"    #0 = no rollup tasks, every window is aggregated from raw points
+INFLUX_ROLLUP_HOURLY_BUCKET = os.getenv("INFLUX_ROLLUP_HOURLY_BUCKET") or f"{INFLUXDB_BUCKET}_1h"
+INFLUX_ROLLUP_DAILY_BUCKET = os.getenv("INFLUX_ROLLUP_DAILY_BUCKET") or f"{INFLUXDB_BUCKET}_1d"
+INFLUX_ROLLUP_HOURLY_RETENTION_DAYS = int(os.getenv("INFLUX_ROLLUP_HOURLY_RETENTION_DAYS", "90"))   #0 = keep forever, the daily bucket always does
+BENCHMARK_MAX_POINTS = int(os.getenv("BENCHMARK_MAX_POINTS", "500"))    #resolution=auto picks the finest window under this many points
+
+RESOLUTIONS = {"1m": timedelta(minutes=1), "5m": timedelta(minutes=5), "15m": timedelta(minutes=15),
+               "1h": timedelta(hours=1), "1d": timedelta(days=1)}
+AGGREGATES = {"mean": "mean", "min": "min", "max": "max",
+              "p95": "(column, tables=<-) => tables |> quantile(q: 0.95, column: column)"}
+
+#resolution -> (rollup bucket, task name, retention in days). Daily is rolled from raw points too, so its p95 is exact
+ROLLUPS = {
+    "1h": (INFLUX_ROLLUP_HOURLY_BUCKET, "benchmark_rollup_1h", INFLUX_ROLLUP_HOURLY_RETENTION_DAYS),
+    "1d": (INFLUX_ROLLUP_DAILY_BUCKET, "benchmark_rollup_1d", 0),
+}
+_ready: set[str] = set()    #resolutions whose bucket + task exist - the others are read from raw points
+
+def pick_resolution(hours: int) -> str:
+    "resolution=auto: raw points for the last hour, else the finest window that keeps the chart under BENCHMARK_MAX_POINTS"
+    if hours <= 1:
+        return "raw"
+    span = timedelta(hours=hours)
+    for name, window in RESOLUTIONS.items():
+        if span / window <= BENCHMARK_MAX_POINTS:
+            return name
+    return "1d"
+
+def rollup_cutoff(resolution: str, now: datetime) -> datetime:
+    "Rollup rows are read up to here - the start of the previous window, which the task has finished by now"
+    window = RESOLUTIONS[resolution]
+    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return now - (now - epoch) % window - window
+
+def rollup_task_flux(resolution: str) -> str:
+    "The InfluxDB task that writes mean/min/max/p95 windows of raw benchmark points into the rollup bucket"
+    bucket, name, _ = ROLLUPS[resolution]
+    #each run recomputes the last two windows from their aligned start - the previous (now complete) window and
+    #the partial current one, which the next run overwrites. Points are grouped per model and metric, like the chart
+    lines = [
+        'import "date"',
+        f'option task = {{name: "{name}", every: {resolution}, offset: 5m}}',
+        "",
+        f'data = from(bucket: "{INFLUXDB_BUCKET}")',
+        f"    |> range(start: date.truncate(t: date.sub(d: {resolution}, from: now()), unit: {resolution}))",
+        '    |> filter(fn: (r) => r._measurement == "benchmark" and r._field == "value")',
+        '    |> group(columns: ["_measurement", "model_name", "metric"])',
+    ]
+    for agg, fn in AGGREGATES.items():
+        lines += [
+            "",
+            "data",
+            f'    |> aggregateWindow(every: {resolution}, fn: {fn}, timeSrc: "_start", createEmpty: false)',
+            f'    |> set(key: "_field", value: "{agg}")',
+            f'    |> to(bucket: "{bucket}")',
+        ]
+    return "\n".join(lines) + "\n"
+
+def _ensure_rollups() -> set[str]:
+    "Blocking - create any missing rollup bucket and create or update its task"
+    buckets, tasks = client.buckets_api(), client.tasks_api()
+    ready = set()
+    for resolution, (bucket, name, retention_days) in ROLLUPS.items():
+        if buckets.find_bucket_by_name(bucket) is None:
+            rules = [BucketRetentionRules(type="expire", every_seconds=retention_days * 86400)] if retention_days else []
+            buckets.create_bucket(bucket_name=bucket, org=INFLUXDB_ORG, retention_rules=rules,
+                                  description=f"{resolution} rollups of {INFLUXDB_BUCKET} benchmark points")
+        flux = rollup_task_flux(resolution)
+        existing = tasks.find_tasks(name=name, org=INFLUXDB_ORG)
+        if not existing:
+            tasks.create_task(task_create_request=TaskCreateRequest(org=INFLUXDB_ORG, flux=flux, status="active",
+                                                                    description=f"Roll benchmark points into {bucket}"))
+        elif existing[0].flux != flux:  #the task changed with this release (bucket names, aggregates)
+            existing[0].flux = flux
+            tasks.update_task(existing[0])
+        ready.add(resolution)
+    return ready
+
+async def ensure_rollups():
+    "Called on startup. If InfluxDB isn't reachable the rollups are skipped and every window is aggregated from raw points"
+    if not INFLUX_ROLLUPS:
+        return
+    try:
+        _ready.update(await asyncio.to_thread(_ensure_rollups))
+        print(f"InfluxDB rollups ready: {sorted(_ready)}")
+    except Exception as e:
+        print(f"Could not set up InfluxDB rollups, charts will aggregate raw points: {e}")
+
+#one constant query per aggregate - the window, range and cutoff are bind parameters, only the function is baked in
+_RAW_FILTERS = '''
+        |> filter(fn: (r) => r._measurement == "benchmark")
+        |> filter(fn: (r) => r.model_name == _model_name)
+        |> filter(fn: (r) => r.metric == _metric)
+        |> filter(fn: (r) => r._field == "value")
+        |> group(columns: ["model_name", "metric"])
+        |> aggregateWindow(every: _every, fn: {fn}, timeSrc: "_start", createEmpty: false)'''
+
+WINDOWED_QUERIES = {agg: '''
+    from(bucket: _bucket)
+        |> range(start: _start)''' + _RAW_FILTERS.format(fn=fn) + '''
+        |> sort(columns: ["_time"], desc: true)
+''' for agg, fn in AGGREGATES.items()}
+
+ROLLUP_QUERIES = {agg: '''
+    rolled = from(bucket: _rollup_bucket)
+        |> range(start: _start, stop: _cutoff)
+        |> filter(fn: (r) => r._measurement == "benchmark")
+        |> filter(fn: (r) => r.model_name == _model_name)
+        |> filter(fn: (r) => r.metric == _metric)
+        |> filter(fn: (r) => r._field == _agg)
+        |> group(columns: ["model_name", "metric"])
+        |> keep(columns: ["_time", "_value", "model_name", "metric"])
+    recent = from(bucket: _bucket)
+        |> range(start: _cutoff)''' + _RAW_FILTERS.format(fn=fn) + '''
+        |> keep(columns: ["_time", "_value", "model_name", "metric"])
+    union(tables: [rolled, recent])
+        |> sort(columns: ["_time"], desc: true)
+''' for agg, fn in AGGREGATES.items()}
+
+async def query_benchmark_series(model_name: str, metric: str, hours: int, resolution: str, agg: str = "mean",
+                                 now: datetime | None = None) -> tuple[list[dict], str]:
+    "One value per window, newest first - returns (points, source) where source is 'rollup' or 'raw'"
+    now = now or datetime.now(timezone.utc)
+    start = now - timedelta(hours=hours)
+    params = {"_bucket": INFLUXDB_BUCKET, "_start": start, "_every": RESOLUTIONS[resolution],
+              "_model_name": model_name, "_metric": metric}
+    cutoff = rollup_cutoff(resolution, now) if resolution in _ready else None
+    if cutoff and start < cutoff:   #a range shorter than the rollup lag has nothing rolled up yet
+        query, source = ROLLUP_QUERIES[agg], "rollup"
+        params.update({"_rollup_bucket": ROLLUPS[resolution][0], "_cutoff": cutoff, "_agg": agg})
+    else:
+        query, source = WINDOWED_QUERIES[agg], "raw"
+    with metrics.timed("influx_query"):
+        records = await _get_query_api().query_stream(query, params=params)
+        results = []
+        async for record in records:
+            results.append({
+                "time": record.get_time(),
+                "model_name": record["model_name"],
+                "metric": record["metric"],
+                "value": record.get_value()
+            })
+    return results, source
@@ -0,0 +1,230 @@
+import asyncio
+import json
+import os
+import time
+from app.services.providers.ollama_provider import run_model
+from app.services.providers.ollama_pool import ollama_pool
+from app.services.providers.residency import residency
+from app.services.judge import judge_response_async, judge_batch_async, JUDGE_CONCURRENCY
+from app.services.battle_engine import record_verdict
+from app.services.event_bus import event_bus
+from app.services.redis_service import redis_client
+from app.services.leaderboard import get_leaderboard
+from app.services.ratings import update_ratings
+
+# Tournament mode: N models x M prompts, scheduled so each model's weights are loaded once.
+# All generations for one model run back to back while it is resident, then every response is judged
+# in one pass so the judge model is loaded once too.
+# Tournaments run as tasks in the process that started them; while one runs it refreshes a heartbeat key,
+# and a queued/running tournament whose heartbeat has expired is reported as failed instead of running forever.
+
+TOURNAMENT_GEN_CONCURRENCY = int(os.getenv("TOURNAMENT_GEN_CONCURRENCY", "1"))   #prompts in flight per resident model (match OLLAMA_NUM_PARALLEL)
+TOURNAMENT_TTL_SECONDS = int(os.getenv("TOURNAMENT_TTL_SECONDS", str(7 * 24 * 3600)))
+TOURNAMENT_HEARTBEAT_SECONDS = int(os.getenv("TOURNAMENT_HEARTBEAT_SECONDS", "10"))    #how often a running tournament refreshes its heartbeat
+TOURNAMENT_HEARTBEAT_TTL = 3 * TOURNAMENT_HEARTBEAT_SECONDS     #queued/running with no heartbeat this long = the process running it died
+
+_background_tasks: set[asyncio.Task] = set()
+
+def _spawn(coro):
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)     #hold a reference so the task isn't garbage collected mid-flight
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+def _state_key(tournament_id: str) -> str:
+    return f"tournament:{tournament_id}"
+
+async def _save_state(tournament_id: str, state: dict):
+    try:
+        await redis_client.setex(_state_key(tournament_id), TOURNAMENT_TTL_SECONDS, json.dumps(state))
+    except Exception as e:
+        print(f"Error saving tournament state: {e}")
+
+def _heartbeat_key(tournament_id: str) -> str:
+    return f"tournament:{tournament_id}:heartbeat"
+
+async def _beat(tournament_id: str):
+    await redis_client.set(_heartbeat_key(tournament_id), str(time.time()), ex=TOURNAMENT_HEARTBEAT_TTL)
+
+async def get_tournament(tournament_id: str) -> dict | None:
+    "The tournament's state - one left queued/running by a process that died is marked failed"
+    cached = await redis_client.get(_state_key(tournament_id))
+    if not cached:
+        return None
+    state = json.loads(cached)
+    if state["state"] in ("queued", "running") and not await redis_client.exists(_heartbeat_key(tournament_id)):
+        state.update({"state": "failed", "error": "abandoned - the process running it stopped"})
+        await _save_state(tournament_id, state)
+    return state
+
+async def resident_models() -> set[str]:
+    "Models currently loaded on any healthy Ollama host (via /api/ps)"
+    await ollama_pool.refresh()
+    return ollama_pool.resident_models()
+
+def schedule_models(models: list[str], resident: set[str]) -> list[str]:
+    "Order fighters so already-resident models go first - they need no load, and everything after costs one swap each"
+    def is_resident(model: str) -> bool:
+        return model in resident or f"{model}:latest" in resident
+    return sorted(models, key=lambda m: not is_resident(m))     #stable sort keeps the caller's order within each group
+
+class _Progress:
+    "Tracks completed steps per phase and estimates time remaining from observed step durations"
+
+    def __init__(self, tournament_id: str, generations: int, judgements: int, judge_parallelism: int = 1,
+                 category: str | None = None, judge: str | None = None):
+        self.tournament_id = tournament_id
+        self.category = category    #carried on every progress event so topic subscribers get it
+        self.judge = judge
+        self.judge_parallelism = judge_parallelism  #judge steps overlap, so each one costs less wall time than it takes
+        self.total = {"generate": generations, "judge": judgements}
+        self.done = {"generate": 0, "judge": 0}
+        self.elapsed = {"generate": 0.0, "judge": 0.0}  #wall time spent in each phase so far
+        self.phase_started = time.monotonic()
+        self.phase = "generate"
+
+    def start_phase(self, phase: str):
+        self.phase = phase
+        self.phase_started = time.monotonic()
+
+    def eta_seconds(self) -> float:
+        gen_rate = self.elapsed["generate"] / self.done["generate"] if self.done["generate"] else None
+        judge_rate = self.elapsed["judge"] / self.done["judge"] if self.done["judge"] else gen_rate   #until the judge has run, assume it is about as slow as a fighter
+        eta = 0.0
+        if gen_rate:
+            eta += gen_rate * (self.total["generate"] - self.done["generate"])
+        if judge_rate:
+            remaining = self.total["judge"] - self.done["judge"]
+            eta += judge_rate * remaining if self.done["judge"] else judge_rate * remaining / self.judge_parallelism
+        return round(eta, 1)
+
+    async def step(self, **detail):
+        self.done[self.phase] += 1
+        self.elapsed[self.phase] = time.monotonic() - self.phase_started
+        completed = self.done["generate"] + self.done["judge"]
+        total = self.total["generate"] + self.total["judge"]
+        await event_bus.publish({
+            "type": "tournament_progress",
+            "tournament_id": self.tournament_id,
+            "category": self.category,
+            "judge": self.judge,
+            "phase": self.phase,
+            "completed": completed,
+            "total": total,
+            "eta_seconds": self.eta_seconds(),
+            **detail
+        })
+
+async def run_tournament(tournament_id: str, category: str, models: list[str], judge: str, prompts: list[str],
+                         batch_judge: bool = False) -> dict:
+    "Generate every (model, prompt) pair model-by-model, judge them all (one call per prompt with batch_judge), then rank models by mean score and wins"
+    order = schedule_models(models, await resident_models())
+    pairs = len(models) * len(prompts)
+    progress = _Progress(tournament_id, pairs, pairs, judge_parallelism=JUDGE_CONCURRENCY, category=category, judge=judge)
+    state = {"tournament_id": tournament_id, "state": "running", "category": category, "judge": judge,
+             "models": order, "prompts": len(prompts), "started_at": time.time()}
+    await _save_state(tournament_id, state)
+    await event_bus.publish({"type": "tournament_start", "tournament_id": tournament_id, "category": category,
+                             "judge": judge, "models": order, "prompts": len(prompts)})
+
+    #phase 1 - generation, one model at a time so its weights stay resident for all of its prompts
+    responses = {}  #(model, prompt_index) -> BattleResult
+    slots = asyncio.Semaphore(TOURNAMENT_GEN_CONCURRENCY)
+
+    async def generate(model: str, index: int):
+        async with slots:
+            result = await run_model(model, prompts[index])
+        responses[(model, index)] = result
+        await progress.step(model=model, prompt_index=index, error=result.error or None)
+
+    warmup_ms = {}
+    for model in order:
+        print(f"> Tournament {tournament_id}: generating {len(prompts)} prompts with {model}")
+        warmup_ms.update(await residency.warm([model]))    #loaded once, before its first timed prompt
+        await asyncio.gather(*(generate(model, i) for i in range(len(prompts))))
+
+    #phase 2 - judging, every response in one pass so the judge loads once; judge_response_async caps concurrency
+    progress.start_phase("judge")
+    await residency.warm([judge])
+    scores = {}
+
+    async def judge_one(model: str, index: int, verdict: dict | None = None):
+        result = responses[(model, index)]
+        if result.error:
+            await progress.step(model=model, prompt_index=index)
+            return
+        if verdict is None:
+            verdict = await judge_response_async(prompts[index], result.response, judge)
+        if not verdict.get("unscored"):     #a failed verdict's zero placeholder stays out of the standings
+            scores[(model, index)] = verdict
+        load_ms = result.load_ms + (warmup_ms.get(model, 0.0) if index == 0 else 0.0)  #the warm-up load counts once per tournament
+        await record_verdict(result, verdict, category, judge, load_ms)
+        await progress.step(model=model, prompt_index=index, overall=verdict["overall"])
+
+    async def judge_prompt(index: int):
+        #every model's answer to this prompt in one judge call, then recorded exactly like a single verdict
+        answered = {m: responses[(m, index)].response for m in order if not responses[(m, index)].error}
+        verdicts = await judge_batch_async(prompts[index], answered, judge) if answered else {}
+        await asyncio.gather(*(judge_one(m, index, verdicts.get(m)) for m in order))
+
+    if batch_judge:
+        await asyncio.gather(*(judge_prompt(i) for i in range(len(prompts))))
+    else:
+        await asyncio.gather(*(judge_one(model, i) for model in order for i in range(len(prompts))))
+
+    #rank: mean overall across prompts, plus head-to-head wins per prompt
+    standings = {model: {"model": model, "wins": 0, "scored": 0, "errors": 0, "mean_overall": 0.0} for model in order}
+    for (model, index), result in responses.items():
+        if result.error:
+            standings[model]["errors"] += 1
+    for (model, index), verdict in scores.items():
+        standings[model]["scored"] += 1
+        standings[model]["mean_overall"] += verdict["overall"]
+    for index in range(len(prompts)):
+        scored = {m: scores[(m, index)]["overall"] for m in order if (m, index) in scores}
+        if scored:
+            top = max(scored.values())
+            leaders = [m for m, overall in scored.items() if overall == top]
+            if len(leaders) == 1:   #a tie on a prompt is nobody's win
+                standings[leaders[0]]["wins"] += 1
+    for index in range(len(prompts)):   #each prompt is one head-to-head round for the ratings
+        round_results = [{"model": m, "scores": scores[(m, index)]} for m in order if (m, index) in scores]
+        try:
+            await update_ratings(category, judge, round_results)
+        except Exception as e:
+            print(f"Error updating ratings: {e}")
+    for row in standings.values():
+        row["mean_overall"] = round(row["mean_overall"] / row["scored"], 1) if row["scored"] else 0.0
+    ranking = sorted(standings.values(), key=lambda r: (r["mean_overall"], r["wins"]), reverse=True)
+
+    leaderboard, _ = await get_leaderboard(category, judge)
+    state.update({"state": "done", "finished_at": time.time(), "ranking": ranking})
+    await _save_state(tournament_id, state)
+    await event_bus.publish({"type": "tournament_results", "tournament_id": tournament_id,
+                             "category": category, "judge": judge, "ranking": ranking, "leaderboard": leaderboard})
+    print(f"Tournament {tournament_id} complete! Leader: {ranking[0]['model'] if ranking else 'none'}")
+    return state
+
+async def start_tournament(tournament_id: str, **kwargs):
+    "Run a tournament in the background, recording a failed state if it crashes and a heartbeat while it runs"
+    async def keep_alive():
+        while True:
+            await asyncio.sleep(TOURNAMENT_HEARTBEAT_SECONDS)
+            try:
+                await _beat(tournament_id)
+            except Exception as e:
+                print(f"Error refreshing tournament heartbeat: {e}")
+
+    async def runner():
+        beat = asyncio.create_task(keep_alive())
+        try:
+            await run_tournament(tournament_id, **kwargs)
+        except Exception as e:
+            print(f"Tournament {tournament_id} failed: {e}")
+            await _save_state(tournament_id, {"tournament_id": tournament_id, "state": "failed", "error": str(e)})
+        finally:
+            beat.cancel()
+            await redis_client.delete(_heartbeat_key(tournament_id))
+    await _beat(tournament_id)
+    await _save_state(tournament_id, {"tournament_id": tournament_id, "state": "queued"})
+    _spawn(runner())
@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from app.services.redis_service import redis_client
+
+VERDICT_CACHE_SIZE = int(os.getenv("VERDICT_CACHE_SIZE", "4096"))    #max verdicts held in process memory (LRU evicted beyond this)
+VERDICT_CACHE_TTL_SECONDS = int(os.getenv("VERDICT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))  #verdicts expire after a week in both tiers
+
+
+def verdict_key(judge: str, prompt_version: str, prompt: str, response: str) -> str:
+    "Content address for a verdict - same judge, rubric version, prompt and (truncated) response means same key"
+    payload = json.dumps([judge, prompt_version, prompt, response], ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class VerdictCache:
+    """Two-tier cache for judge verdicts: an in-process LRU in front of Redis.
+
+    The LRU answers repeats on this worker without a network hop; Redis shares verdicts across workers
+    and survives restarts. Both tiers expire entries after ttl seconds.
+    """
+
+    def __init__(self, max_entries: int = VERDICT_CACHE_SIZE, ttl: int = VERDICT_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local: OrderedDict[str, tuple[float, dict]] = OrderedDict()  #key -> (expires_at, verdict), oldest first
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, verdict: dict):
+        self._local[key] = (time.monotonic() + self.ttl, verdict)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)     #evict least recently used
+
+    async def get(self, key: str) -> dict | None:
+        entry = self._local.get(key)
+        if entry:
+            expires_at, verdict = entry
+            if expires_at > time.monotonic():
+                self._local.move_to_end(key)
+                self.local_hits += 1
+                return dict(verdict)    #hand out a copy so callers can't mutate the cached verdict
+            del self._local[key]
+
+        try:
+            cached = await redis_client.get(f"verdict:{key}")
+        except Exception as e:
+            print(f"Error reading verdict cache from Redis: {e}")
+            cached = None
+        if cached:
+            verdict = json.loads(cached)
+            self._remember(key, verdict)
+            self.redis_hits += 1
+            return dict(verdict)
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, verdict: dict):
+        self._remember(key, dict(verdict))
+        try:
+            await redis_client.setex(f"verdict:{key}", self.ttl, json.dumps(verdict))
+        except Exception as e:
+            print(f"Error writing verdict cache to Redis: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.local_hits + self.redis_hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.local_hits + self.redis_hits) / lookups, 3) if lookups else 0.0,
+            "local_entries": len(self._local)
+        }
+
+
+verdict_cache = VerdictCache()
@@ -1,32 +1,176 @@
 from fastapi import WebSocket
+import asyncio
 import json
+import os
+
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))  #messages buffered per client before it counts as a slow consumer
+WS_SLOW_CLIENT_POLICY = os.getenv("WS_SLOW_CLIENT_POLICY", "drop")   #"drop" = discard that client's oldest queued message, "disconnect" = close the socket
+
+# Topics a client can narrow its feed by. Each is matched against the event field of the same name;
+# a client with no values for a field takes every value of it, so an unsubscribed client gets everything
+TOPIC_FIELDS = ("type", "category", "judge")
+
+def topic_of(message: dict) -> dict:
+    return {field: message.get(field) for field in TOPIC_FIELDS}
+
+class _Client:
+    "One connected websocket with its own bounded outgoing queue, drained by its own sender task"
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=WS_SEND_QUEUE_SIZE)
+        self.task: asyncio.Task | None = None
+        self.dropped = 0
+        self.topics: dict[str, set[str]] = {field: set() for field in TOPIC_FIELDS}  #empty set = any value
 
 class ConnectionManager:
     def __init__(self):
         #stores all currently connected websocket clients
-        self.active_connections: list[WebSocket] = []   #list to hold active websocket connections
+        self.clients: dict[WebSocket, _Client] = {}   #websocket -> its send queue + sender task
+        self.dropped_messages = 0   #messages discarded for slow clients since startup
+        self.slow_disconnects = 0   #clients closed because their queue overflowed
+        #routing tables, one per topic field: value -> clients subscribed to it, None -> clients taking any value
+        self.routes: dict[str, dict[str | None, set[_Client]]] = {field: {} for field in TOPIC_FIELDS}
     
+    @property
+    def active_connections(self) -> list[WebSocket]:
+        return list(self.clients)
+
     async def connect(self, websocket: WebSocket):
         await websocket.accept()   #accepts the incoming websocket connection
-        self.active_connections.append(websocket)    #adds the new connection to the list of active connections
-        print(f"New client connected. Total clients: {len(self.active_connections)}")   #logs the new connection and the total number of active connections
+        client = _Client(websocket)
+        client.task = asyncio.create_task(self._sender(client))
+        self.clients[websocket] = client    #adds the new connection to the active connections
+        self._index(client)
+        print(f"New client connected. Total clients: {len(self.clients)}")   #logs the new connection and the total number of active connections
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)    #removes the disconnected websocket from the list of active connections
-        print(f"Client disconnected. Total clients: {len(self.active_connections)}")   #logs the disconnection and the updated total number of active connections
+        client = self.clients.pop(websocket, None)    #removes the disconnected websocket, safe to call more than once
+        if client is None:
+            return
+        self._unindex(client)
+        if client.task and client.task is not asyncio.current_task():
+            client.task.cancel()
+        print(f"Client disconnected. Total clients: {len(self.clients)}")   #logs the disconnection and the updated total number of active connections
+
+    def subscribe(self, websocket: WebSocket, **topics: list[str]) -> dict:
+        "Narrow a client's feed to these topic values (added to what it already has), returns its subscription"
+        return self._resubscribe(websocket, topics, add=True)
+
+    def unsubscribe(self, websocket: WebSocket, **topics: list[str]) -> dict:
+        "Drop topic values from a client's subscription - a field left with no values goes back to taking everything"
+        return self._resubscribe(websocket, topics, add=False)
+
+    def subscription(self, websocket: WebSocket) -> dict:
+        client = self.clients.get(websocket)
+        return {field: sorted(values) for field, values in client.topics.items()} if client else {}
+
+    def _resubscribe(self, websocket: WebSocket, topics: dict, add: bool) -> dict:
+        client = self.clients.get(websocket)
+        if client is None:
+            return {}
+        self._unindex(client)
+        for field, values in topics.items():
+            if field in TOPIC_FIELDS and values:
+                if add:
+                    client.topics[field].update(values)
+                else:
+                    client.topics[field].difference_update(values)
+        self._index(client)
+        return self.subscription(websocket)
+
+    def _index(self, client: _Client):
+        for field in TOPIC_FIELDS:
+            for value in client.topics[field] or {None}:
+                self.routes[field].setdefault(value, set()).add(client)
+
+    def _unindex(self, client: _Client):
+        for field in TOPIC_FIELDS:
+            for value in client.topics[field] or {None}:
+                subscribers = self.routes[field].get(value)
+                if subscribers is not None:
+                    subscribers.discard(client)
+                    if not subscribers:
+                        del self.routes[field][value]
+
+    def route(self, topic: dict) -> set[_Client]:
+        "Clients whose subscription matches the event's topic on every field"
+        matched: set[_Client] | None = None
+        for field in TOPIC_FIELDS:
+            table = self.routes[field]
+            value = topic.get(field)
+            candidates = table.get(None, set()) | (table.get(value, set()) if value is not None else set())
+            matched = candidates if matched is None else matched & candidates
+            if not matched:
+                return set()
+        return matched
 
     async def broadcast(self, message: dict):
-        #sends a message to all currently connected websocket clients. The message is expected to be a dictionary, which is then converted to a JSON string before being sent to each client.
-        disconnected = []   #list to keep track of any clients that have disconnected during the broadcast
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(json.dumps(message))
-            except Exception as e:
-                print(f"Error sending message to client: {e}")
-                disconnected.append(connection)   #if there's an error sending the message (e.g., the client has disconnected), we catch the exception and add that connection to the list of disconnected clients
-            
-        for connection in disconnected:
-            self.disconnect(connection)    #after attempting to send the message to all clients, we loop through any clients that were marked as disconnected and remove them from the active connections list using the disconnect method. This helps ensure that our list of active connections remains accurate and doesn't include any clients that have disconnected.
+        #serializes the message once - and only if some client is subscribed to it - then queues the same string
+        #for every matching client without waiting on a socket, so one slow client can't hold up the battle or the others
+        targets = self.route(topic_of(message))
+        if targets:
+            self._fan_out(targets, json.dumps(message))
+
+    def broadcast_text(self, text: str, topic: dict | None = None):
+        "Queue an already-serialized event for the clients subscribed to its topic (every client if topic is None)"
+        self._fan_out(self.clients.values() if topic is None else self.route(topic), text)
+
+    def _fan_out(self, targets, text: str):
+        for client in list(targets):
+            self._enqueue(client, text)
+
+    async def send(self, websocket: WebSocket, message: dict):
+        "Send to one client through its queue, so it is never written to concurrently with a broadcast"
+        client = self.clients.get(websocket)
+        if client:
+            self._enqueue(client, json.dumps(message))
+
+    def _enqueue(self, client: _Client, text: str):
+        try:
+            client.queue.put_nowait(text)
+            return
+        except asyncio.QueueFull:
+            pass
+        if WS_SLOW_CLIENT_POLICY == "disconnect":
+            self.slow_disconnects += 1
+            print("Client send queue full - disconnecting slow consumer")
+            self.disconnect(client.websocket)
+            asyncio.create_task(self._close(client.websocket))
+            return
+        client.queue.get_nowait()   #drop the oldest message to make room for the newest
+        client.queue.put_nowait(text)
+        client.dropped += 1
+        self.dropped_messages += 1
+
+    async def _sender(self, client: _Client):
+        try:
+            while True:
+                text = await client.queue.get()
+                await client.websocket.send_text(text)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"Error sending message to client: {e}")
+            self.disconnect(client.websocket)   #if the send fails (e.g. the client has disconnected), remove it from the active connections
+
+    async def _close(self, websocket: WebSocket):
+        try:
+            await websocket.close(code=1013)    #1013 = try again later
+        except Exception:
+            pass
+
+    def stats(self) -> dict:
+        depths = [c.queue.qsize() for c in self.clients.values()]
+        return {
+            "clients": len(self.clients),
+            "filtered_clients": sum(1 for c in self.clients.values() if any(c.topics.values())),
+            "queued_messages": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "queue_capacity": WS_SEND_QUEUE_SIZE,
+            "dropped_messages": self.dropped_messages,
+            "slow_disconnects": self.slow_disconnects
+        }
 
 
 manager = ConnectionManager()   #creates a single instance of the ConnectionManager class, which can be imported and used throughout the application to manage websocket connections and broadcast messages to clients.
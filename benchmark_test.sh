@@ -1,9 +1,7 @@
-curl -s -X POST http://localhost:8000/benchmarks/ \
-  -H "Content-Type: application/json" \
-  -d '{"model_name": "GPT-5", "metric": "accuracy", "value": 94.2}'
+#!/bin/bash
+# Load test the battle pipeline against local fakes of Ollama, InfluxDB and Redis - no docker stack needed.
+# Any flags are passed through, e.g. ./benchmark_test.sh --battles 500 --concurrency 50
+# Compare two runs with: python -m loadtest.compare loadtest/results/<old>.json loadtest/results/<new>.json
 
-curl -s -X POST http://localhost:8000/benchmarks/ \
-  -H "Content-Type: application/json" \
-  -d '{"model_name": "Claude-4", "metric": "accuracy", "value": 96.8}'
-
-curl -s http://localhost:8000/benchmarks/leaderboard/latest
\ No newline at end of file
+pip install -q -r loadtest/requirements.txt
+python -m loadtest.run "$@"
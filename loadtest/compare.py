@@ -0,0 +1,36 @@
+import argparse
+import json
+from pathlib import Path
+
+# Side-by-side view of two load test results (e.g. before/after a change): throughput, then p50/p95/p99 per stage.
+# Results from different configs aren't comparable - the config diff is printed first so that is obvious.
+
+def _delta(old, new) -> str:
+    if not old:
+        return ""
+    change = (new - old) / old * 100
+    return f"{change:+.1f}%"
+
+def compare(old: dict, new: dict):
+    changed = {k: (old["config"].get(k), v) for k, v in new["config"].items() if old["config"].get(k) != v}
+    if changed:
+        print(f"WARNING config differs: {changed}")
+    print(f"{old['commit']} -> {new['commit']}")
+    print(f"{'battles/sec':<28}{old['battles_per_sec']:>10}{new['battles_per_sec']:>10}{_delta(old['battles_per_sec'], new['battles_per_sec']):>10}")
+    stages = dict(new["stages_ms"], event_loop_lag=new["event_loop_lag_ms"])
+    old_stages = dict(old["stages_ms"], event_loop_lag=old["event_loop_lag_ms"])
+    for stage, stats in stages.items():
+        before = old_stages.get(stage, {})
+        for q in ("p50", "p95", "p99"):
+            if q in stats:
+                print(f"{stage + ' ' + q:<28}{before.get(q, '-'):>10}{stats[q]:>10}{_delta(before.get(q), stats[q]):>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two load test result files")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    args = parser.parse_args()
+    compare(json.loads(Path(args.old).read_text()), json.loads(Path(args.new).read_text()))
+
+if __name__ == "__main__":
+    main()
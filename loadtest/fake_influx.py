@@ -0,0 +1,37 @@
+import asyncio
+import os
+from fastapi import FastAPI, Request, Response
+
+# Stand-in for the two InfluxDB 2.x endpoints the app uses: line-protocol writes and Flux queries.
+# Writes are counted and discarded; queries return an empty result, so cold leaderboards seed as empty.
+#   FAKE_INFLUX_WRITE_MS   added latency per write request (a batch)
+#   FAKE_INFLUX_QUERY_MS   added latency per query
+
+WRITE_MS = float(os.getenv("FAKE_INFLUX_WRITE_MS", "5"))
+QUERY_MS = float(os.getenv("FAKE_INFLUX_QUERY_MS", "20"))
+
+app = FastAPI(title="Fake InfluxDB")
+calls = {"writes": 0, "points": 0, "queries": 0}
+
+@app.post("/api/v2/write")
+async def write(request: Request):
+    body = await request.body()
+    calls["writes"] += 1
+    calls["points"] += body.count(b"\n") + 1 if body else 0
+    await asyncio.sleep(WRITE_MS / 1000)
+    return Response(status_code=204)
+
+@app.post("/api/v2/query")
+async def query():
+    calls["queries"] += 1
+    await asyncio.sleep(QUERY_MS / 1000)
+    return Response(content="", media_type="text/csv")
+
+@app.get("/ping")
+@app.get("/health")
+async def health():
+    return {"status": "pass"}
+
+@app.get("/loadtest/calls")
+async def get_calls():
+    return calls
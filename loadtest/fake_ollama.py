@@ -0,0 +1,167 @@
+import asyncio
+import json
+import os
+import random
+import re
+import time
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Stand-in for the Ollama HTTP API (/api/chat, /api/generate, /api/tags, /api/ps) with configurable speed and failures,
+# so the battle pipeline can be load tested without GPUs. Configured through env vars:
+#   FAKE_OLLAMA_MODELS        comma separated models to report as pulled + loaded
+#   FAKE_OLLAMA_TTFT_MS       delay before the first token (prompt eval + load)
+#   FAKE_OLLAMA_TOKENS_PER_SEC  generation speed once tokens start flowing
+#   FAKE_OLLAMA_TOKENS        tokens per fighter response (capped by options.num_predict)
+#   FAKE_OLLAMA_FAILURE_RATE  fraction of chat calls answered with HTTP 500
+#   FAKE_OLLAMA_PARALLEL      requests generated at once, later ones queue like OLLAMA_NUM_PARALLEL
+#   FAKE_OLLAMA_JUDGE_OUTPUT  "json" = clean verdict, "noisy" = verdict wrapped in think tags + prose, "invalid" = no JSON
+#                             (a request with a JSON schema `format` always gets clean JSON, like Ollama's constrained decoding)
+#   FAKE_OLLAMA_LOAD_MS       time to load a model that isn't resident (reported as load_duration)
+#   FAKE_OLLAMA_MAX_LOADED    models resident at once, the least recently used is evicted (0 = no limit)
+#   FAKE_OLLAMA_SEED          makes scores and failures repeatable
+
+MODELS = [m.strip() for m in os.getenv("FAKE_OLLAMA_MODELS", "llama3.2:latest,mistral:latest,qwen2.5:latest,deepseek-r1:latest").split(",") if m.strip()]
+TTFT_MS = float(os.getenv("FAKE_OLLAMA_TTFT_MS", "150"))
+TOKENS_PER_SEC = float(os.getenv("FAKE_OLLAMA_TOKENS_PER_SEC", "200"))
+TOKENS = int(os.getenv("FAKE_OLLAMA_TOKENS", "120"))
+FAILURE_RATE = float(os.getenv("FAKE_OLLAMA_FAILURE_RATE", "0"))
+PARALLEL = int(os.getenv("FAKE_OLLAMA_PARALLEL", "8"))
+JUDGE_OUTPUT = os.getenv("FAKE_OLLAMA_JUDGE_OUTPUT", "json")
+LOAD_MS = float(os.getenv("FAKE_OLLAMA_LOAD_MS", "0"))
+MAX_LOADED = int(os.getenv("FAKE_OLLAMA_MAX_LOADED", "0"))
+DEFAULT_KEEP_ALIVE = 300.0
+WORDS = ["the", "model", "answer", "because", "therefore", "first", "then", "result", "step", "value", "so", "we"]
+
+rng = random.Random(int(os.getenv("FAKE_OLLAMA_SEED", "0")))
+slots = asyncio.Semaphore(PARALLEL)
+app = FastAPI(title="Fake Ollama")
+calls = {"chat": 0, "judge": 0, "failed": 0, "generate": 0, "loads": 0}
+resident: dict[str, float] = {}     #model -> when it unloads (monotonic), in least recently used order
+loading: dict[str, asyncio.Lock] = {}
+
+def _keep_alive_seconds(value) -> float:
+    "Ollama's keep_alive: seconds, or a duration like '30s' / '5m' / '1h'; negative = forever"
+    if value is None or value == "":
+        return DEFAULT_KEEP_ALIVE
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        units = {"s": 1, "m": 60, "h": 3600}
+        seconds = float(value[:-1]) * units[value[-1]] if value[-1] in units else float(value)
+    return float("inf") if seconds < 0 else seconds
+
+async def _load(model: str, keep_alive) -> int:
+    "Make the model resident - returns load_duration in ns (0 if it already was)"
+    lock = loading.setdefault(model, asyncio.Lock())
+    async with lock:    #concurrent requests for a cold model wait on one load, like Ollama
+        now = time.monotonic()
+        for name, expires in list(resident.items()):
+            if expires <= now:
+                del resident[name]
+        started = time.perf_counter()
+        if model not in resident:
+            calls["loads"] += 1
+            await asyncio.sleep(LOAD_MS / 1000)
+            while MAX_LOADED and len(resident) >= MAX_LOADED:
+                del resident[next(iter(resident))]    #evict the least recently used
+        resident.pop(model, None)
+        resident[model] = time.monotonic() + _keep_alive_seconds(keep_alive)   #every request resets the timer
+        return int((time.perf_counter() - started) * 1e9)
+
+def _is_judge(messages: list[dict]) -> bool:
+    return any('"correctness"' in (m.get("content") or "") for m in messages)
+
+def _scores() -> dict:
+    return {**{k: rng.randint(3, 10) for k in ("correctness", "reasoning", "completeness", "conciseness", "coherence")}, "summary": "fake verdict"}
+
+def _verdict(messages: list[dict], structured: bool) -> str:
+    labels = re.findall(r"^RESPONSE ([A-Z]):", messages[-1].get("content") or "", re.MULTILINE)   #batch judge prompt - one verdict per label
+    verdict = json.dumps({label: _scores() for label in labels} if labels else {**_scores(), "overall": 0})
+    if structured:
+        return verdict
+    if JUDGE_OUTPUT == "noisy":
+        return f"<think>weighing the answer</think>\nHere is my evaluation:\n{verdict}\nHope this helps."
+    if JUDGE_OUTPUT == "invalid":
+        return "I would rate this response quite highly overall."
+    return verdict
+
+def _chunk(model: str, content: str, done: bool = False, **extra) -> dict:
+    return {"model": model, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "message": {"role": "assistant", "content": content}, "done": done, **extra}
+
+@app.post("/api/chat")
+async def chat(request: Request):
+    body = await request.json()
+    model = body.get("model", "")
+    messages = body.get("messages", [])
+    judge = _is_judge(messages)
+    calls["chat"] += 1
+    calls["judge"] += judge
+    if rng.random() < FAILURE_RATE:
+        calls["failed"] += 1
+        return JSONResponse({"error": "fake ollama: injected failure"}, status_code=500)
+
+    if judge:
+        text = _verdict(messages, isinstance(body.get("format"), dict))
+        pieces = [text[i:i + 8] for i in range(0, len(text), 8)] or [""]    #~one token per piece
+        pieces = pieces[:(body.get("options") or {}).get("num_predict") or len(pieces)]
+    else:
+        limit = (body.get("options") or {}).get("num_predict") or TOKENS
+        pieces = [rng.choice(WORDS) + " " for _ in range(min(TOKENS, limit))]   #random text, so the verdict cache can't skip the judge
+    prompt_tokens = sum(len((m.get("content") or "").split()) for m in messages)
+    interval = 1 / TOKENS_PER_SEC
+
+    async def generate():
+        async with slots:
+            started = time.perf_counter()
+            load_ns = await _load(model, body.get("keep_alive"))
+            loaded = time.perf_counter()
+            await asyncio.sleep(TTFT_MS / 1000)
+            eval_started = time.perf_counter()
+            for piece in pieces:
+                yield piece
+                await asyncio.sleep(interval)
+            finished = time.perf_counter()
+            yield {"total_duration": int((finished - started) * 1e9), "load_duration": load_ns,
+                   "prompt_eval_count": prompt_tokens, "prompt_eval_duration": int((eval_started - loaded) * 1e9),
+                   "eval_count": len(pieces), "eval_duration": int((finished - eval_started) * 1e9)}
+
+    if body.get("stream", True):
+        async def ndjson():
+            async for item in generate():
+                chunk = _chunk(model, "", True, done_reason="stop", **item) if isinstance(item, dict) else _chunk(model, item)
+                yield json.dumps(chunk) + "\n"
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    parts, stats = [], {}
+    async for item in generate():
+        if isinstance(item, dict):
+            stats = item
+        else:
+            parts.append(item)
+    return _chunk(model, "".join(parts), True, done_reason="stop", **stats)
+
+@app.post("/api/generate")
+async def generate(request: Request):
+    "Only the empty-prompt form the API uses to load a model ahead of a battle"
+    body = await request.json()
+    model = body.get("model", "")
+    calls["generate"] += 1
+    started = time.perf_counter()
+    load_ns = await _load(model, body.get("keep_alive"))
+    return {"model": model, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "response": "",
+            "done": True, "done_reason": "load", "total_duration": int((time.perf_counter() - started) * 1e9), "load_duration": load_ns}
+
+@app.get("/api/tags")
+async def tags():
+    return {"models": [{"name": m, "model": m, "size": 0, "digest": "fake", "details": {}} for m in MODELS]}
+
+@app.get("/api/ps")
+async def ps():
+    now = time.monotonic()
+    return {"models": [{"name": m, "model": m, "size": 0, "digest": "fake", "details": {}} for m, expires in resident.items() if expires > now]}
+
+@app.get("/loadtest/calls")
+async def get_calls():
+    return calls
@@ -0,0 +1,225 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+import httpx
+import websockets
+
+# Load driver for the battle pipeline. Starts the fake Ollama + fake InfluxDB servers and the instrumented API
+# (loadtest/serve.py) as subprocesses, fires concurrent /battle/start calls while websocket listeners consume
+# the live feed, then writes one JSON result stamped with the git commit so runs compare across commits
+# (python -m loadtest.compare old.json new.json).
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+FIGHTERS = ["llama3.2:latest", "mistral:latest", "qwen2.5:latest"]
+JUDGE = "deepseek-r1:latest"
+CATEGORIES = ["reasoning", "coding", "knowledge", "creative"]
+
+def percentiles(values: list[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+    return {"count": len(ordered), "mean": round(sum(ordered) / len(ordered), 2), "p50": round(pick(0.5), 2),
+            "p95": round(pick(0.95), 2), "p99": round(pick(0.99), 2), "max": round(ordered[-1], 2)}
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _git(*args: str) -> str:
+    try:
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+def _start(module_args: list[str], env: dict, log) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "-m", *module_args], cwd=ROOT, env={**os.environ, **env}, stdout=log, stderr=subprocess.STDOUT)
+
+async def _wait_ready(url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise SystemExit(f"{url} did not come up within {timeout}s - see the server log")
+
+async def _listen(url: str, events: dict, stop: asyncio.Event):
+    "One dashboard: count every event and byte it receives, and which battles it saw results for"
+    async with websockets.connect(url, max_size=None) as ws:
+        while not stop.is_set():
+            try:
+                text = await asyncio.wait_for(ws.recv(), timeout=0.2)
+            except asyncio.TimeoutError:
+                continue
+            events["messages"] += 1
+            events["bytes"] += len(text)
+            message = json.loads(text)
+            if message.get("type") == "battle_results":
+                events["results"].add(message["battle_id"])
+
+async def _drive(api: str, args, rng: random.Random) -> dict:
+    latencies, failures = [], []
+    battle_ids = []
+    slots = asyncio.Semaphore(args.concurrency)
+
+    async def one(client: httpx.AsyncClient):
+        models = rng.sample(FIGHTERS, args.models)
+        body = {"category": rng.choice(CATEGORIES), "models": models, "judge": JUDGE, "stream_tokens": not args.no_stream,
+                "batch_judge": args.batch_judge}
+        async with slots:
+            started = time.perf_counter()
+            try:
+                response = await client.post(f"{api}/battle/start", json=body)
+                response.raise_for_status()
+                battle_ids.append(response.json()["battle_id"])
+                latencies.append((time.perf_counter() - started) * 1000)
+            except Exception as e:
+                failures.append(str(e))
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(timeout=300, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(one(client) for _ in range(args.battles)))
+        elapsed = time.perf_counter() - started
+    return {"latencies": latencies, "failures": failures, "battle_ids": battle_ids, "elapsed": elapsed}
+
+async def run(args) -> dict:
+    RESULTS_DIR.mkdir(exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    commit = _git("rev-parse", "--short", "HEAD")
+    ollama_port, influx_port, api_port = _free_port(), _free_port(), _free_port()
+    fake_env = {
+        "FAKE_OLLAMA_TTFT_MS": str(args.ttft_ms), "FAKE_OLLAMA_TOKENS_PER_SEC": str(args.tokens_per_sec),
+        "FAKE_OLLAMA_TOKENS": str(args.tokens), "FAKE_OLLAMA_FAILURE_RATE": str(args.failure_rate),
+        "FAKE_OLLAMA_PARALLEL": str(args.ollama_parallel), "FAKE_OLLAMA_JUDGE_OUTPUT": args.judge_output,
+        "FAKE_OLLAMA_LOAD_MS": str(args.load_ms), "FAKE_OLLAMA_MAX_LOADED": str(args.max_loaded),
+        "FAKE_OLLAMA_SEED": str(args.seed), "FAKE_INFLUX_WRITE_MS": str(args.influx_write_ms),
+    }
+    api_env = {
+        "OLLAMA_HOSTS": f"http://127.0.0.1:{ollama_port}", "INFLUXDB_URL": f"http://127.0.0.1:{influx_port}",
+        "INFLUXDB_ORG": "loadtest", "INFLUXDB_BUCKET": "loadtest", "INFLUXDB_TOKEN": "loadtest", "JUDGE_MODEL": JUDGE,
+    }
+    log_path = RESULTS_DIR / f"{stamp}-{commit or 'nogit'}.log"
+    with open(log_path, "w") as log:
+        servers = [
+            _start(["uvicorn", "loadtest.fake_ollama:app", "--port", str(ollama_port), "--log-level", "warning"], fake_env, log),
+            _start(["uvicorn", "loadtest.fake_influx:app", "--port", str(influx_port), "--log-level", "warning"], fake_env, log),
+        ]
+        serve_args = ["loadtest.serve", "--port", str(api_port)] + (["--redis-url", args.redis_url] if args.redis_url else [])
+        servers.append(_start(serve_args, api_env, log))
+        api = f"http://127.0.0.1:{api_port}"
+        try:
+            await _wait_ready(f"http://127.0.0.1:{ollama_port}/api/tags")
+            await _wait_ready(f"http://127.0.0.1:{influx_port}/ping")
+            await _wait_ready(f"{api}/health")
+
+            stop = asyncio.Event()
+            listeners = [{"messages": 0, "bytes": 0, "results": set()} for _ in range(args.listeners)]
+            ws_url = api.replace("http", "ws") + "/ws/leaderboard"
+            listen_tasks = [asyncio.create_task(_listen(ws_url, events, stop)) for events in listeners]
+
+            rng = random.Random(args.seed)
+            if args.warmup:
+                await _drive(api, argparse.Namespace(**{**vars(args), "battles": args.warmup}), rng)
+            async with httpx.AsyncClient() as client:
+                await client.post(f"{api}/loadtest/reset")
+            for events in listeners:
+                events.update(messages=0, bytes=0, results=set())
+
+            driven = await _drive(api, args, rng)
+            await asyncio.sleep(0.5)    #let the last events reach the listeners
+            stop.set()
+            await asyncio.gather(*listen_tasks, return_exceptions=True)
+            async with httpx.AsyncClient() as client:
+                server = (await client.get(f"{api}/loadtest/stats")).json()
+        finally:
+            for process in servers:
+                process.terminate()
+            for process in servers:
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+    completed = len(driven["battle_ids"])
+    stage_stats = {"request": percentiles(driven["latencies"])}
+    stage_stats.update({stage: percentiles(values) for stage, values in server["stages"].items()})
+    result = {
+        "commit": commit,
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": stamp,
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "battles": completed,
+        "failed_requests": len(driven["failures"]),
+        "elapsed_s": round(driven["elapsed"], 2),
+        "battles_per_sec": round(completed / driven["elapsed"], 3) if driven["elapsed"] else 0,
+        "stages_ms": stage_stats,
+        "event_loop_lag_ms": percentiles(server["loop_lag_ms"]),
+        "websocket": {
+            "listeners": args.listeners,
+            "messages_per_listener": percentiles([e["messages"] for e in listeners]),
+            "bytes_per_listener": percentiles([e["bytes"] for e in listeners]),
+            "missed_results": sum(len(set(driven["battle_ids"]) - e["results"]) for e in listeners),
+            "server": server["websocket"],
+        },
+        "influx_writer": server["writer"],
+        "errors": driven["failures"][:5],
+        "log": str(log_path.relative_to(ROOT)),
+    }
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{stamp}-{commit or 'nogit'}.json"
+    output.write_text(json.dumps(result, indent=2))
+    _print_summary(result, output)
+    return result
+
+def _print_summary(result: dict, output: Path):
+    print(f"\ncommit {result['commit']}{' (dirty)' if result['dirty'] else ''}: {result['battles']} battles in "
+          f"{result['elapsed_s']}s = {result['battles_per_sec']} battles/sec, {result['failed_requests']} failed requests")
+    print(f"{'stage':<20}{'count':>7}{'p50':>10}{'p95':>10}{'p99':>10}")
+    rows = list(result["stages_ms"].items()) + [("event_loop_lag", result["event_loop_lag_ms"])]
+    for stage, s in rows:
+        if s.get("count"):
+            print(f"{stage:<20}{s['count']:>7}{s['p50']:>10}{s['p95']:>10}{s['p99']:>10}")
+    ws = result["websocket"]
+    print(f"websocket: {ws['listeners']} listeners, p50 {ws['messages_per_listener'].get('p50', 0)} messages each, "
+          f"{ws['missed_results']} missed battle_results")
+    print(f"result written to {output}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the battle pipeline against fake Ollama/InfluxDB/Redis")
+    parser.add_argument("--battles", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20, help="battles in flight at once")
+    parser.add_argument("--listeners", type=int, default=10, help="websocket clients on /ws/leaderboard")
+    parser.add_argument("--models", type=int, default=2, choices=[2, 3], help="fighters per battle")
+    parser.add_argument("--warmup", type=int, default=10, help="battles run before measuring")
+    parser.add_argument("--no-stream", action="store_true", help="battles without battle_token events")
+    parser.add_argument("--batch-judge", action="store_true", help="score each battle's fighters in one judge call")
+    parser.add_argument("--ttft-ms", type=float, default=150)
+    parser.add_argument("--tokens-per-sec", type=float, default=200)
+    parser.add_argument("--tokens", type=int, default=120)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--ollama-parallel", type=int, default=8)
+    parser.add_argument("--judge-output", choices=["json", "noisy", "invalid"], default="json")
+    parser.add_argument("--load-ms", type=float, default=0, help="fake model load time for a model that isn't resident")
+    parser.add_argument("--max-loaded", type=int, default=0, help="models the fake Ollama keeps loaded at once (0 = all)")
+    parser.add_argument("--influx-write-ms", type=float, default=5)
+    parser.add_argument("--redis-url", help="use a real (local) Redis instead of the in-memory fake")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="result file (default loadtest/results/<time>-<commit>.json)")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
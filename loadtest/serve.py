@@ -0,0 +1,88 @@
+import argparse
+import asyncio
+import os
+import time
+from collections import defaultdict
+
+# Runs the real API for a load test: Redis is swapped for an in-memory fakeredis (unless --redis-url is given),
+# every stage of the battle pipeline is timed, and a probe measures event-loop lag. The driver reads
+# everything back from GET /loadtest/stats.
+
+LAG_PROBE_INTERVAL = 0.05   #seconds the probe asks to sleep - anything beyond that is time the loop was busy
+
+stages: dict[str, list[float]] = defaultdict(list)    #stage -> durations in ms
+loop_lag: list[float] = []    #ms the probe woke up late
+
+def _use_fake_redis():
+    "Patch redis.asyncio.from_url before the app imports it, so every module shares one in-memory server"
+    try:
+        import fakeredis
+    except ImportError:
+        raise SystemExit("fakeredis is not installed - pip install -r loadtest/requirements.txt, or pass --redis-url")
+    import redis.asyncio as aioredis
+    server = fakeredis.FakeServer()
+    aioredis.from_url = lambda url, **kwargs: fakeredis.FakeAsyncRedis(server=server, **kwargs)
+
+def _timed(stage: str, fn):
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            stages[stage].append((time.perf_counter() - started) * 1000)
+    return wrapper
+
+def _instrument():
+    "Wrap each stage where the battle engine looks it up, without touching the app code"
+    from app.services import battle_engine
+    from app.routers import battle
+    for stage, name in (("generate", "run_model"), ("judge", "judge_response_async"), ("judge_batch", "judge_batch_async"), ("influx_write", "write_benchmarks"),
+                        ("leaderboard_update", "record_result"), ("ratings_update", "update_ratings"),
+                        ("leaderboard_read", "get_leaderboard")):
+        setattr(battle_engine, name, _timed(stage, getattr(battle_engine, name)))
+    battle.run_battle = _timed("battle", battle.run_battle)
+
+async def _probe_loop_lag():
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(LAG_PROBE_INTERVAL)
+        loop_lag.append(max(0.0, (time.perf_counter() - started - LAG_PROBE_INTERVAL) * 1000))
+
+def build_app():
+    from app.main import app
+    from app.services.influx import benchmark_writer
+    from app.services.websocket_manager import manager
+    _instrument()
+
+    @app.on_event("startup")
+    async def start_probe():
+        asyncio.create_task(_probe_loop_lag())
+
+    @app.get("/loadtest/stats")
+    async def loadtest_stats():
+        return {"stages": stages, "loop_lag_ms": loop_lag, "writer": benchmark_writer.stats(), "websocket": manager.stats()}
+
+    @app.post("/loadtest/reset")
+    async def loadtest_reset():
+        "Forget everything measured so far - called after warmup"
+        stages.clear()
+        loop_lag.clear()
+        return {"reset": True}
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the API instrumented for a load test")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--redis-url", help="use a real (local) Redis instead of the in-memory fake")
+    args = parser.parse_args()
+    if args.redis_url:
+        os.environ["REDIS_URL"] = args.redis_url
+    else:
+        _use_fake_redis()
+
+    import uvicorn
+    uvicorn.run(build_app(), host="127.0.0.1", port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import asyncio
+import pytest
+from app.services import battle_engine, judge
+from app.services.providers.ollama_provider import BattleResult
+
+#unit tests for the battle pipeline - fighters, the judge model and every store are replaced by in-memory fakes
+
+SCORES = {"correctness": 8, "reasoning": 8, "completeness": 8, "conciseness": 8, "coherence": 8, "overall": 80.0, "summary": "ok"}
+
+@pytest.fixture
+def battle(monkeypatch):
+    "Fakes everything around run_battle - returns the shared log of fighter, judge and broadcast events"
+    log = {"order": [], "events": [], "in_flight": 0, "max_in_flight": 0, "delays": {}, "judge_delay": 0.0}
+
+    async def run_model(model, prompt, on_token=None):
+        await asyncio.sleep(log["delays"][model])
+        log["order"].append(("finished", model))
+        return BattleResult(model, f"a long enough answer from {model}", 10.0, 50.0, 5, 20)
+
+    async def run_judge(prompt, response, judge_model):
+        model = response.rsplit(" ", 1)[-1]
+        log["order"].append(("judging", model))
+        log["in_flight"] += 1
+        log["max_in_flight"] = max(log["max_in_flight"], log["in_flight"])
+        await asyncio.sleep(log["judge_delay"])
+        log["in_flight"] -= 1
+        return dict(SCORES)
+
+    async def publish(event):
+        log["events"].append(event)
+
+    async def warm(models):
+        return {}
+
+    async def noop(*args, **kwargs):
+        return None
+
+    async def leaderboard(category, judge_model):
+        return [], "cache"
+
+    async def cache_miss(key):
+        return None
+
+    monkeypatch.setattr(battle_engine, "run_model", run_model)
+    monkeypatch.setattr(judge, "_run_judge", run_judge)
+    monkeypatch.setattr(judge, "_judge_slots", {})
+    monkeypatch.setattr(judge.verdict_cache, "get", cache_miss)
+    monkeypatch.setattr(judge.verdict_cache, "set", noop)
+    monkeypatch.setattr(battle_engine.event_bus, "publish", publish)
+    monkeypatch.setattr(battle_engine.residency, "warm", warm)
+    monkeypatch.setattr(battle_engine, "write_benchmarks", noop)
+    monkeypatch.setattr(battle_engine, "record_result", noop)
+    monkeypatch.setattr(battle_engine, "update_ratings", noop)
+    monkeypatch.setattr(battle_engine, "get_leaderboard", leaderboard)
+    monkeypatch.setattr(battle_engine.battle_history, "record", noop)
+    return log
+
+async def test_judging_starts_as_each_fighter_finishes(battle):
+    """The fast fighter is judged while the slow one is still generating, and scores go out in completion order"""
+    battle["delays"] = {"slow": 0.2, "fast": 0.01, "mid": 0.08}
+    result = await battle_engine.run_battle("b1", "coding", ["slow", "fast", "mid"], "j", "prompt?")
+
+    order = battle["order"]
+    assert order.index(("judging", "fast")) < order.index(("finished", "slow"))
+    assert order.index(("judging", "mid")) < order.index(("finished", "slow"))
+    assert [e["model"] for e in battle["events"] if e["type"] == "battle_score"] == ["fast", "mid", "slow"]
+    assert [r["model"] for r in result["results"]] == ["slow", "fast", "mid"]   #the final result keeps request order
+
+async def test_judge_concurrency_is_capped_per_judge_model(battle, monkeypatch):
+    """Fighters finishing together never have more than JUDGE_CONCURRENCY calls in flight on one judge"""
+    monkeypatch.setattr(judge, "JUDGE_CONCURRENCY", 2)
+    battle["delays"] = {f"m{i}": 0.0 for i in range(6)}
+    battle["judge_delay"] = 0.02
+    result = await battle_engine.run_battle("b1", "coding", list(battle["delays"]), "j", "prompt?")
+
+    assert battle["max_in_flight"] == 2
+    assert len(result["results"]) == 6
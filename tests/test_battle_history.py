@@ -0,0 +1,132 @@
+from datetime import datetime, timezone
+import pytest
+from asyncpg.exceptions import DataError
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services import battle_history as battle_history_module
+from app.services.battle_history import HistoryWriter, battle_rows, encode_cursor, decode_cursor, BATTLE_COLUMNS, RESULT_COLUMNS
+
+#unit tests for the Postgres battle history - COPY is replaced with an in-memory recorder, no database needed
+
+def _battle(battle_id="b1", winner="mistral"):
+    return {
+        "battle_id": battle_id, "category": "reasoning", "prompt": "2+2?", "winner": winner,
+        "results": [
+            {"model": "mistral", "response": "4", "latency_ms": 10.0, "tokens_per_second": 50.0, "error": "",
+             "scores": {"correctness": 9, "reasoning": 8, "completeness": 9, "conciseness": 9, "coherence": 9, "overall": 88.0, "summary": "ok"}},
+            {"model": "llama3.2", "response": "5", "latency_ms": 12.0, "tokens_per_second": 40.0, "error": "",
+             "scores": {"correctness": 0, "reasoning": 0, "completeness": 0, "conciseness": 0, "coherence": 0, "overall": 0,
+                        "summary": "Scoring Unavailable", "unscored": True}},
+        ],
+    }
+
+def test_battle_rows_match_copy_columns():
+    """Rows line up with the COPY column lists, and an unscored verdict is stored as NULL scores rather than zeros"""
+    row, results = battle_rows(_battle(), "deepseek-r1")
+    assert len(row) == len(BATTLE_COLUMNS)
+    assert all(len(r) == len(RESULT_COLUMNS) for r in results)
+    scored, unscored = (dict(zip(RESULT_COLUMNS, r)) for r in results)
+    assert scored["overall"] == 88.0 and scored["correctness"] == 9
+    assert unscored["overall"] is None and unscored["correctness"] is None
+    assert dict(zip(BATTLE_COLUMNS, battle_rows(_battle(winner="No valid responses"), "j")[0]))["winner"] is None
+
+def test_cursor_round_trip():
+    stamp = datetime(2026, 1, 2, 3, 4, 5, 678000, tzinfo=timezone.utc)
+    assert decode_cursor(encode_cursor(stamp, "b1")) == (stamp, "b1")
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+async def test_writer_copies_battles_in_batches(monkeypatch):
+    """Queued battles are written with one COPY pair per batch, battles before their results"""
+    copies = []
+    writer = HistoryWriter()
+    writer.batch_size, writer.flush_interval = 2, 5
+
+    async def fake_copy(battles, results):
+        copies.append(([b[0] for b in battles], len(results)))
+
+    monkeypatch.setattr(writer, "_copy", fake_copy)
+    writer.start()
+    for i in range(3):
+        await writer.record(_battle(f"b{i}"), "deepseek-r1")
+    await writer.stop()
+
+    assert copies == [(["b0", "b1"], 4), (["b2"], 2)]
+    assert writer.stats()["flushed"] == 3
+
+class FakeRaw:
+    "An asyncpg connection that commits COPYs outside a transaction straight away, like the real one"
+    def __init__(self, fail=None):
+        self.committed = {"battles": [], "battle_results": []}
+        self.fail = fail or (lambda table, records: None)  #raise from here to fail a COPY
+        self._staged = None
+
+    def transaction(self):
+        raw = self
+
+        class Transaction:
+            async def __aenter__(self):
+                raw._staged = {"battles": [], "battle_results": []}
+
+            async def __aexit__(self, exc_type, exc, tb):
+                if exc_type is None:
+                    for table, rows in raw._staged.items():
+                        raw.committed[table] += rows
+                raw._staged = None
+        return Transaction()
+
+    async def copy_records_to_table(self, table, records, columns):
+        self.fail(table, records)
+        (self._staged if self._staged is not None else self.committed)[table].extend(records)
+
+def _fake_engine(monkeypatch, raw):
+    class Conn:
+        async def get_raw_connection(self):
+            return type("Pooled", (), {"driver_connection": raw})()
+
+    class Connect:
+        async def __aenter__(self):
+            return Conn()
+
+        async def __aexit__(self, *exc):
+            pass
+
+    monkeypatch.setattr(battle_history_module, "engine", type("Engine", (), {"connect": lambda self: Connect()})())
+
+async def test_failed_results_copy_rolls_back_battles(monkeypatch):
+    """Both COPYs share one transaction, so a retry after the results COPY fails doesn't duplicate battles"""
+    monkeypatch.setattr(battle_history_module, "BATTLE_HISTORY_RETRIES", 1)
+    failures = [ConnectionError("connection dropped")]
+
+    def fail(table, records):
+        if table == "battle_results" and failures:
+            raise failures.pop()
+
+    raw = FakeRaw(fail)
+    _fake_engine(monkeypatch, raw)
+    writer = HistoryWriter()
+    await writer._flush([battle_rows(_battle(f"b{i}"), "j") for i in range(3)])
+
+    assert [b[0] for b in raw.committed["battles"]] == ["b0", "b1", "b2"]
+    assert len(raw.committed["battle_results"]) == 6
+    assert writer.stats()["flushed"] == 3 and writer.stats()["failed"] == 0
+
+async def test_bad_row_only_drops_its_battle(monkeypatch):
+    """A row Postgres rejects is isolated by splitting the batch - the other battles are still written"""
+    def fail(table, records):
+        if any(r[0] == "b2" for r in records):
+            raise DataError("invalid byte sequence")
+
+    raw = FakeRaw(fail)
+    _fake_engine(monkeypatch, raw)
+    writer = HistoryWriter()
+    await writer._flush([battle_rows(_battle(f"b{i}"), "j") for i in range(5)])
+
+    assert sorted(b[0] for b in raw.committed["battles"]) == ["b0", "b1", "b3", "b4"]
+    assert len(raw.committed["battle_results"]) == 8
+    assert writer.stats()["flushed"] == 4 and writer.stats()["failed"] == 1
+
+def test_history_route_is_not_a_battle_id():
+    """/battle/history is matched before /battle/{battle_id}, and a tampered cursor is a 400"""
+    response = TestClient(app).get("/battle/history", params={"cursor": "garbage"})
+    assert response.status_code == 400
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import pytest
+from fakeredis import aioredis as fakeredis
+from app.services import battle_queue
+
+#unit tests for the Redis battle queue - Redis is fakeredis, the battle itself is replaced by a stub
+
+JOB = {"category": "coding", "models": ["a", "b"], "judge": "j", "prompt": "p"}
+
+@pytest.fixture
+def redis(monkeypatch):
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(battle_queue, "redis_client", client)
+    return client
+
+def _stub_battle(monkeypatch, outcome):
+    "run_battle stand-in - records the state the job was in while it ran, then returns or raises outcome"
+    seen = {}
+
+    async def run_battle(battle_id, **job):
+        seen[battle_id] = (await battle_queue.get_job(battle_id))["state"]
+        if isinstance(outcome, BaseException):
+            raise outcome
+        if outcome == "hang":
+            await asyncio.Event().wait()
+        return {"battle_id": battle_id, "winner": "a"}
+
+    monkeypatch.setattr(battle_queue, "run_battle", run_battle)
+    return seen
+
+async def _wait_for_state(battle_id, state):
+    for _ in range(200):
+        job = await battle_queue.get_job(battle_id)
+        if job and job["state"] == state:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"{battle_id} never reached {state}")
+
+async def test_enqueue_and_get_job(redis):
+    await battle_queue.enqueue_battle("b1", JOB)
+    job = await battle_queue.get_job("b1")
+    assert job["state"] == "queued" and job["request"] == JOB
+    assert await battle_queue.queue_depth() == 1
+    assert (await battle_queue.peek_jobs(5))[0]["battle_id"] == "b1"
+    assert await battle_queue.get_job("missing") is None
+
+async def test_worker_runs_job_to_done(redis, monkeypatch):
+    """queued -> running -> done, and the job leaves the worker's processing list once finished"""
+    seen = _stub_battle(monkeypatch, "ok")
+    await battle_queue.enqueue_battle("b1", JOB)
+    worker = asyncio.create_task(battle_queue._worker(0))
+    job = await _wait_for_state("b1", "done")
+    worker.cancel()
+    await asyncio.gather(worker, return_exceptions=True)
+
+    assert seen == {"b1": "running"}
+    assert job["result"]["winner"] == "a"
+    assert await redis.llen(battle_queue._processing_key(0)) == 0
+
+async def test_worker_marks_failed_battle(redis, monkeypatch):
+    _stub_battle(monkeypatch, RuntimeError("ollama down"))
+    await battle_queue.enqueue_battle("b1", JOB)
+    worker = asyncio.create_task(battle_queue._worker(0))
+    job = await _wait_for_state("b1", "failed")
+    worker.cancel()
+    await asyncio.gather(worker, return_exceptions=True)
+
+    assert job["error"] == "ollama down"
+    assert await redis.llen(battle_queue._processing_key(0)) == 0
+
+async def test_shutdown_puts_running_job_back(redis, monkeypatch):
+    """A worker cancelled mid-battle requeues the job instead of failing it"""
+    _stub_battle(monkeypatch, "hang")
+    await battle_queue.enqueue_battle("b1", JOB)
+    worker = asyncio.create_task(battle_queue._worker(0))
+    await _wait_for_state("b1", "running")
+    worker.cancel()
+    await asyncio.gather(worker, return_exceptions=True)
+
+    assert (await battle_queue.get_job("b1"))["state"] == "queued"
+    assert await battle_queue.queue_depth() == 1
+    assert await redis.llen(battle_queue._processing_key(0)) == 0
+
+async def test_reaper_requeues_dead_workers_jobs(redis):
+    """Jobs held by a process whose heartbeat expired go back to the front; a job that keeps dying is failed"""
+    dead = "battle:processing:dead:0"
+    await redis.hset(battle_queue.BATTLE_PROCESSING_KEY, dead, "dead")
+    await battle_queue.enqueue_battle("waiting", JOB)
+    await battle_queue.save_job("b1", state="running")
+    await redis.lpush(dead, json.dumps({"battle_id": "b1", **JOB}))
+
+    assert await battle_queue.reap_stale_jobs() == 1
+    assert (await battle_queue.get_job("b1"))["state"] == "queued"
+    assert (await battle_queue.peek_jobs(5))[0]["battle_id"] == "b1"     #ahead of the job that was already waiting
+    assert not await redis.hexists(battle_queue.BATTLE_PROCESSING_KEY, dead)
+
+    await redis.hset(battle_queue._job_key("b2"), "attempts", battle_queue.BATTLE_MAX_ATTEMPTS - 1)
+    await redis.hset(battle_queue.BATTLE_PROCESSING_KEY, dead, "dead")
+    await redis.lpush(dead, json.dumps({"battle_id": "b2", **JOB}))
+    assert await battle_queue.reap_stale_jobs() == 0
+    assert (await battle_queue.get_job("b2"))["state"] == "failed"
+
+async def test_reaper_leaves_live_workers_alone(redis):
+    live = "battle:processing:live:0"
+    await redis.hset(battle_queue.BATTLE_PROCESSING_KEY, live, "live")
+    await redis.set(battle_queue._heartbeat_key("live"), "1")
+    await redis.lpush(live, json.dumps({"battle_id": "b1", **JOB}))
+    assert await battle_queue.reap_stale_jobs() == 0
+    assert await redis.llen(live) == 1
+
+async def test_concurrent_reapers_requeue_each_job_once(redis):
+    """Two reapers racing over the same dead list: one claims it, every job is requeued once with one attempt counted"""
+    dead = "battle:processing:dead:0"
+    await redis.hset(battle_queue.BATTLE_PROCESSING_KEY, dead, "dead")
+    for battle_id in ("b1", "b2", "b3"):
+        await redis.lpush(dead, json.dumps({"battle_id": battle_id, **JOB}))
+
+    counts = await asyncio.gather(battle_queue.reap_stale_jobs(), battle_queue.reap_stale_jobs())
+    assert sorted(counts) == [0, 3]
+    assert sorted(job["battle_id"] for job in await battle_queue.peek_jobs(5)) == ["b1", "b2", "b3"]
+    for battle_id in ("b1", "b2", "b3"):
+        assert await redis.hget(battle_queue._job_key(battle_id), "attempts") == "1"
+    assert not await redis.hexists(battle_queue.BATTLE_PROCESSING_KEY, dead)
@@ -0,0 +1,83 @@
+import asyncio
+import json
+from app.services import event_bus as event_bus_module
+from app.services.event_bus import EventBus
+
+#unit tests for the cross-worker event relay - Redis pub/sub is replaced by a list of buses that every publish reaches
+
+class FakeManager:
+    def __init__(self):
+        self.sent = []
+        self.topics = []
+
+    def broadcast_text(self, text, topic=None):
+        self.sent.append(json.loads(text))
+        self.topics.append(topic)
+
+    async def broadcast(self, message):
+        self.sent.append(message)
+
+async def test_events_reach_clients_on_every_worker(monkeypatch):
+    """An event published on one worker goes to its own clients once and is relayed to the other worker's clients"""
+    local, remote = FakeManager(), FakeManager()
+    a, b = EventBus(worker_id="a"), EventBus(worker_id="b")
+
+    async def fake_publish(payloads):
+        for payload in payloads:
+            for bus, manager in ((a, local), (b, remote)):    #the channel delivers to every subscriber, the publisher included
+                monkeypatch.setattr(event_bus_module, "manager", manager)
+                bus.relay(payload)
+
+    monkeypatch.setattr(event_bus_module.redis_service, "publish_events", fake_publish)
+    monkeypatch.setattr(event_bus_module, "manager", local)
+    a.start(subscribe=False)
+    await a.publish({"type": "battle_start", "battle_id": "x"})
+    await asyncio.sleep(0.01)
+    await a.stop()
+
+    assert local.sent == [{"type": "battle_start", "battle_id": "x"}]   #delivered locally, own echo skipped
+    assert remote.sent == [{"type": "battle_start", "battle_id": "x"}]
+    assert a.stats()["published"] == 1
+    assert b.stats()["relayed"] == 1
+
+async def test_relay_survives_separators_in_topic_values(monkeypatch):
+    """Judge names come from the request body - a | or newline in one must not corrupt the relayed event or its topic"""
+    remote = FakeManager()
+    payloads = []
+
+    async def fake_publish(batch):
+        payloads.extend(batch)
+
+    monkeypatch.setattr(event_bus_module.redis_service, "publish_events", fake_publish)
+    monkeypatch.setattr(event_bus_module, "manager", FakeManager())
+    a = EventBus(worker_id="a")
+    a.start(subscribe=False)
+    event = {"type": "battle_score", "category": "coding", "judge": "evil|judge\nname", "model": "m"}
+    await a.publish(event)
+    await asyncio.sleep(0.01)
+    await a.stop()
+
+    monkeypatch.setattr(event_bus_module, "manager", remote)
+    EventBus(worker_id="b").relay(payloads[0])
+    assert remote.sent == [event]
+    assert remote.topics == [{"type": "battle_score", "category": "coding", "judge": "evil|judge\nname"}]
+
+async def test_publish_without_redis_stays_local(monkeypatch):
+    """A bus that was never started (or whose Redis is down) still delivers to local clients"""
+    local = FakeManager()
+    monkeypatch.setattr(event_bus_module, "manager", local)
+    bus = EventBus(worker_id="a")
+    await bus.publish({"type": "battle_results"})
+    assert local.sent == [{"type": "battle_results"}]
+    assert bus.stats()["pending"] == 0
+
+    async def broken(payloads):
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr(event_bus_module.redis_service, "publish_events", broken)
+    bus.start(subscribe=False)
+    await bus.publish({"type": "battle_results"})
+    await asyncio.sleep(0.01)
+    await bus.stop()
+    assert len(local.sent) == 2
+    assert bus.stats()["failed"] == 1
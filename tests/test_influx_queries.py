@@ -0,0 +1,46 @@
+from datetime import datetime, timezone
+from app.services import influx
+
+#unit tests for the Flux read path - the async query API is replaced by a fake with the real call shape:
+#query_stream is a coroutine returning an async generator of records, so iterating it without await fails
+
+class FakeRecord(dict):
+    def get_time(self):
+        return self["_time"]
+
+    def get_value(self):
+        return self["_value"]
+
+class FakeQueryApiAsync:
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    async def query_stream(self, query, params=None):
+        self.calls.append((query, params))
+
+        async def records():
+            for row in self.rows:
+                yield FakeRecord(row)
+        return records()
+
+def _row(model, value):
+    return {"_time": datetime(2026, 1, 1, tzinfo=timezone.utc), "_value": value, "model_name": model, "metric": "latency_ms"}
+
+async def test_history_query_awaits_the_stream(monkeypatch):
+    api = FakeQueryApiAsync([_row("llama3", 120.0)])
+    monkeypatch.setattr(influx, "_get_query_api", lambda: api)
+    results = await influx.query_benchmarks("llama3", "latency_ms", hours=2)
+
+    assert results == [{"time": datetime(2026, 1, 1, tzinfo=timezone.utc), "model_name": "llama3", "metric": "latency_ms", "value": 120.0}]
+    query, params = api.calls[0]
+    assert query == influx.BENCHMARKS_QUERY and params["_model_name"] == "llama3"
+
+async def test_leaderboard_query_sorts_by_metric_direction(monkeypatch):
+    """Latest scores are bound as params and sorted best first - ascending for lower-is-better metrics"""
+    api = FakeQueryApiAsync([_row("slow", 300.0), _row("fast", 90.0)])
+    monkeypatch.setattr(influx, "_get_query_api", lambda: api)
+    results = await influx.query_latest_scores("coding", "mistral", "latency_ms")
+
+    assert [r["model_name"] for r in results] == ["fast", "slow"]
+    assert api.calls[0][1]["_judge"] == "mistral"
@@ -0,0 +1,52 @@
+from app.services import influx_writer
+from app.services.influx_writer import BatchWriter
+
+#unit tests for the background InfluxDB batch writer - write_batch is replaced with an in-memory recorder
+
+async def test_writer_batches_by_size():
+    """Points should be grouped into batches no larger than batch_size"""
+    batches = []
+    writer = BatchWriter(lambda payload: batches.append(payload.split("\n")), batch_size=3, flush_interval=5)
+    writer.start()
+    for i in range(7):
+        await writer.submit(f"benchmark value={i}")
+    await writer.stop()
+
+    assert [len(b) for b in batches] == [3, 3, 1]
+    assert writer.stats()["flushed"] == 7
+    assert writer.stats()["pending"] == 0
+
+async def test_writer_flushes_on_interval():
+    """A partial batch should still be written once the flush interval passes"""
+    batches = []
+    writer = BatchWriter(lambda payload: batches.append(payload), batch_size=100, flush_interval=0.05)
+    writer.start()
+    await writer.submit("benchmark value=1")
+    assert await writer.wait_settled(writer.mark(), timeout=1)
+    assert batches == ["benchmark value=1"]
+    await writer.stop()
+
+async def test_writer_counts_failures(monkeypatch):
+    """A batch that keeps failing should be counted as failed, not retried forever"""
+    monkeypatch.setattr(influx_writer, "INFLUX_WRITE_RETRIES", 0)
+
+    def broken(payload):
+        raise ConnectionError("influxdb down")
+
+    writer = BatchWriter(broken, batch_size=10, flush_interval=0.01)
+    writer.start()
+    await writer.submit("benchmark value=1")
+    await writer.submit("benchmark value=2")
+    await writer.stop()
+
+    assert writer.stats()["failed"] == 2
+    assert writer.stats()["flushed"] == 0
+
+async def test_writer_applies_backpressure(monkeypatch):
+    """With no consumer running, a full buffer should drop points after the enqueue timeout"""
+    monkeypatch.setattr(influx_writer, "INFLUX_ENQUEUE_TIMEOUT", 0.01)
+    writer = BatchWriter(lambda payload: None, max_queue=1)
+    await writer.submit("benchmark value=1")
+    await writer.submit("benchmark value=2")
+    assert writer.stats()["queued"] == 1
+    assert writer.stats()["dropped"] == 1
@@ -0,0 +1,57 @@
+import json
+from app.services import ingest as ingest_module
+from app.services import influx
+from app.services.ingest import ingest, iter_lines, parse_line_protocol, parse_ndjson_line
+
+#unit tests for bulk benchmark ingestion - the InfluxDB write is replaced with an in-memory recorder
+
+METRICS = {"accuracy", "latency_ms"}
+ROW = {"model_name": "llama3", "metric": "accuracy", "value": 81.5, "category": "coding", "judge": "mistral"}
+
+async def _chunks(body: bytes, size: int = 7):
+    for i in range(0, len(body), size):     #small chunks so lines are split across reads
+        yield body[i:i + size]
+
+def test_both_formats_give_the_same_point():
+    """NDJSON and line protocol normalize to the line the battle writer would produce"""
+    line = parse_ndjson_line(json.dumps({**ROW, "time": 1700000000}), METRICS)
+    assert line == parse_line_protocol("benchmark,model_name=llama3,metric=accuracy,category=coding,judge=mistral value=81.5 1700000000000000000", METRICS)
+    assert "model_name=llama3" in line and line.endswith(" 1700000000000000000")
+
+def test_invalid_lines_are_explained():
+    cases = [
+        ("{not json", "invalid JSON"),
+        (json.dumps({**ROW, "metric": "vibes"}), "invalid metric"),
+        (json.dumps({**ROW, "value": "high"}), "finite number"),
+        (json.dumps({k: v for k, v in ROW.items() if k != "judge"}), "missing judge"),
+    ]
+    for text, message in cases:
+        try:
+            parse_ndjson_line(text, METRICS)
+            assert False, text
+        except ValueError as e:
+            assert message in str(e)
+    try:
+        parse_line_protocol("benchmark,model_name=a,metric=accuracy,category=c,judge=j value=\"x\"", METRICS)
+        assert False
+    except ValueError as e:
+        assert "invalid value" in str(e)
+
+async def test_over_long_line_is_skipped_without_buffering(monkeypatch):
+    monkeypatch.setattr(ingest_module, "INGEST_MAX_LINE_BYTES", 10)
+    lines = [item async for item in iter_lines(_chunks(b"short\n" + b"x" * 50 + b"\nlast", size=4))]
+    assert lines == [(1, "short"), (2, None), (3, "last")]
+
+async def test_ingest_writes_in_batches_and_reports_bad_lines(monkeypatch):
+    """Good lines are written batch by batch, bad ones are counted and listed by line number"""
+    batches = []
+    monkeypatch.setattr(influx, "_write_lines", lambda payload: batches.append(payload.split("\n")))
+    monkeypatch.setattr(ingest_module, "INGEST_BATCH_SIZE", 2)
+    rows = [json.dumps({**ROW, "value": i}) for i in range(5)]
+    rows.insert(2, json.dumps({**ROW, "metric": "vibes"}))
+    body = ("\n".join(rows) + "\n\n").encode()
+
+    report = await ingest(_chunks(body), "ndjson", METRICS)
+    assert [len(b) for b in batches] == [2, 2, 1]
+    assert report["written"] == 5 and report["rejected"] == 1 and report["lines"] == 6
+    assert report["errors"] == [{"line": 3, "error": "invalid metric 'vibes'"}]
@@ -52,4 +52,100 @@ def test_overall_score_partial():
     avg = sum(scores[k] for k in required) / len(required)
     overall = round(avg * 10, 1)
 
-    assert overall == 78.0
\ No newline at end of file
+    assert overall == 78.0
+
+
+async def test_batch_judge_maps_labels_back_and_falls_back(monkeypatch):
+    """Each label's verdict goes to the model behind it, and a model the batch verdict left out is judged on its own"""
+    from app.services import judge as judge_module
+    prompts = []
+
+    async def fake_chat(judge, system, content, format="", num_predict=0):
+        assert set(format["required"]) == {"A", "B", "C"}     #one schema entry per label
+        prompts.append(content)
+        labels = dict(re.findall(r"^RESPONSE ([A-Z]):\n(\S+)", content, re.MULTILINE))    #label -> the model's answer text
+        verdicts = {label: {k: 10 if text == "best-answer" else 5 for k in judge_module.REQUIRED_SCORES}
+                    for label, text in labels.items() if text != "forgotten-answer"}     #the judge forgets phi3
+        return "<think>comparing</think> " + json.dumps(verdicts)
+
+    async def fake_single(prompt, response, judge):
+        return {"overall": 42.0, "summary": "judged alone"}
+
+    monkeypatch.setattr(judge_module, "_chat", fake_chat)
+    monkeypatch.setattr(judge_module, "judge_response_async", fake_single)
+    monkeypatch.setattr(judge_module, "JUDGE_FORMAT", "schema")
+    responses = {"mistral": "best-answer is long enough", "llama3.2": "plain-answer is long enough",
+                 "phi3": "forgotten-answer is long enough", "tiny": "ok"}
+
+    verdicts = await judge_module.judge_batch_async("2+2?", responses, "judge-model")
+
+    assert len(prompts) == 1
+    assert verdicts["mistral"]["overall"] == 100.0
+    assert verdicts["llama3.2"]["overall"] == 50.0
+    assert verdicts["phi3"]["summary"] == "judged alone"
+    assert verdicts["tiny"]["summary"] == "No response provided"
+    assert not any(model in prompts[0] for model in responses)     #labels only, the judge never sees model names
+
+def test_batch_labels_are_shuffled():
+    """Labels are handed out in a random order so 'A' is not always the first fighter"""
+    import random
+    from app.services.judge import _batch_labels
+    firsts = {_batch_labels(["a", "b", "c"], random.Random(seed))["A"] for seed in range(20)}
+    assert firsts == {"a", "b", "c"}
+
+def test_schema_format_is_opt_in(monkeypatch):
+    """A schema format needs Ollama 0.5+, so the default asks for any JSON object"""
+    import os
+    from app.services import judge as judge_module
+    if "JUDGE_FORMAT" not in os.environ:
+        assert judge_module.JUDGE_FORMAT == "json"
+    monkeypatch.setattr(judge_module, "JUDGE_FORMAT", "json")
+    assert judge_module._format() == judge_module._format(["A", "B"]) == "json"
+    monkeypatch.setattr(judge_module, "JUDGE_FORMAT", "schema")
+    assert judge_module._format() == judge_module.VERDICT_SCHEMA
+
+def test_batch_labels_past_z():
+    """More than 26 responses keep distinct letter labels - Z is followed by AA, not '['"""
+    from app.services.judge import _batch_labels
+    labels = _batch_labels([f"m{i}" for i in range(28)])
+    assert len(labels) == 28 and {"A", "Z", "AA", "AB"} <= set(labels)
+    assert all(label.isalpha() and label.isupper() for label in labels)
+
+def test_extract_json_takes_first_balanced_object():
+    """Prose, thinking and a second object around the verdict don't break parsing, unlike a greedy {.*} match"""
+    from app.services.judge import _extract_json
+    content = 'Here is {my view}: {"correctness": 9, "summary": "uses {braces}"} and also {"correctness": 1}'
+    assert _extract_json(content) == {"correctness": 9, "summary": "uses {braces}"}
+    assert _extract_json("no json at all") is None
+
+def test_truncate_tokens_keeps_whole_tokens():
+    from app.services.judge import truncate_tokens
+    assert truncate_tokens("def f(x): return x * 2", 5) == "def f(x)"
+    assert truncate_tokens("short answer", 5) == "short answer"
+
+async def test_judge_retries_within_budget(monkeypatch):
+    """An unparseable verdict is retried up to JUDGE_MAX_ATTEMPTS times, with the rubric as a fixed system message and a schema format"""
+    from app.services import judge as judge_module
+    calls = []
+
+    async def fake_chat(judge, system, content, format="", num_predict=0):
+        calls.append((system, format, num_predict))
+        return "I liked it" if len(calls) == 1 else '{"correctness": 8, "reasoning": 8, "completeness": 8, "conciseness": 8, "coherence": 8, "summary": "ok"}'
+
+    monkeypatch.setattr(judge_module, "_chat", fake_chat)
+    monkeypatch.setattr(judge_module, "JUDGE_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(judge_module, "JUDGE_FORMAT", "schema")
+
+    scores = await judge_module._run_judge("2+2?", "four, because 2+2=4", "judge-model")
+
+    assert scores["overall"] == 80.0
+    assert len(calls) == 2
+    assert all(system == judge_module.JUDGE_SYSTEM and fmt == judge_module.VERDICT_SCHEMA for system, fmt, _ in calls)
+
+    calls.clear()
+    async def always_prose(judge, system, content, format="", num_predict=0):
+        calls.append(content)
+        return "no verdict"
+    monkeypatch.setattr(judge_module, "_chat", always_prose)
+    assert await judge_module._run_judge("2+2?", "four, because 2+2=4", "judge-model") is None
+    assert len(calls) == 2
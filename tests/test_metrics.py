@@ -0,0 +1,44 @@
+import asyncio
+from app.services import metrics
+
+#unit tests for the in-process metrics behind GET /metrics
+
+def test_histogram_renders_cumulative_buckets(monkeypatch):
+    """Observations land in the first bucket whose bound they don't exceed, and buckets render cumulatively with +Inf, sum and count"""
+    monkeypatch.setattr(metrics, "_registry", [])
+    hist = metrics.Histogram("test_seconds", "test", ("stage",), buckets=(0.1, 1.0))
+    hist.observe(0.05, "judge")
+    hist.observe(0.1, "judge")
+    hist.observe(3.0, "judge")
+    text = metrics.render()
+    assert 'test_seconds_bucket{stage="judge",le="0.1"} 2' in text
+    assert 'test_seconds_bucket{stage="judge",le="1.0"} 2' in text
+    assert 'test_seconds_bucket{stage="judge",le="+Inf"} 3' in text
+    assert 'test_seconds_sum{stage="judge"} 3.15' in text
+    assert 'test_seconds_count{stage="judge"} 3' in text
+
+def test_callback_errors_are_skipped(monkeypatch):
+    """A failing callback drops out of the scrape instead of breaking the whole endpoint"""
+    monkeypatch.setattr(metrics, "_registry", [])
+    metrics.Callback("broken", "test", "gauge", lambda: 1 / 0)
+    metrics.Callback("clients", "test", "gauge", lambda: {"a": 2}, "host")
+    text = metrics.render()
+    assert "broken" not in text
+    assert 'clients{host="a"} 2' in text
+
+async def test_battle_timings_reach_child_tasks():
+    """Stages recorded in tasks spawned after start_battle_timings land in that battle's breakdown, keeping the slowest call"""
+    async def fighter(seconds):
+        metrics.record("fighter_chat", seconds)
+
+    async def battle():
+        timings = metrics.start_battle_timings()
+        await asyncio.gather(fighter(0.2), fighter(0.5), fighter(0.1))
+        with metrics.timed("ratings_update"):
+            pass
+        return timings
+
+    timings, other = await asyncio.gather(battle(), battle())
+    assert timings["fighter_chat"] == 0.5
+    assert "ratings_update" in timings
+    assert other is not timings
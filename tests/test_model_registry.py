@@ -0,0 +1,89 @@
+from app.services import model_registry as model_registry_module
+from app.services.model_registry import RegistryCache
+
+#unit tests for the model registry read cache - Redis is replaced by a dict-backed fake, loads are counted
+
+class FakeRedis:
+    def __init__(self):
+        self.store = {}
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def incr(self, key):
+        self.store[key] = int(self.store.get(key, 0)) + 1
+        return self.store[key]
+
+class Loader:
+    def __init__(self, body):
+        self.body = body
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        return self.body
+
+async def test_cache_serves_repeat_reads_and_304s(monkeypatch):
+    """The second read comes from the cache, and a matching If-None-Match gets no body at all"""
+    monkeypatch.setattr(model_registry_module, "redis_client", FakeRedis())
+    cache, load = RegistryCache(), Loader([{"id": 1}])
+    etag, body = await cache.get(("list",), load)
+    assert body == [{"id": 1}] and etag
+    assert await cache.get(("list",), load) == (etag, body)
+    assert await cache.get(("list",), load, if_none_match=etag) == (etag, None)
+    assert load.calls == 1
+
+async def test_expired_entry_revalidates_without_loading(monkeypatch):
+    """Past the TTL an unchanged version keeps the cached body, and a 304 needs no load even with an empty cache"""
+    monkeypatch.setattr(model_registry_module, "redis_client", FakeRedis())
+    monkeypatch.setattr(model_registry_module, "MODEL_CACHE_TTL_SECONDS", 0)
+    cache, load = RegistryCache(), Loader([{"id": 1}])
+    etag, _ = await cache.get(("list",), load)
+    assert (await cache.get(("list",), load))[0] == etag
+    assert cache.stats()["revalidated"] == 1
+
+    other_worker = RegistryCache()
+    assert await other_worker.get(("list",), load, if_none_match=etag) == (etag, None)
+    assert load.calls == 1
+
+async def test_bump_invalidates_every_worker(monkeypatch):
+    """A registration in one worker changes the ETag and forces a reload in another once its TTL is up"""
+    monkeypatch.setattr(model_registry_module, "redis_client", FakeRedis())
+    monkeypatch.setattr(model_registry_module, "MODEL_CACHE_TTL_SECONDS", 0)
+    writer, reader, load = RegistryCache(), RegistryCache(), Loader([{"id": 1}])
+    etag, _ = await reader.get(("list",), load)
+    await writer.bump()
+    new_etag, body = await reader.get(("list",), load, if_none_match=etag)
+    assert new_etag != etag and body == [{"id": 1}]
+    assert load.calls == 2
+
+async def test_redis_down_serves_uncached(monkeypatch):
+    """Without a shared version there is nothing to validate against - every read goes to Postgres, no ETag"""
+    class DownRedis:
+        async def get(self, key):
+            raise ConnectionError("redis down")
+
+    monkeypatch.setattr(model_registry_module, "redis_client", DownRedis())
+    cache, load = RegistryCache(), Loader([])
+    assert await cache.get(("list",), load) == (None, [])
+    assert await cache.get(("list",), load) == (None, [])
+    assert load.calls == 2
+
+async def test_if_none_match_lists_weak_tags_and_star(monkeypatch):
+    """Any tag in a comma-separated list matches, W/ is compared weakly, and * matches whatever exists"""
+    monkeypatch.setattr(model_registry_module, "redis_client", FakeRedis())
+    cache, load = RegistryCache(), Loader({"id": 1})
+    etag, _ = await cache.get(("model", 1), load)
+    assert await cache.get(("model", 1), load, if_none_match=f'"stale", W/{etag}') == (etag, None)
+    assert await cache.get(("model", 1), load, if_none_match="*") == (etag, None)
+    assert (await cache.get(("model", 1), load, if_none_match='"stale"'))[1] == {"id": 1}
+    assert await RegistryCache().get(("model", 1), load, if_none_match="*") == (etag, None)    #* on a cold cache loads to check
+
+async def test_cached_not_found_never_304s(monkeypatch):
+    """A cached {} is a missing model - * or its own ETag still get the body so the router answers 404"""
+    monkeypatch.setattr(model_registry_module, "redis_client", FakeRedis())
+    cache, load = RegistryCache(), Loader({})
+    etag, body = await cache.get(("model", 9), load)
+    assert body == {}
+    assert await cache.get(("model", 9), load, if_none_match="*") == (etag, {})
+    assert await cache.get(("model", 9), load, if_none_match=etag) == (etag, {})
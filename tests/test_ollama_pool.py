@@ -0,0 +1,77 @@
+import asyncio
+import httpx
+import pytest
+from app.services.providers.ollama_pool import OllamaPool
+
+#unit tests for least-loaded routing across ollama hosts - no requests are sent, only host state is set
+
+def _pool():
+    return OllamaPool(["http://gpu-a:11434", "http://gpu-b:11434", "http://gpu-c:11434"])
+
+def test_prefers_host_with_model_loaded():
+    """A host that already holds the model wins even if it is busier"""
+    pool = _pool()
+    a, b, c = pool.hosts
+    b.loaded = {"mistral:latest"}
+    b.in_flight = 3
+    assert pool.pick("mistral") is b
+
+def test_least_loaded_when_model_not_resident():
+    pool = _pool()
+    a, b, c = pool.hosts
+    a.in_flight, b.in_flight, c.in_flight = 2, 0, 1
+    assert pool.pick("llama3.2") is b
+
+def test_skips_unhealthy_hosts():
+    pool = _pool()
+    a, b, c = pool.hosts
+    a.loaded = {"mistral:latest"}
+    a.healthy = False
+    c.in_flight = 1
+    assert pool.pick("mistral") is b
+
+async def test_lease_tracks_in_flight_and_residency():
+    pool = _pool()
+    async with pool.lease("phi3") as client:
+        host = next(h for h in pool.hosts if h.client is client)
+        assert host.in_flight == 1
+    assert host.in_flight == 0
+    assert "phi3:latest" in host.loaded
+
+async def test_lease_marks_unreachable_host_unhealthy():
+    pool = _pool()
+    with pytest.raises(httpx.ConnectError):
+        async with pool.lease("phi3") as client:
+            host = next(h for h in pool.hosts if h.client is client)
+            raise httpx.ConnectError("connection refused")
+    assert host.healthy is False
+    assert host.in_flight == 0
+
+async def test_model_list_is_shared_and_cached():
+    """Concurrent callers share one /api/tags round per host, and later calls reuse it until the TTL runs out"""
+    pool = _pool()
+    calls = []
+
+    async def fake_list(url):
+        calls.append(url)
+        await asyncio.sleep(0.01)
+        return {"models": [{"name": "mistral:latest"}, {"name": url.split("//")[1].split(":")[0]}]}
+
+    for host in pool.hosts:
+        host.client.list = lambda url=host.url: fake_list(url)
+
+    first = await asyncio.gather(*(pool.list_models() for _ in range(5)))
+    assert len(calls) == 3
+    assert first[0] == ["mistral:latest", "gpu-a", "gpu-b", "gpu-c"]
+    assert all(names == first[0] for names in first)
+    await pool.list_models()
+    assert len(calls) == 3
+
+async def test_close_closes_each_hosts_transport(monkeypatch):
+    """close() shuts the connection pool each host created for its client"""
+    pool = _pool()
+    closed = []
+    for host in pool.hosts:
+        monkeypatch.setattr(host.transport, "aclose", lambda url=host.url: closed.append(url) or asyncio.sleep(0))
+    await pool.close()
+    assert closed == [host.url for host in pool.hosts]
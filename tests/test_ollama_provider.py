@@ -0,0 +1,87 @@
+from contextlib import asynccontextmanager
+from app.services.providers import ollama_provider
+from app.services.providers.ollama_provider import run_model, _latency_stats
+
+#unit tests for the streaming run_model - the ollama host pool is swapped for a fake that yields chunks
+
+class FakePool:
+    def __init__(self, client):
+        self.client = client
+
+    @asynccontextmanager
+    async def lease(self, model):
+        yield self.client
+
+class FakeStreamClient:
+    def __init__(self, chunks=None, error=None):
+        self.chunks = chunks or []
+        self.error = error
+
+    async def chat(self, **kwargs):
+        assert kwargs["stream"] is True
+
+        async def stream():
+            for chunk in self.chunks:
+                yield chunk
+            if self.error:
+                raise self.error
+        return stream()
+
+def _chunk(text, done=False, **extra):
+    return {"message": {"role": "assistant", "content": text}, "done": done, **extra}
+
+async def test_run_model_streams_tokens(monkeypatch):
+    """Every delta should reach the callback in order and be joined into the final response"""
+    monkeypatch.setattr(ollama_provider, "ollama_pool", FakePool(FakeStreamClient([
+        _chunk("The "),
+        _chunk("ball "),
+        _chunk("costs 5 cents."),
+        _chunk("", done=True, eval_count=6, eval_duration=2_000_000_000, prompt_eval_count=20),
+    ])))
+    seen = []
+
+    async def on_token(model, delta):
+        seen.append((model, delta))
+
+    result = await run_model("llama3.2", "bat and ball", on_token=on_token)
+
+    assert result.error == ""
+    assert result.response == "The ball costs 5 cents."
+    assert [d for _, d in seen] == ["The ", "ball ", "costs 5 cents."]
+    assert all(m == "llama3.2" for m, _ in seen)
+    assert result.tokens_per_second == 3.0
+    assert result.prompt_tokens == 20
+    assert result.ttft_ms > 0
+
+async def test_run_model_reports_stream_error(monkeypatch):
+    """A failure mid-stream should surface as an errored BattleResult, not an exception"""
+    monkeypatch.setattr(ollama_provider, "ollama_pool", FakePool(FakeStreamClient([_chunk("partial")], error=RuntimeError("model not found"))))
+
+    result = await run_model("missing-model", "hello")
+
+    assert result.error == "model not found"
+    assert result.response == ""
+
+async def test_run_model_excludes_model_load_from_latency(monkeypatch):
+    """A reload mid-battle is reported as load_ms and taken out of latency_ms and ttft_ms"""
+    monkeypatch.setattr(ollama_provider, "ollama_pool", FakePool(FakeStreamClient([
+        _chunk("ok"),
+        _chunk("", done=True, eval_count=1, eval_duration=1_000_000, load_duration=20_000_000_000, prompt_eval_duration=30_000_000),
+    ])))
+
+    result = await run_model("llama3.2", "hi")
+
+    assert result.load_ms == 20000.0
+    assert result.prompt_eval_ms == 30.0
+    assert result.latency_ms == 0.0     #the fake answers instantly, so everything left after the load is ~0
+    assert result.ttft_ms == 0.0
+
+def test_latency_stats():
+    """TTFT is measured from the start, inter-token latency from the gaps between chunks"""
+    ttft, mean, p95 = _latency_stats(10.0, [10.5, 10.6, 10.7, 11.0])
+    assert ttft == 500.0
+    assert mean == 166.67
+    assert p95 == 300.0
+
+def test_latency_stats_empty():
+    assert _latency_stats(10.0, []) == (0.0, 0.0, 0.0)
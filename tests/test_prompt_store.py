@@ -0,0 +1,81 @@
+import json
+import os
+from collections import Counter
+import pytest
+from app.services.prompt_store import PromptStore, PROMPT_LIBRARY_PATH, _allocate
+
+#unit tests for the JSONL prompt store - each test writes its own small library to a temp file
+
+def _write_library(path, entries):
+    with open(path, "w") as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+
+def _library(n=20):
+    return [{"id": f"coding-{i}", "category": "coding", "difficulty": "hard" if i % 4 == 0 else "easy",
+             "tags": ["python"] if i % 2 else ["sql"], "prompt": f"prompt {i}"} for i in range(n)]
+
+def test_shipped_library_loads():
+    """The prompts.jsonl in the repo has prompts for every battle category and no malformed lines"""
+    store = PromptStore(PROMPT_LIBRARY_PATH)
+    stats = store.stats()
+    assert set(stats["categories"]) == {"reasoning", "coding", "knowledge", "creative"}
+    assert stats["skipped_lines"] == 0
+
+def test_draw_cycles_without_repeats(tmp_path):
+    """Battles draw every prompt in a category once before any prompt repeats"""
+    path = tmp_path / "prompts.jsonl"
+    _write_library(path, _library(10))
+    store = PromptStore(str(path))
+    first = [store.draw("coding")["id"] for _ in range(10)]
+    assert len(set(first)) == 10
+    assert store.draw("coding") is not None     #reshuffled once exhausted
+    assert store.draw("creative") is None
+
+def test_sample_filters_and_stratifies(tmp_path):
+    """Stratified samples keep the library's difficulty mix, filters only return matching prompts"""
+    path = tmp_path / "prompts.jsonl"
+    _write_library(path, _library(20))      #5 hard, 15 easy
+    store = PromptStore(str(path))
+
+    sample = store.sample("coding", 8, stratify_by="difficulty")
+    assert len({p["id"] for p in sample}) == 8
+    assert Counter(p["difficulty"] for p in sample) == {"easy": 6, "hard": 2}
+    assert all("sql" in p["tags"] for p in store.sample("coding", 3, tag="sql"))
+    assert len(store.sample("coding", tag="sql", difficulty="hard")) == 5
+
+def test_page_and_hot_reload(tmp_path):
+    """Pages come back in file order, and a rewritten file is picked up without a restart"""
+    path = tmp_path / "prompts.jsonl"
+    _write_library(path, _library(20))
+    store = PromptStore(str(path), check_interval=0)
+    total, page = store.page("coding", offset=5, limit=3)
+    assert total == 20
+    assert [p["id"] for p in page] == ["coding-5", "coding-6", "coding-7"]
+
+    _write_library(path, _library(3))
+    os.utime(path, ns=(1, 1))    #make sure the mtime changes even on coarse-grained filesystems
+    total, page = store.page("coding")
+    assert total == 3
+    assert store.reloads == 2
+
+def test_missing_file_keeps_the_loaded_version(tmp_path):
+    """A file deleted or mid-rename between draws doesn't fail them - the last good index keeps serving"""
+    path = tmp_path / "prompts.jsonl"
+    _write_library(path, _library(5))
+    store = PromptStore(str(path), check_interval=0)
+    assert store.draw("coding") is not None
+
+    os.rename(path, tmp_path / "prompts.jsonl.tmp")
+    assert store.draw("coding") is not None
+    os.remove(tmp_path / "prompts.jsonl.tmp")
+    assert len(store.sample("coding")) == 5
+    assert store.reloads == 1
+
+    with pytest.raises(OSError):    #nothing was ever loaded - the router turns this into a 503
+        PromptStore(str(tmp_path / "missing.jsonl")).draw("coding")
+
+def test_allocate_is_proportional():
+    assert _allocate(4, [10, 10]) == [2, 2]
+    assert _allocate(6, [2, 10]) == [1, 5]
+    assert sum(_allocate(7, [3, 5, 11])) == 7
@@ -0,0 +1,81 @@
+import asyncio
+import json
+import numpy as np
+from fakeredis import aioredis as fakeredis
+from app.services import ratings
+from app.services.ratings import pairwise_outcomes, elo_update, refit, rank_rows, ELO_BASE
+
+#unit tests for the Elo / Bradley-Terry rating engine
+
+def _result(model, overall, error=""):
+    return {"model": model, "scores": {"overall": overall}, "error": error}
+
+def test_pairwise_outcomes_from_battle():
+    """Each pair of scored models becomes one game: win, tie or loss for the first model"""
+    outcomes = pairwise_outcomes([_result("a", 90), _result("b", 70), _result("c", 90)])
+    assert outcomes == [("a", "b", 1.0), ("a", "c", 0.5), ("b", "c", 0.0)]
+
+def test_pairwise_outcomes_skip_errors():
+    assert pairwise_outcomes([_result("a", 90), {"model": "b", "scores": None, "error": "timeout"}]) == []
+
+def test_elo_update_is_zero_sum():
+    """The winner gains exactly what the loser drops, and an even match moves K/2"""
+    updated = elo_update({}, [("a", "b", 1.0)], k=32)
+    assert updated["a"] == ELO_BASE + 16
+    assert updated["b"] == ELO_BASE - 16
+
+def test_elo_favourite_gains_less():
+    updated = elo_update({"a": 1700, "b": 1500}, [("a", "b", 1.0)], k=32)
+    assert 0 < updated["a"] - 1700 < 16
+
+def test_bradley_terry_recovers_order():
+    """With a clear dominance order, the refit ranks models the same way and the CI brackets the estimate"""
+    rng = np.random.default_rng(1)
+    strength = {"strong": 2.0, "mid": 0.0, "weak": -2.0}
+    history = []
+    for _ in range(600):
+        a, b = rng.choice(list(strength), size=2, replace=False)
+        p_a = 1 / (1 + np.exp(strength[b] - strength[a]))
+        history.append(f"{a}\t{b}\t{1.0 if rng.random() < p_a else 0.0}")
+
+    fitted = refit(history, bootstrap=50)
+
+    assert fitted["strong"]["bt"] > fitted["mid"]["bt"] > fitted["weak"]["bt"]
+    for row in fitted.values():
+        assert row["ci_low"] <= row["bt"] <= row["ci_high"]
+    assert sum(row["bt_games"] for row in fitted.values()) == 1200
+
+def test_bradley_terry_handles_unbeaten_model():
+    """A model that never lost should still get a finite rating thanks to the prior"""
+    fitted = refit(["a\tb\t1.0"] * 20, bootstrap=0)
+    assert np.isfinite(fitted["a"]["bt"])
+    assert fitted["a"]["bt"] > fitted["b"]["bt"]
+
+def test_ranking_mixes_fitted_and_unfitted_models_on_one_scale():
+    """Only some models have a Bradley-Terry fit - the order is Elo for all of them, and out-of-date fits are flagged"""
+    rows = rank_rows([
+        {"model_name": "fitted_low", "elo": 1450.0, "games": 10, "bt": 1700.0, "bt_games": 10},
+        {"model_name": "unfitted", "elo": 1600.04, "games": 3},
+        {"model_name": "fitted_high", "elo": 1550.0, "games": 14, "bt": 1400.0, "bt_games": 10},
+    ])
+    assert [r["model_name"] for r in rows] == ["unfitted", "fitted_high", "fitted_low"]
+    assert rows[0]["elo"] == 1600.0 and "bt_stale" not in rows[0]
+    assert rows[1]["bt_stale"] is True and rows[2]["bt_stale"] is False
+
+async def test_refit_keeps_elo_from_battles_during_the_fit(monkeypatch):
+    """A battle scored while the fit runs keeps its Elo and game count - the refit only writes the Bradley-Terry fields"""
+    monkeypatch.setattr(ratings, "redis_client", fakeredis.FakeRedis(decode_responses=True))
+    for _ in range(3):
+        await ratings.update_ratings("coding", "j", [_result("a", 90), _result("b", 70)])
+    to_thread = asyncio.to_thread
+
+    async def battle_during_fit(func, *args):
+        fitted = await to_thread(func, *args)
+        await ratings.update_ratings("coding", "j", [_result("a", 90), _result("b", 70)])
+        return fitted
+
+    monkeypatch.setattr(asyncio, "to_thread", battle_during_fit)
+    rows = {r["model_name"]: r for r in await ratings.refit_ratings("coding", "j", bootstrap=0)}
+    assert rows["a"]["games"] == 4 and rows["a"]["bt_games"] == 3 and rows["a"]["bt_stale"]
+    stored = json.loads(await ratings.redis_client.hget("ratings:coding:j", "a"))
+    assert stored["elo"] > rows["b"]["elo"] and "bt" in stored
@@ -0,0 +1,63 @@
+import time
+from datetime import datetime, timezone
+import pytest
+from fakeredis import aioredis as fakeredis
+from app.services import redis_service
+from app.services.redis_service import record_scores, seed_leaderboard, read_leaderboard
+
+#unit tests for the sorted-set leaderboards - Redis is fakeredis
+
+@pytest.fixture(autouse=True)
+def redis(monkeypatch):
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(redis_service, "redis_client", client)
+    return client
+
+def _row(model, value, ts):
+    return {"model_name": model, "value": value, "time": datetime.fromtimestamp(ts, timezone.utc).isoformat()}
+
+async def test_unseeded_board_is_none():
+    await record_scores("coding", "j", "llama3", {"accuracy": 80})
+    assert await read_leaderboard("coding", "j", "accuracy") == (None, None)
+    rows, synced_at = await read_leaderboard("coding", "j", "accuracy", require_seeded=False)
+    assert [r["model_name"] for r in rows] == ["llama3"] and synced_at is None
+
+async def test_read_orders_by_metric_direction():
+    now = time.time()
+    for model, accuracy, latency in [("a", 70, 300), ("b", 90, 100), ("c", 80, 200)]:
+        await record_scores("coding", "j", model, {"accuracy": accuracy, "latency_ms": latency}, timestamp=now)
+    await seed_leaderboard([], "coding", "j", "accuracy")
+    await seed_leaderboard([], "coding", "j", "latency_ms")
+
+    best_accuracy, _ = await read_leaderboard("coding", "j", "accuracy")
+    fastest, _ = await read_leaderboard("coding", "j", "latency_ms", desc=False)
+    assert [r["model_name"] for r in best_accuracy] == ["b", "c", "a"]
+    assert [r["model_name"] for r in fastest] == ["b", "c", "a"]
+    assert best_accuracy[0]["value"] == 90 and best_accuracy[0]["time"] == datetime.fromtimestamp(now, timezone.utc).isoformat()
+
+async def test_seeding_never_replaces_a_newer_live_value():
+    """GT on the time set: an InfluxDB row only overwrites a model whose live value is older, and new models are added"""
+    now = time.time()
+    await record_scores("coding", "j", "live", {"accuracy": 95}, timestamp=now)
+    await record_scores("coding", "j", "stale", {"accuracy": 10}, timestamp=now - 600)
+    await seed_leaderboard([_row("live", 50, now - 60), _row("stale", 60, now - 60), _row("new", 70, now - 60)],
+                           "coding", "j", "accuracy")
+
+    rows, synced_at = await read_leaderboard("coding", "j", "accuracy")
+    assert {r["model_name"]: r["value"] for r in rows} == {"live": 95, "stale": 60, "new": 70}
+    assert synced_at is not None
+
+async def test_models_outside_the_window_drop_off(redis):
+    now = time.time()
+    await record_scores("coding", "j", "recent", {"accuracy": 50}, timestamp=now)
+    await record_scores("coding", "j", "old", {"accuracy": 99}, timestamp=now - redis_service.LEADERBOARD_WINDOW_SECONDS - 60)
+    await seed_leaderboard([], "coding", "j", "accuracy")
+
+    rows, _ = await read_leaderboard("coding", "j", "accuracy")
+    assert [r["model_name"] for r in rows] == ["recent"]
+    assert await redis.zscore("lb:coding:j:accuracy", "old") is None     #trimmed from both sets, not just hidden
+    assert await redis.zscore("lb:coding:j:accuracy:time", "old") is None
+
+async def test_ready_marker_expires_with_the_window(redis):
+    await seed_leaderboard([], "coding", "j", "accuracy")
+    assert 0 < await redis.ttl("lb:coding:j:accuracy:ready") <= redis_service.LEADERBOARD_WINDOW_SECONDS
@@ -0,0 +1,43 @@
+import asyncio
+from contextlib import asynccontextmanager
+from app.services.providers import residency as residency_module
+from app.services.providers.residency import ResidencyManager
+
+#unit tests for pre-battle warm-up - the host pool and battle queue are replaced by fakes
+
+class FakeLoader:
+    def __init__(self):
+        self.requests = []
+
+    async def generate(self, **kwargs):
+        self.requests.append(kwargs)
+        await asyncio.sleep(0.01)
+        return {"done": True, "load_duration": 0 if kwargs["model"] == "mistral" else 1_500_000_000}
+
+class FakePool:
+    def __init__(self, client):
+        self.client = client
+
+    @asynccontextmanager
+    async def lease(self, model):
+        yield self.client
+
+async def test_warm_loads_each_model_once_and_keeps_queued_models_longer(monkeypatch):
+    """Concurrent battles share one load per model, and a model a queued battle needs gets the busy keep_alive"""
+    loader = FakeLoader()
+    monkeypatch.setattr(residency_module, "ollama_pool", FakePool(loader))
+
+    async def fake_upcoming(self):
+        return {"llama3.2:latest"}
+
+    monkeypatch.setattr(ResidencyManager, "upcoming_models", fake_upcoming)
+    manager = ResidencyManager()
+
+    first, second = await asyncio.gather(manager.warm(["llama3.2", "mistral", "llama3.2"]), manager.warm(["llama3.2"]))
+
+    assert sorted(r["model"] for r in loader.requests) == ["llama3.2", "mistral"]
+    assert first == {"llama3.2": 1500.0, "mistral": 0.0}
+    assert second == {"llama3.2": 1500.0}
+    assert manager.keep_alive("llama3.2") == residency_module.RESIDENCY_KEEP_ALIVE_BUSY
+    assert manager.keep_alive("mistral") == residency_module.RESIDENCY_KEEP_ALIVE
+    assert (manager.loads, manager.warm_hits) == (1, 1)
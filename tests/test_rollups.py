@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta, timezone
+from app.services import rollups
+
+#unit tests for downsampled benchmark history - the InfluxDB query API is replaced by a fake that records each query
+
+NOW = datetime(2026, 3, 4, 10, 30, tzinfo=timezone.utc)
+
+class FakeQueryApi:
+    def __init__(self):
+        self.calls = []
+
+    async def query_stream(self, query, params):
+        self.calls.append((query, params))
+
+        async def records():
+            return
+            yield
+        return records()
+
+def _fake_query_api(monkeypatch):
+    api = FakeQueryApi()
+    monkeypatch.setattr(rollups, "_get_query_api", lambda: api)
+    return api
+
+def test_auto_resolution_keeps_charts_small():
+    """The last hour stays raw, longer ranges get the finest window under BENCHMARK_MAX_POINTS"""
+    assert rollups.pick_resolution(1) == "raw"
+    assert rollups.pick_resolution(24) == "5m"
+    assert rollups.pick_resolution(24 * 7) == "1h"
+    assert rollups.pick_resolution(24 * 90) == "1d"
+
+def test_rollup_cutoff_is_the_previous_window():
+    assert rollups.rollup_cutoff("1h", NOW) == datetime(2026, 3, 4, 9, 0, tzinfo=timezone.utc)
+    assert rollups.rollup_cutoff("1d", NOW) == datetime(2026, 3, 3, tzinfo=timezone.utc)
+
+async def test_long_range_reads_rollups(monkeypatch):
+    """With the hourly rollup in place a week reads the rollup bucket up to the cutoff and raw points after it"""
+    api = _fake_query_api(monkeypatch)
+    monkeypatch.setattr(rollups, "_ready", {"1h", "1d"})
+    _, source = await rollups.query_benchmark_series("llama3", "latency_ms", 24 * 7, "1h", "p95", now=NOW)
+
+    query, params = api.calls[0]
+    assert source == "rollup"
+    assert query == rollups.ROLLUP_QUERIES["p95"]
+    assert params["_rollup_bucket"] == rollups.INFLUX_ROLLUP_HOURLY_BUCKET
+    assert params["_cutoff"] == rollups.rollup_cutoff("1h", NOW) and params["_agg"] == "p95"
+    assert params["_every"] == timedelta(hours=1)
+
+async def test_falls_back_to_raw_windows(monkeypatch):
+    """Without the rollup task, or for a range shorter than its lag, the window is aggregated from raw points"""
+    api = _fake_query_api(monkeypatch)
+    monkeypatch.setattr(rollups, "_ready", set())
+    assert (await rollups.query_benchmark_series("llama3", "accuracy", 24 * 7, "1h", now=NOW))[1] == "raw"
+    monkeypatch.setattr(rollups, "_ready", {"1h"})
+    assert (await rollups.query_benchmark_series("llama3", "accuracy", 1, "1h", now=NOW))[1] == "raw"
+    assert all(query == rollups.WINDOWED_QUERIES["mean"] for query, _ in api.calls)
+
+def test_task_writes_every_aggregate_to_its_bucket():
+    flux = rollups.rollup_task_flux("1d")
+    assert 'name: "benchmark_rollup_1d", every: 1d' in flux
+    assert flux.count(f'to(bucket: "{rollups.INFLUX_ROLLUP_DAILY_BUCKET}")') == len(rollups.AGGREGATES)
+    for agg in rollups.AGGREGATES:
+        assert f'value: "{agg}"' in flux
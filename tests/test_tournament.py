@@ -0,0 +1,54 @@
+import asyncio
+import json
+from fakeredis import aioredis as fakeredis
+from app.services import tournament
+from app.services.tournament import schedule_models, _Progress
+
+#unit tests for tournament scheduling and progress estimation
+
+def test_resident_models_scheduled_first():
+    """Models already loaded in Ollama should run first, otherwise keep the requested order"""
+    order = schedule_models(["llama3.2", "mistral", "gemma2", "phi3"], {"gemma2:latest", "phi3"})
+    assert order == ["gemma2", "phi3", "llama3.2", "mistral"]
+
+def test_schedule_without_residency_keeps_order():
+    assert schedule_models(["a", "b", "c"], set()) == ["a", "b", "c"]
+
+def test_progress_eta_uses_observed_rates():
+    """ETA should be remaining steps times the average step time of each phase"""
+    progress = _Progress("t1", generations=4, judgements=4, judge_parallelism=2)
+    progress.done["generate"] = 2
+    progress.elapsed["generate"] = 10.0     #5s per generation so far
+    # 2 generations left at 5s, 4 judgements assumed at 5s each but 2 at a time
+    assert progress.eta_seconds() == 20.0
+
+    progress.done["generate"] = 4
+    progress.elapsed["generate"] = 20.0
+    progress.done["judge"] = 2
+    progress.elapsed["judge"] = 3.0         #judging observed at 1.5s of wall time per verdict
+    assert progress.eta_seconds() == 3.0
+
+async def test_running_tournament_without_heartbeat_is_failed(monkeypatch):
+    """A tournament whose process died stops reading as running once its heartbeat expires"""
+    redis = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(tournament, "redis_client", redis)
+    await redis.set("tournament:t1", json.dumps({"tournament_id": "t1", "state": "running"}))
+    await tournament._beat("t1")
+    assert (await tournament.get_tournament("t1"))["state"] == "running"
+
+    await redis.delete("tournament:t1:heartbeat")
+    assert (await tournament.get_tournament("t1"))["state"] == "failed"
+    assert json.loads(await redis.get("tournament:t1"))["state"] == "failed"
+
+async def test_finished_tournament_drops_its_heartbeat(monkeypatch):
+    redis = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(tournament, "redis_client", redis)
+
+    async def run_tournament(tournament_id, **kwargs):
+        await tournament._save_state(tournament_id, {"tournament_id": tournament_id, "state": "done"})
+
+    monkeypatch.setattr(tournament, "run_tournament", run_tournament)
+    await tournament.start_tournament("t1")
+    await asyncio.gather(*tournament._background_tasks)
+    assert (await tournament.get_tournament("t1"))["state"] == "done"
+    assert not await redis.exists("tournament:t1:heartbeat")
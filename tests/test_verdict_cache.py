@@ -0,0 +1,60 @@
+from app.services import verdict_cache as verdict_cache_module
+from app.services.verdict_cache import VerdictCache, verdict_key
+
+#unit tests for the two-tier judge verdict cache - Redis is replaced by a dict-backed fake
+
+class FakeRedis:
+    def __init__(self):
+        self.store = {}
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def setex(self, key, ttl, value):
+        self.store[key] = value
+
+SCORES = {"correctness": 9, "reasoning": 8, "completeness": 8, "conciseness": 7, "coherence": 8, "overall": 80.0, "summary": "solid"}
+
+def test_verdict_key_is_content_addressed():
+    """Same inputs give the same key, and any change to judge, rubric version or content changes it"""
+    base = verdict_key("mistral", "v1", "prompt", "response")
+    assert base == verdict_key("mistral", "v1", "prompt", "response")
+    assert base != verdict_key("llama3.2", "v1", "prompt", "response")
+    assert base != verdict_key("mistral", "v2", "prompt", "response")
+    assert base != verdict_key("mistral", "v1", "prompt", "response!")
+
+async def test_cache_local_then_redis(monkeypatch):
+    """A fresh process should miss locally, hit Redis, then serve from the LRU"""
+    fake = FakeRedis()
+    monkeypatch.setattr(verdict_cache_module, "redis_client", fake)
+
+    writer = VerdictCache()
+    await writer.set("k", SCORES)
+
+    reader = VerdictCache()     #simulates another worker sharing the same Redis
+    assert await reader.get("k") == SCORES
+    assert await reader.get("k") == SCORES
+    assert reader.stats()["redis_hits"] == 1
+    assert reader.stats()["local_hits"] == 1
+    assert await reader.get("missing") is None
+    assert reader.stats()["misses"] == 1
+
+async def test_cache_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setattr(verdict_cache_module, "redis_client", FakeRedis())
+    cache = VerdictCache(max_entries=2)
+    await cache.set("a", SCORES)
+    await cache.set("b", SCORES)
+    await cache.get("a")        #touch a so b becomes the oldest
+    await cache.set("c", SCORES)
+    assert set(cache._local) == {"a", "c"}
+
+async def test_cache_expired_local_entry_falls_through(monkeypatch):
+    """An expired LRU entry should not be served - the lookup goes to Redis instead"""
+    fake = FakeRedis()
+    monkeypatch.setattr(verdict_cache_module, "redis_client", fake)
+    cache = VerdictCache(ttl=-1)    #every local entry is already expired
+    await cache.set("a", SCORES)
+    fake.store.clear()              #and Redis has evicted it too
+    assert await cache.get("a") is None
+    assert cache.stats()["local_hits"] == 0
+    assert cache.stats()["misses"] == 1
@@ -0,0 +1,103 @@
+import asyncio
+from app.services import websocket_manager
+from app.services.websocket_manager import ConnectionManager
+
+#unit tests for the queued websocket fan-out - sockets are fakes that record what they were sent
+
+class FakeWebSocket:
+    def __init__(self, stall: bool = False):
+        self.sent = []
+        self.stall = stall      #a stalled client never finishes a send, like a consumer on a dead network link
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        if self.stall:
+            await asyncio.Event().wait()
+        self.sent.append(text)
+
+    async def close(self, code=1000):
+        self.closed = True
+
+async def _disconnect_all(manager):
+    for ws in manager.active_connections:
+        manager.disconnect(ws)
+    await asyncio.sleep(0)      #let the cancelled sender tasks finish before the test loop closes
+
+async def test_broadcast_reaches_every_client():
+    manager = ConnectionManager()
+    a, b = FakeWebSocket(), FakeWebSocket()
+    await manager.connect(a)
+    await manager.connect(b)
+
+    await manager.broadcast({"type": "battle_start"})
+    await asyncio.sleep(0)
+
+    assert a.sent == b.sent == ['{"type": "battle_start"}']
+    await _disconnect_all(manager)
+
+async def test_slow_client_does_not_block_others(monkeypatch):
+    """A stalled client's queue overflows and drops old messages while a healthy client gets everything"""
+    monkeypatch.setattr(websocket_manager, "WS_SEND_QUEUE_SIZE", 2)
+    manager = ConnectionManager()
+    slow, fast = FakeWebSocket(stall=True), FakeWebSocket()
+    await manager.connect(slow)
+    await manager.connect(fast)
+
+    for i in range(5):
+        await manager.broadcast({"n": i})
+        await asyncio.sleep(0)
+
+    assert len(fast.sent) == 5
+    assert manager.stats()["dropped_messages"] > 0
+    assert manager.stats()["max_queue_depth"] <= 2
+    await _disconnect_all(manager)
+
+async def test_slow_client_disconnect_policy(monkeypatch):
+    monkeypatch.setattr(websocket_manager, "WS_SEND_QUEUE_SIZE", 1)
+    monkeypatch.setattr(websocket_manager, "WS_SLOW_CLIENT_POLICY", "disconnect")
+    manager = ConnectionManager()
+    slow = FakeWebSocket(stall=True)
+    await manager.connect(slow)
+
+    for i in range(3):
+        await manager.broadcast({"n": i})
+        await asyncio.sleep(0)
+
+    assert manager.stats()["clients"] == 0
+    assert manager.stats()["slow_disconnects"] == 1
+    await asyncio.sleep(0)
+    assert slow.closed
+
+async def test_disconnect_is_idempotent():
+    manager = ConnectionManager()
+    ws = FakeWebSocket()
+    await manager.connect(ws)
+    manager.disconnect(ws)
+    manager.disconnect(ws)
+    assert manager.active_connections == []
+
+async def test_topic_subscriptions_route_events():
+    """Subscribed clients only get matching events, unsubscribed clients get everything"""
+    manager = ConnectionManager()
+    coding, everything = FakeWebSocket(), FakeWebSocket()
+    await manager.connect(coding)
+    await manager.connect(everything)
+    manager.subscribe(coding, category=["coding"], judge=["llama3"], type=["battle_results"])
+
+    await manager.broadcast({"type": "battle_results", "category": "coding", "judge": "llama3"})
+    await manager.broadcast({"type": "battle_results", "category": "creative", "judge": "llama3"})
+    await manager.broadcast({"type": "battle_token", "category": "coding", "judge": "llama3"})
+    await asyncio.sleep(0)
+
+    assert len(coding.sent) == 1
+    assert len(everything.sent) == 3
+
+    manager.unsubscribe(coding, type=["battle_results"])    #back to every event type, still one category + judge
+    await manager.broadcast({"type": "battle_token", "category": "coding", "judge": "llama3"})
+    await asyncio.sleep(0)
+    assert len(coding.sent) == 2
+    await _disconnect_all(manager)
+    assert manager.routes == {"type": {}, "category": {}, "judge": {}}     #disconnect leaves nothing behind in the routing tables
@@ -0,0 +1,29 @@
+from app.routers import ws
+from app.routers.ws import _check_topics
+
+#unit tests for websocket subscription checks - the Ollama model list is replaced with a fixed one
+
+async def _models():
+    return ["llama3:8b", "mistral:latest"]
+
+def _topics(category=(), judge=(), type=()):
+    return {"category": list(category), "judge": list(judge), "type": list(type)}
+
+async def test_known_topics_are_accepted(monkeypatch):
+    monkeypatch.setattr(ws.ollama_pool, "list_models", _models)
+    assert await _check_topics(_topics(["coding"], ["mistral", "llama3:8b"]), {}) is None
+
+async def test_unknown_category_and_judge_are_refused(monkeypatch):
+    monkeypatch.setattr(ws.ollama_pool, "list_models", _models)
+    assert "Unknown category" in await _check_topics(_topics(["cooking"]), {})
+    assert "Unknown judge" in await _check_topics(_topics(judge=["gpt-9"]), {})
+
+async def test_subscriptions_are_capped(monkeypatch):
+    """Caps count what the client already has - values per field and (category, judge) pairs"""
+    monkeypatch.setattr(ws.ollama_pool, "list_models", _models)
+    monkeypatch.setattr(ws, "WS_MAX_TOPIC_VALUES", 3)
+    monkeypatch.setattr(ws, "WS_MAX_LEADERBOARDS", 4)
+    current = {"category": ["coding", "reasoning"], "judge": ["mistral:latest"], "type": ["a", "b"]}
+    assert "type values" in await _check_topics(_topics(type=["c", "d"]), current)
+    assert "leaderboards" in await _check_topics(_topics(["knowledge"], ["llama3:8b"]), current)
+    assert await _check_topics(_topics(judge=["llama3:8b"]), current) is None